@@ -1,4 +1,6 @@
 import filecmp
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
 from typing import Optional
 
@@ -64,3 +66,72 @@ def assert_dir_equals(
             assert normalized_filecmp(
                 expected_file, actual_file
             ), f"File contents differ; {expected_file=}, {actual_file=}"
+
+
+class StandInRequestHandler(BaseHTTPRequestHandler):
+    server: "StandInHTTPServer"
+
+    def log_message(self, format: str, *args: object) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        self.server.requests.append(("GET", self.path, dict(self.headers)))
+        if self.path not in self.server.files:
+            self.send_error(404)
+            return
+        data = self.server.files[self.path]
+
+        start = 0
+        range_header = self.headers.get("Range")
+        if range_header and self.server.supports_range:
+            start = int(range_header.removeprefix("bytes=").split("-")[0])
+            if start >= len(data):
+                self.send_error(416)
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(data) - 1}/*")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(data) - start))
+        self.end_headers()
+
+        body = data[start:]
+        if self.server.truncate_after is not None:
+            # Simulate a dropped connection
+            body = body[: self.server.truncate_after]
+            self.server.truncate_after = None
+            self.close_connection = True
+        self.wfile.write(body)
+
+    def do_PUT(self) -> None:
+        self.server.requests.append(("PUT", self.path, dict(self.headers)))
+        length = int(self.headers.get("Content-Length", 0))
+        self.server.files[self.path] = self.rfile.read(length)
+        self.send_response(201)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+
+class StandInHTTPServer(ThreadingHTTPServer):
+    """A local HTTP server standing in for GitHub, remote caches & co. in tests."""
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), StandInRequestHandler)
+        self.files: dict[str, bytes] = {}
+        self.requests: list[tuple[str, str, dict[str, str]]] = []
+        self.supports_range = True
+        self.truncate_after: Optional[int] = None
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host!s}:{port}"
+
+    def __enter__(self) -> "StandInHTTPServer":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.shutdown()
+        self.server_close()
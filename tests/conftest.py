@@ -1,6 +1,8 @@
+import shutil
 from pathlib import Path
 
 import pytest
+import responses
 
 import testing.util
 from tmc_course import tmc_course
@@ -11,6 +13,13 @@ def test_resource_path() -> Path:
     return testing.util.test_resource_dir()
 
 
+@pytest.fixture
+def all_pass_course(test_resource_path, tmp_path) -> Path:
+    course_path = tmp_path / "test_runner_test_all_pass"
+    shutil.copytree(test_resource_path / "test_runner_test_all_pass", course_path)
+    return course_path
+
+
 @pytest.fixture
 def tmp_course(tmp_path) -> Path:
     course_path = tmp_path / "NewCourse"
@@ -22,3 +31,40 @@ def tmp_course(tmp_path) -> Path:
 def tmp_part(tmp_course) -> Path:
     tmc_course.init_part(tmp_course, "part01")
     return tmp_course / "part01"
+
+
+@pytest.fixture
+def mock_tester_download(test_resource_path):
+    with responses.RequestsMock(assert_all_requests_are_fired=False) as mock:
+        mock.get(
+            url=tmc_course.TMC_PYTHON_TESTER_ZIP_URL,
+            body=(test_resource_path / "tmc-python-tester.zip").read_bytes(),
+        )
+        yield mock
+
+
+@pytest.fixture
+def tmp_assignments(tmp_part, mock_tester_download) -> list[Path]:
+    for name in ("assg01", "assg02", "assg03"):
+        tmc_course.init_assignment(tmp_part.parent, tmp_part.name, name, "en")
+    return [tmp_part / name for name in ("assg01", "assg02", "assg03")]
+
+
+@pytest.fixture
+def http_server():
+    with testing.util.StandInHTTPServer() as server:
+        yield server
+
+
+@pytest.fixture
+def tester_http_server(http_server, test_resource_path, monkeypatch):
+    http_server.files["/master.zip"] = (
+        test_resource_path / "tmc-python-tester.zip"
+    ).read_bytes()
+    monkeypatch.setattr(
+        tmc_course, "TMC_PYTHON_TESTER_ZIP_URL", http_server.url + "/master.zip"
+    )
+    monkeypatch.setattr(
+        tmc_course, "TMC_PYTHON_TESTER_ARCHIVE_URL", http_server.url + "/{ref}.zip"
+    )
+    return http_server
@@ -1,9 +1,23 @@
+import asyncio
+import contextlib
+import hashlib
+import importlib.metadata
+import io
+import json
 import logging
+import os
 import shutil
-from pathlib import Path
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path, PurePosixPath
 from unittest.mock import ANY, call, patch
 
 import pytest
+import requests
 import responses
 
 from testing.util import assert_dir_equals, normalized_filecmp
@@ -69,6 +83,56 @@ def test_add_skeleton_file(tmp_path):
     )
 
 
+def test_template_render():
+    template = tmc_course.Template.parse(
+        "# {{ assignment }} in {{part}}\n@points({{ points }})\nf'{{unknown}}'\n"
+    )
+    assert (
+        template.render({"assignment": "assg01", "part": "part01", "points": '"p"'})
+        == "# assg01 in part01\n@points(\"p\")\nf'{{unknown}}'\n"
+    )
+
+
+def test_template_without_placeholders():
+    assert tmc_course.Template.parse("plain").render({"points": "x"}) == "plain"
+
+
+def test_load_template_is_cached(tmp_path):
+    tmc_course.load_template.cache_clear()
+    with patch.object(
+        tmc_course.Template, "parse", wraps=tmc_course.Template.parse
+    ) as mock:
+        for name in ("assg01", "assg02", "assg03"):
+            (tmp_path / name).mkdir()
+            tmc_course.create_test_skeleton(tmp_path / name, name, "en")
+        mock.assert_called_once()
+    assert (
+        '@points("assg02")'
+        in (tmp_path / "assg02" / "test" / "test_solution.py").read_text()
+    )
+
+
+def test_init_assignment_course_template_pack(tmp_part, mock_tester_download):
+    pack_path = tmp_part.parent / "templates"
+    pack_path.mkdir()
+    (pack_path / "assignment_solution_en.template").write_text(
+        "# {{ course }}/{{ part }}/{{ assignment }} ({{ language }}): {{ points }}\n"
+    )
+    with (tmp_part.parent / ".tmcproject.yml").open("a") as fh:
+        fh.write("tmc_course:\n  template_pack: templates\n")
+
+    tmc_course.init_assignment(tmp_part.parent, tmp_part.name, "assg01", "en")
+
+    assert (tmp_part / "assg01" / "src" / "solution.py").read_text() == (
+        '# NewCourse/part01/assg01 (en): "assg01"\n'
+    )
+    # Templates missing from the pack come from the built-in pack
+    assert (
+        '@points("assg01")'
+        in (tmp_part / "assg01" / "test" / "test_solution.py").read_text()
+    )
+
+
 def test_init_course(tmp_path):
     course_path = tmp_path / "NewCourse"
     tmc_course.init_course(course_path)
@@ -262,7 +326,7 @@ def test_download_tmc_python_tester(test_resource_path, tmp_path):
 
 
 def test_download_tmc_python_tester_skips_no_update(tmp_path):
-    with patch.object(tmc_course, "requests") as mock:
+    with patch.object(requests, "get") as mock:
         (tmp_path / "tmc-python-tester.zip").touch()
         tmc_course.download_tmc_python_tester(tmp_path, update=False)
         mock.assert_not_called()
@@ -284,6 +348,277 @@ def test_download_tmc_python_tester_updates(test_resource_path, tmp_path):
     assert normalized_filecmp(zip_resource, tmp_path / "tmc-python-tester.zip")
 
 
+TESTER_ZIP_COMMIT = "068859680c7a2449e39579dac236c17bf8e6bbc5"
+
+
+def write_course_config(course_path, **config):
+    with (course_path / ".tmcproject.yml").open("a") as fh:
+        fh.write("tmc_course:\n")
+        for key, value in config.items():
+            fh.write(f"  {key}: {value}\n")
+
+
+def test_read_course_config(tmp_course):
+    with (tmp_course / ".tmcproject.yml").open("a") as fh:
+        fh.write(
+            "# comment\n"
+            "tmc_course:\n"
+            "  tester_ref: abc123 # the ref\n"
+            '  tester_sha256: "0123"\n'
+            "tests_timeout_ms: 1000\n"
+        )
+    assert tmc_course.read_course_config(tmp_course) == {
+        "tester_ref": "abc123",
+        "tester_sha256": "0123",
+    }
+
+
+def test_read_course_config_missing(tmp_path):
+    assert tmc_course.read_course_config(tmp_path) == {}
+
+
+def test_download_tmc_python_tester_local_server(
+    tester_http_server, test_resource_path, tmp_course
+):
+    tmc_course.download_tmc_python_tester(tmp_course, update=True)
+    assert (tmp_course / "tmc-python-tester.zip").read_bytes() == (
+        test_resource_path / "tmc-python-tester.zip"
+    ).read_bytes()
+    assert not (tmp_course / "tmc-python-tester.zip.part").exists()
+    assert [r[1] for r in tester_http_server.requests] == ["/master.zip"]
+
+
+def test_download_tmc_python_tester_resumes(
+    tester_http_server, test_resource_path, tmp_course
+):
+    data = (test_resource_path / "tmc-python-tester.zip").read_bytes()
+    (tmp_course / "tmc-python-tester.zip.part").write_bytes(data[:1000])
+
+    tmc_course.download_tmc_python_tester(tmp_course, update=True)
+
+    assert (tmp_course / "tmc-python-tester.zip").read_bytes() == data
+    assert tester_http_server.requests[0][2]["Range"] == "bytes=1000-"
+
+
+def test_download_tmc_python_tester_restarts_without_range_support(
+    tester_http_server, test_resource_path, tmp_course
+):
+    tester_http_server.supports_range = False
+    data = (test_resource_path / "tmc-python-tester.zip").read_bytes()
+    (tmp_course / "tmc-python-tester.zip.part").write_bytes(b"garbage")
+
+    tmc_course.download_tmc_python_tester(tmp_course, update=True)
+
+    assert (tmp_course / "tmc-python-tester.zip").read_bytes() == data
+
+
+def test_download_tmc_python_tester_partial_already_complete(
+    tester_http_server, test_resource_path, tmp_course
+):
+    data = (test_resource_path / "tmc-python-tester.zip").read_bytes()
+    (tmp_course / "tmc-python-tester.zip.part").write_bytes(data)
+
+    tmc_course.download_tmc_python_tester(tmp_course, update=True)
+
+    assert (tmp_course / "tmc-python-tester.zip").read_bytes() == data
+
+
+def test_download_tmc_python_tester_interrupted(tester_http_server, tmp_course):
+    (tmp_course / "tmc-python-tester.zip").write_bytes(b"previous")
+    tester_http_server.truncate_after = 1000
+
+    with pytest.raises(requests.RequestException):
+        tmc_course.download_tmc_python_tester(tmp_course, update=True)
+
+    # The previous archive is left intact
+    assert (tmp_course / "tmc-python-tester.zip").read_bytes() == b"previous"
+
+    tmc_course.download_tmc_python_tester(tmp_course, update=True)
+    assert tmc_course.zipfile.is_zipfile(tmp_course / "tmc-python-tester.zip")
+
+
+def test_download_tmc_python_tester_sha256_pin(
+    tester_http_server, test_resource_path, tmp_course
+):
+    data = (test_resource_path / "tmc-python-tester.zip").read_bytes()
+    write_course_config(tmp_course, tester_sha256=hashlib.sha256(data).hexdigest())
+
+    tmc_course.download_tmc_python_tester(tmp_course, update=True)
+    assert (tmp_course / "tmc-python-tester.zip").read_bytes() == data
+
+    # Already matches the pin, so there is nothing to download
+    tmc_course.download_tmc_python_tester(tmp_course, update=True)
+    assert len(tester_http_server.requests) == 1
+
+
+def test_download_tmc_python_tester_sha256_mismatch(tester_http_server, tmp_course):
+    write_course_config(tmp_course, tester_sha256="0" * 64)
+
+    with pytest.raises(ValueError, match="SHA-256"):
+        tmc_course.download_tmc_python_tester(tmp_course, update=True)
+
+    assert not (tmp_course / "tmc-python-tester.zip").exists()
+    assert not (tmp_course / "tmc-python-tester.zip.part").exists()
+
+
+def test_download_tmc_python_tester_sha256_pin_replaces_existing(
+    tester_http_server, test_resource_path, tmp_course
+):
+    data = (test_resource_path / "tmc-python-tester.zip").read_bytes()
+    write_course_config(tmp_course, tester_sha256=hashlib.sha256(data).hexdigest())
+    (tmp_course / "tmc-python-tester.zip").write_bytes(data[:1000])
+
+    tmc_course.download_tmc_python_tester(tmp_course, update=False)
+
+    assert (tmp_course / "tmc-python-tester.zip").read_bytes() == data
+
+
+def test_download_tmc_python_tester_ref_pin(
+    tester_http_server, test_resource_path, tmp_course
+):
+    write_course_config(tmp_course, tester_ref=TESTER_ZIP_COMMIT[:12])
+    tester_http_server.files[f"/{TESTER_ZIP_COMMIT[:12]}.zip"] = (
+        test_resource_path / "tmc-python-tester.zip"
+    ).read_bytes()
+
+    tmc_course.download_tmc_python_tester(tmp_course, update=True)
+
+    assert [r[1] for r in tester_http_server.requests] == [
+        f"/{TESTER_ZIP_COMMIT[:12]}.zip"
+    ]
+    assert (tmp_course / "tmc-python-tester.zip").exists()
+
+
+def test_download_tmc_python_tester_ref_mismatch(
+    tester_http_server, test_resource_path, tmp_course
+):
+    tester_http_server.files["/deadbeef.zip"] = (
+        test_resource_path / "tmc-python-tester.zip"
+    ).read_bytes()
+    write_course_config(tmp_course, tester_ref="deadbeef")
+
+    with pytest.raises(ValueError, match="commit"):
+        tmc_course.download_tmc_python_tester(tmp_course, update=True)
+    assert not (tmp_course / "tmc-python-tester.zip").exists()
+
+
+@pytest.fixture
+def offline():
+    with patch.object(requests, "get", side_effect=AssertionError("network access")):
+        yield
+
+
+def test_tmc_python_tester_vendored(tmp_course, test_resource_path, offline):
+    write_course_config(tmp_course, tester_source="vendored")
+    tmc_course.download_tmc_python_tester(tmp_course, update=True)
+    assert (tmp_course / "tmc-python-tester.zip").read_bytes() == (
+        test_resource_path / "tmc-python-tester.zip"
+    ).read_bytes()
+
+
+def test_tmc_python_tester_local_zip(tmp_course, test_resource_path, offline):
+    shutil.copy(test_resource_path / "tmc-python-tester.zip", tmp_course / "t.zip")
+    write_course_config(tmp_course, tester_source="t.zip")
+    tmc_course.download_tmc_python_tester(tmp_course, update=True)
+    assert (tmp_course / "tmc-python-tester.zip").read_bytes() == (
+        test_resource_path / "tmc-python-tester.zip"
+    ).read_bytes()
+
+
+def test_tmc_python_tester_file_url(tmp_course, test_resource_path, offline):
+    zip_resource = test_resource_path / "tmc-python-tester.zip"
+    write_course_config(tmp_course, tester_source=zip_resource.resolve().as_uri())
+    tmc_course.download_tmc_python_tester(tmp_course, update=True)
+    assert (
+        tmp_course / "tmc-python-tester.zip"
+    ).read_bytes() == zip_resource.read_bytes()
+
+
+def test_tmc_python_tester_directory(tmp_path, tmp_part, test_resource_path, offline):
+    tester_path = tmp_path / "tmc-python-tester"
+    shutil.copytree(
+        test_resource_path / "valid_course" / "valid_part" / "valid_assignment_en",
+        tester_path,
+        ignore=shutil.ignore_patterns("__pycache__"),
+    )
+    write_course_config(tmp_part.parent, tester_source=str(tester_path))
+
+    tmc_course.init_assignment(tmp_part.parent, tmp_part.name, "assg01", "en")
+
+    assert_dir_equals(tester_path / "tmc", tmp_part / "assg01" / "tmc")
+
+
+def test_tmc_python_tester_directory_invalid(tmp_path, tmp_course):
+    write_course_config(tmp_course, tester_source=str(tmp_path))
+    with pytest.raises(ValueError):
+        tmc_course.download_tmc_python_tester(tmp_course, update=True)
+
+
+def test_tmc_python_tester_lockfile(tmp_course, test_resource_path, offline):
+    data = (test_resource_path / "tmc-python-tester.zip").read_bytes()
+    write_course_config(tmp_course, tester_source="vendored")
+    tmc_course.download_tmc_python_tester(tmp_course, update=False)
+
+    lock = tmc_course.read_tmc_python_tester_lock(tmp_course)
+    assert lock == {
+        "source": "vendored",
+        "commit": TESTER_ZIP_COMMIT,
+        "sha256": hashlib.sha256(data).hexdigest(),
+    }
+
+
+def test_tmc_python_tester_lockfile_is_enforced(tmp_course, test_resource_path):
+    shutil.copy(test_resource_path / "tmc-python-tester.zip", tmp_course / "t.zip")
+    write_course_config(tmp_course, tester_source="t.zip")
+    tmc_course.download_tmc_python_tester(tmp_course, update=False)
+
+    # The source changes under our feet
+    (tmp_course / "tmc-python-tester.zip").unlink()
+    shutil.copy(
+        test_resource_path / "tmc-python-tester-for-update-test.zip",
+        tmp_course / "t.zip",
+    )
+    with pytest.raises(ValueError, match="SHA-256"):
+        tmc_course.download_tmc_python_tester(tmp_course, update=False)
+
+    # Updating refreshes the lock
+    tmc_course.download_tmc_python_tester(tmp_course, update=True)
+    lock = tmc_course.read_tmc_python_tester_lock(tmp_course)
+    assert lock["sha256"] == tmc_course.file_sha256(tmp_course / "t.zip")
+
+
+def test_tmc_python_tester_lockfile_commit_is_fetched(
+    tester_http_server, test_resource_path, tmp_course
+):
+    data = (test_resource_path / "tmc-python-tester.zip").read_bytes()
+    tmc_course.download_tmc_python_tester(tmp_course, update=False)
+
+    # A fresh clone after the default branch has moved on
+    (tmp_course / "tmc-python-tester.zip").unlink()
+    tester_http_server.files["/master.zip"] = (
+        test_resource_path / "tmc-python-tester-for-update-test.zip"
+    ).read_bytes()
+    tester_http_server.files[f"/{TESTER_ZIP_COMMIT}.zip"] = data
+    tmc_course.download_tmc_python_tester(tmp_course, update=False)
+
+    assert (tmp_course / "tmc-python-tester.zip").read_bytes() == data
+    assert [r[1] for r in tester_http_server.requests] == [
+        "/master.zip",
+        f"/{TESTER_ZIP_COMMIT}.zip",
+    ]
+
+
+def test_update_course_offline(tmp_part, offline):
+    write_course_config(tmp_part.parent, tester_source="vendored")
+    tmc_course.init_assignment(tmp_part.parent, tmp_part.name, "assg01", "en")
+    (tmp_part / "assg01" / "tmc" / "points.py").unlink()
+
+    results = tmc_course.update_course(tmp_part.parent)
+
+    assert [r.status for r in results] == [tmc_course.UpdateStatus.UPDATED]
+    assert (tmp_part / "assg01" / "tmc" / "points.py").exists()
+
+
 @responses.activate
 def test_create_tmc_dir(test_resource_path, tmp_part):
     expected_path = (
@@ -307,6 +642,52 @@ def test_create_tmc_dir(test_resource_path, tmp_part):
     assert_dir_equals(expected_path, assg_path / "tmc")
 
 
+def test_extract_tmc_python_tester(test_resource_path, tmp_path):
+    tmc_course.extract_tmc_python_tester(
+        test_resource_path / "tmc-python-tester.zip", tmp_path
+    )
+    assert_dir_equals(
+        test_resource_path
+        / "valid_course"
+        / "valid_part"
+        / "valid_assignment_en"
+        / "tmc",
+        tmp_path,
+        ignore=["__pycache__"],
+    )
+
+
+def test_link_or_copy_hard_links(tmp_path):
+    (tmp_path / "source.txt").write_text("content")
+    (tmp_path / "destination.txt").write_text("old content")
+    tmc_course.link_or_copy(tmp_path / "source.txt", tmp_path / "destination.txt")
+    assert (tmp_path / "destination.txt").read_text() == "content"
+    assert (tmp_path / "source.txt").stat().st_nlink == 2
+
+
+def test_link_or_copy_falls_back_to_reflink(tmp_path):
+    (tmp_path / "source.txt").write_text("content")
+    with (
+        patch.object(tmc_course.os, "link", side_effect=OSError),
+        patch.object(tmc_course, "reflink", wraps=tmc_course.reflink) as mock,
+    ):
+        tmc_course.link_or_copy(tmp_path / "source.txt", tmp_path / "destination.txt")
+        mock.assert_called_once()
+    assert (tmp_path / "destination.txt").read_text() == "content"
+    assert (tmp_path / "source.txt").stat().st_nlink == 1
+
+
+def test_link_or_copy_falls_back_to_copy(tmp_path):
+    (tmp_path / "source.txt").write_text("content")
+    with (
+        patch.object(tmc_course.os, "link", side_effect=OSError),
+        patch.object(tmc_course, "reflink", side_effect=OSError),
+    ):
+        tmc_course.link_or_copy(tmp_path / "source.txt", tmp_path / "destination.txt")
+    assert (tmp_path / "destination.txt").read_text() == "content"
+    assert (tmp_path / "source.txt").stat().st_nlink == 1
+
+
 @responses.activate
 def test_init_assignment_en(test_resource_path, tmp_part):
     url = (
@@ -370,6 +751,158 @@ def test_init_assignment_tgt_exists_asks_user(tmp_part):
         mock.assert_called_once()
 
 
+MANIFEST_YML = """
+course: NewCourse
+parts:
+  - name: part01
+    assignments:
+      - name: valid_assignment_en
+        points: [valid_assignment_en]
+      - name: valid_assignment_fi
+        language: fi
+  - name: part02
+    assignments:
+      - name: assg03
+        points: [p1, p2]
+"""
+
+
+def test_init_from_manifest_yml(tmp_path, test_resource_path, mock_tester_download):
+    (tmp_path / "manifest.yml").write_text(MANIFEST_YML)
+
+    with patch.object(
+        tmc_course,
+        "extract_tmc_python_tester",
+        wraps=tmc_course.extract_tmc_python_tester,
+    ) as mock:
+        paths = tmc_course.init_from_manifest(tmp_path / "manifest.yml", jobs=3)
+        mock.assert_called_once()
+
+    course_path = tmp_path / "NewCourse"
+    assert tmc_course.is_valid_course(course_path)
+    assert paths == [
+        course_path / "part01" / "valid_assignment_en",
+        course_path / "part01" / "valid_assignment_fi",
+        course_path / "part02" / "assg03",
+    ]
+    for name in ("valid_assignment_en", "valid_assignment_fi"):
+        assert_dir_equals(
+            test_resource_path / "valid_course" / "valid_part" / name,
+            course_path / "part01" / name,
+            ignore=["__pycache__"],
+        )
+    test_file = course_path / "part02" / "assg03" / "test" / "test_solution.py"
+    assert '@points("p1", "p2")' in test_file.read_text()
+
+
+def test_init_from_manifest_csv(tmp_course, mock_tester_download):
+    (tmp_course / "manifest.csv").write_text(
+        "part,assignment,language,points\n"
+        "part01,assg01,en,\n"
+        "part01,assg02,fi,p1 p2\n"
+        "part02,assg03,en,p3\n"
+    )
+    (tmp_course / ".tmcproject.yml").write_text("custom: config\n")
+
+    tmc_course.init_from_manifest(tmp_course / "manifest.csv")
+
+    # The existing course is kept as is
+    assert (tmp_course / ".tmcproject.yml").read_text() == "custom: config\n"
+    assert tmc_course.is_valid_assignment(tmp_course / "part01" / "assg01")
+    assert (
+        '@points("p1", "p2")'
+        in (tmp_course / "part01" / "assg02" / "test" / "test_ratkaisu.py").read_text()
+    )
+    assert (
+        '@points("p3")'
+        in (tmp_course / "part02" / "assg03" / "test" / "test_solution.py").read_text()
+    )
+
+
+def test_init_from_manifest_validates_everything_first(tmp_course):
+    (tmp_course / "manifest.csv").write_text(
+        "part,assignment,language,points\n"
+        "part01,assg01,en,p1\n"
+        "part-01,assg02,en,p2\n"
+        "part01,assg03,sv,p1\n"
+        "part01,assg01,en,p4 'p5'\n"
+    )
+    with pytest.raises(ValueError) as excinfo:
+        tmc_course.init_from_manifest(tmp_course / "manifest.csv")
+
+    message = str(excinfo.value)
+    assert "part-01/assg02: part name must be alphanumeric" in message
+    assert "part01/assg03: language must be 'fi' or 'en'" in message
+    assert "part01/assg03: point 'p1' is already used by part01/assg01" in message
+    assert "part01/assg01: listed more than once" in message
+    assert "part01/assg01: invalid point name \"'p5'\"" in message
+    assert not (tmp_course / "part01").exists()
+
+
+def test_init_from_manifest_validates_yml_structure(tmp_course):
+    (tmp_course / "manifest.yml").write_text(
+        "parts:\n"
+        "  - part01\n"
+        "  - name: part02\n"
+        "    assignments: assg01\n"
+        "  - name: part03\n"
+        "    assignments:\n"
+        "      - assg01\n"
+        "      - name: assg02\n"
+        "        points: {p1: 1}\n"
+        "      - name: assg-03\n"
+    )
+    with pytest.raises(ValueError) as excinfo:
+        tmc_course.init_from_manifest(tmp_course / "manifest.yml")
+
+    message = str(excinfo.value)
+    assert "part 1: must be a mapping, not 'part01'" in message
+    assert "part02: assignments must be a list" in message
+    assert "part03: assignment 1 must be a mapping, not 'assg01'" in message
+    assert "part03/assg02: points must be a list" in message
+    assert "part03/assg-03: assignment name must be alphanumeric" in message
+    assert not (tmp_course / "part03").exists()
+
+
+def test_init_from_manifest_asks_once(tmp_part, mock_tester_download):
+    (tmp_part / "assg01").mkdir()
+    (tmp_part.parent / "manifest.csv").write_text(
+        "part,assignment\npart01,assg01\npart01,assg02\n"
+    )
+    with patch.object(tmc_course, "check_from_user") as mock:
+        tmc_course.init_from_manifest(tmp_part.parent / "manifest.csv")
+        mock.assert_called_once()
+
+    with patch.object(tmc_course, "check_from_user") as mock:
+        tmc_course.init_from_manifest(tmp_part.parent / "manifest.csv", assume_yes=True)
+        mock.assert_not_called()
+
+
+def test_init_from_manifest_asks_before_initializing_course(tmp_path):
+    course_path = tmp_path / "course"
+    course_path.mkdir()
+    (course_path / ".gitignore").write_text("mine\n")
+    (course_path / "manifest.csv").write_text("part,assignment\npart01,assg01\n")
+
+    with patch.object(tmc_course, "check_from_user", side_effect=SystemExit) as mock:
+        with pytest.raises(SystemExit):
+            tmc_course.init_from_manifest(course_path / "manifest.csv")
+    mock.assert_called_once()
+    assert (course_path / ".gitignore").read_text() == "mine\n"
+
+
+def test_init_from_manifest_validates_course_name(tmp_path):
+    course_path = tmp_path / "new-course"
+    course_path.mkdir()
+    (course_path / "manifest.csv").write_text("part,assignment\npart01,assg01\n")
+
+    with pytest.raises(ValueError) as excinfo:
+        tmc_course.init_from_manifest(course_path / "manifest.csv", assume_yes=True)
+
+    assert "new-course: course name must be alphanumeric" in str(excinfo.value)
+    assert list(course_path.iterdir()) == [course_path / "manifest.csv"]
+
+
 def test_is_valid_assignment(test_resource_path):
     assert tmc_course.is_valid_assignment(
         test_resource_path / "valid_course" / "valid_part" / "valid_assignment_en"
@@ -491,6 +1024,478 @@ def test_update_course(tmp_course, test_resource_path):
     assert len(list((tmp_course / "part01" / "utils").iterdir())) == 1
 
 
+def test_update_course_extracts_tester_once(tmp_assignments, test_resource_path):
+    for assignment_path in tmp_assignments:
+        (assignment_path / "tmc" / "points.py").write_text("MODIFIED")
+
+    with patch.object(
+        tmc_course,
+        "extract_tmc_python_tester",
+        wraps=tmc_course.extract_tmc_python_tester,
+    ) as mock:
+        tmc_course.update_course(tmp_assignments[0].parent.parent)
+        mock.assert_called_once()
+
+    for assignment_path in tmp_assignments:
+        assert_dir_equals(
+            test_resource_path
+            / "valid_course"
+            / "valid_part"
+            / "valid_assignment_en"
+            / "tmc",
+            assignment_path / "tmc",
+            ignore=["__pycache__"],
+        )
+    # The staging directory is cleaned up after the update
+    assert not list(tmp_assignments[0].parent.parent.glob(".tmc-python-tester-*"))
+
+
+def test_update_course_noop_does_not_touch_files(tmp_assignments):
+    stats = {
+        path: path.stat()
+        for assignment_path in tmp_assignments
+        for path in (assignment_path / "tmc").iterdir()
+    }
+
+    with patch.object(tmc_course, "extract_tmc_python_tester") as mock:
+        results = tmc_course.update_course(tmp_assignments[0].parent.parent)
+        mock.assert_not_called()
+
+    assert len(results) == 3
+    assert all(r.status == tmc_course.UpdateStatus.SKIPPED for r in results)
+    for path, stat in stats.items():
+        assert path.stat().st_ino == stat.st_ino
+        assert path.stat().st_mtime_ns == stat.st_mtime_ns
+
+
+def test_update_course_only_rewrites_changed_files(tmp_assignments):
+    tmc_path = tmp_assignments[0] / "tmc"
+    (tmc_path / "points.py").write_text("MODIFIED")
+    (tmc_path / "runner.py").unlink()
+    (tmc_path / "extra.py").write_text("STALE")
+    (tmc_path / "stale" / "nested").mkdir(parents=True)
+    (tmc_path / "stale" / "nested" / "file.py").write_text("STALE")
+    (tmc_path / "__pycache__").mkdir(exist_ok=True)
+    (tmc_path / "__pycache__" / "points.cpython-311.pyc").write_text("CACHE")
+    utils_inode = (tmc_path / "utils.py").stat().st_ino
+
+    results = tmc_course.update_course(tmp_assignments[0].parent.parent)
+
+    assert [r.status for r in results] == [
+        tmc_course.UpdateStatus.UPDATED,
+        tmc_course.UpdateStatus.SKIPPED,
+        tmc_course.UpdateStatus.SKIPPED,
+    ]
+    diff = results[0].diff
+    assert diff.added == [PurePosixPath("runner.py")]
+    assert diff.changed == [PurePosixPath("points.py")]
+    assert diff.removed == [
+        PurePosixPath("extra.py"),
+        PurePosixPath("stale/nested/file.py"),
+    ]
+    assert (tmc_path / "runner.py").exists()
+    assert (tmc_path / "points.py").read_text() != "MODIFIED"
+    assert not (tmc_path / "extra.py").exists()
+    assert not (tmc_path / "stale").exists()
+    assert (tmc_path / "__pycache__" / "points.cpython-311.pyc").exists()
+    assert (tmc_path / "utils.py").stat().st_ino == utils_inode
+
+
+def test_update_course_dry_run(tmp_assignments, capsys):
+    tmc_path = tmp_assignments[1] / "tmc"
+    (tmc_path / "points.py").write_text("MODIFIED")
+    (tmc_path / "runner.py").unlink()
+    (tmc_path / "extra.py").write_text("STALE")
+    course_path = tmp_assignments[1].parent.parent
+    tester_files = [
+        course_path / "tmc-python-tester.zip",
+        course_path / tmc_course.TMC_PYTHON_TESTER_LOCKFILE,
+    ]
+    tester_stats = [path.stat().st_mtime_ns for path in tester_files]
+
+    results = tmc_course.update_course(course_path, dry_run=True)
+
+    assert [r.status for r in results] == [
+        tmc_course.UpdateStatus.SKIPPED,
+        tmc_course.UpdateStatus.UPDATED,
+        tmc_course.UpdateStatus.SKIPPED,
+    ]
+    assert (tmc_path / "points.py").read_text() == "MODIFIED"
+    assert not (tmc_path / "runner.py").exists()
+    assert (tmc_path / "extra.py").exists()
+    output = capsys.readouterr().out
+    assert str(tmc_path) in output
+    assert "+ runner.py" in output
+    assert "~ points.py" in output
+    assert "- extra.py" in output
+    assert str(tmp_assignments[0]) not in output
+    # Not even the TMC-python-tester of the course is replaced
+    assert [path.stat().st_mtime_ns for path in tester_files] == tester_stats
+    assert not list(course_path.glob("*.part"))
+
+
+def test_update_course_concurrently(tmp_assignments, test_resource_path, caplog):
+    for assignment_path in tmp_assignments:
+        (assignment_path / "tmc" / "points.py").write_text("MODIFIED")
+
+    with (
+        caplog.at_level(logging.INFO),
+        patch.object(
+            tmc_course,
+            "extract_tmc_python_tester",
+            wraps=tmc_course.extract_tmc_python_tester,
+        ) as mock,
+    ):
+        results = tmc_course.update_course(tmp_assignments[0].parent.parent, jobs=3)
+        mock.assert_called_once()
+
+    assert [r.assignment_path for r in results] == tmp_assignments
+    assert all(r.status == tmc_course.UpdateStatus.UPDATED for r in results)
+    for assignment_path in tmp_assignments:
+        assert_dir_equals(
+            test_resource_path
+            / "valid_course"
+            / "valid_part"
+            / "valid_assignment_en"
+            / "tmc",
+            assignment_path / "tmc",
+            ignore=["__pycache__"],
+        )
+    assert "3 updated, 0 up to date, 0 failed" in caplog.text
+
+
+def test_update_course_reports_failures(tmp_assignments, caplog):
+    (tmp_assignments[1] / "tmc" / "points.py").write_text("MODIFIED")
+    (tmp_assignments[2] / "tmc" / "points.py").write_text("MODIFIED")
+    link_or_copy = tmc_course.link_or_copy
+
+    def failing_link_or_copy(source, destination):
+        if tmp_assignments[1] in destination.parents:
+            raise PermissionError("read-only")
+        link_or_copy(source, destination)
+
+    with (
+        caplog.at_level(logging.INFO),
+        patch.object(tmc_course, "link_or_copy", failing_link_or_copy),
+    ):
+        results = tmc_course.update_course(tmp_assignments[0].parent.parent, jobs=2)
+
+    assert [r.status for r in results] == [
+        tmc_course.UpdateStatus.SKIPPED,
+        tmc_course.UpdateStatus.FAILED,
+        tmc_course.UpdateStatus.UPDATED,
+    ]
+    assert results[1].error == "read-only"
+    assert f"Failed to update {tmp_assignments[1]}: read-only" in caplog.text
+    assert "1 updated, 1 up to date, 1 failed" in caplog.text
+
+
+def test_strip_solution():
+    assert tmc_course.strip_solution(
+        "import math\n"
+        "# BEGIN SOLUTION\n"
+        "def f():\n"
+        "    return 1\n"
+        "# END SOLUTION\n"
+        "# STUB: def f():\n"
+        "#     STUB: pass\n"
+        "class A:\n"
+        "    # BEGIN SOLUTION\n"
+        "    x = 1\n"
+        "    # END SOLUTION\n"
+        "    # STUB: x = None\n"
+    ) == ("import math\ndef f():\n#     STUB: pass\nclass A:\n    x = None\n")
+
+
+def test_strip_solution_solution_file():
+    assert tmc_course.strip_solution("x = 1\n# SOLUTION FILE\n") is None
+
+
+@pytest.mark.parametrize(
+    "text",
+    (
+        "# BEGIN SOLUTION\n",
+        "# END SOLUTION\n",
+        "# BEGIN SOLUTION\n# BEGIN SOLUTION\n# END SOLUTION\n",
+    ),
+)
+def test_strip_solution_unbalanced(text):
+    with pytest.raises(ValueError):
+        tmc_course.strip_solution(text)
+
+
+def test_export_stubs(test_resource_path, tmp_path):
+    course_path = tmp_path / "course"
+    shutil.copytree(test_resource_path / "valid_course", course_path)
+    (course_path / "valid_part" / "valid_assignment_en" / "__pycache__").mkdir()
+    (course_path / ".gitignore").write_text("notes.txt\n")
+    (course_path / "notes.txt").write_text("Not for students\n")
+    (course_path / "README.md").write_text("# Course\n")
+    (course_path / "tmc-python-tester.lock").write_text("{}\n")
+    out_path = tmp_path / "out"
+
+    exported = tmc_course.export_stubs(course_path, out_path, jobs=2)
+
+    assert sorted(exported) == [
+        out_path / "valid_part" / "valid_assignment_en",
+        out_path / "valid_part" / "valid_assignment_fi",
+    ]
+    assert (
+        out_path / "valid_part" / "valid_assignment_en" / "src" / "solution.py"
+    ).read_text() == "# Write your answer here\n"
+    assert (
+        out_path / "valid_part" / "valid_assignment_fi" / "src" / "ratkaisu.py"
+    ).read_text() == "# Kirjoita ratkaisu tähän\n"
+    assert_dir_equals(
+        course_path / "valid_part" / "valid_assignment_en" / "test",
+        out_path / "valid_part" / "valid_assignment_en" / "test",
+        ignore=["__pycache__"],
+    )
+    assert not (
+        out_path / "valid_part" / "valid_assignment_en" / "__pycache__"
+    ).exists()
+    assert sorted(path.name for path in out_path.iterdir() if path.is_file()) == [
+        ".gitignore",
+        ".tmc-export-manifest.json",
+        ".tmcproject.yml",
+        "README.md",
+    ]
+
+
+def test_export_stubs_incremental(test_resource_path, tmp_path):
+    course_path = tmp_path / "course"
+    shutil.copytree(test_resource_path / "valid_course", course_path)
+    out_path = tmp_path / "out"
+    tmc_course.export_stubs(course_path, out_path)
+
+    assert tmc_course.export_stubs(course_path, out_path) == []
+
+    solution = (
+        course_path / "valid_part" / "valid_assignment_fi" / "src" / "ratkaisu.py"
+    )
+    solution.write_text(solution.read_text() + "# STUB: # one more line\n")
+    assert tmc_course.export_stubs(course_path, out_path) == [
+        out_path / "valid_part" / "valid_assignment_fi"
+    ]
+    assert (
+        (out_path / "valid_part" / "valid_assignment_fi" / "src" / "ratkaisu.py")
+        .read_text()
+        .endswith("# one more line\n")
+    )
+
+    shutil.rmtree(course_path / "valid_part" / "valid_assignment_en")
+    assert tmc_course.export_stubs(course_path, out_path) == []
+    assert not (out_path / "valid_part" / "valid_assignment_en").exists()
+    # Parts go too once they're empty
+    shutil.rmtree(course_path / "valid_part" / "valid_assignment_fi")
+    assert tmc_course.export_stubs(course_path, out_path) == []
+    assert not (out_path / "valid_part").exists()
+
+
+def test_export_stubs_invalid_course(tmp_path):
+    with pytest.raises(ValueError):
+        tmc_course.export_stubs(tmp_path, tmp_path / "out")
+
+
+def test_main_export(tmp_course, tmp_path):
+    with patch.object(tmc_course, "export_stubs") as mock:
+        tmc_course.main(["export", str(tmp_course), "--stubs", str(tmp_path / "out")])
+        mock.assert_called_once_with(tmp_course, tmp_path / "out", jobs=1)
+
+
+@pytest.mark.parametrize(
+    "pattern, path, is_dir, expected",
+    (
+        ("*.log", "a.log", False, True),
+        ("*.log", "src/a.log", False, True),
+        ("*.log", "a.log.txt", False, False),
+        ("/a.log", "src/a.log", False, False),
+        ("src/*.py", "src/a.py", False, True),
+        ("src/*.py", "src/sub/a.py", False, False),
+        ("src/**/*.py", "src/sub/a.py", False, True),
+        ("data/", "data", True, True),
+        ("data/", "data", False, False),
+        ("file?.txt", "file1.txt", False, True),
+        ("file[0-9].txt", "filex.txt", False, False),
+    ),
+)
+def test_is_gitignored(pattern, path, is_dir, expected):
+    patterns = [
+        tmc_course.GitignorePattern(
+            tmc_course.gitignore_regex(pattern.rstrip("/")), False, pattern[-1] == "/"
+        )
+    ]
+    assert tmc_course.is_gitignored(path, is_dir, patterns) == expected
+
+
+def test_read_gitignore_negation(tmp_path):
+    (tmp_path / ".gitignore").write_text("# comment\n\n*.txt\n!keep.txt\n")
+    patterns = tmc_course.read_gitignore(tmp_path / ".gitignore")
+    assert tmc_course.is_gitignored("drop.txt", False, patterns)
+    assert not tmc_course.is_gitignored("keep.txt", False, patterns)
+
+
+@pytest.fixture
+def pack_course_path(test_resource_path, tmp_path):
+    course_path = tmp_path / "course"
+    shutil.copytree(test_resource_path / "valid_course", course_path)
+    (course_path / ".gitignore").write_text("__pycache__/\n*.log\n/valid_part/*/tmp/\n")
+    assignment_path = course_path / "valid_part" / "valid_assignment_en"
+    (assignment_path / ".gitignore").write_text("secret.txt\n")
+    (assignment_path / "__pycache__").mkdir(exist_ok=True)
+    (assignment_path / "__pycache__" / "x.pyc").write_text("cache")
+    (assignment_path / ".tmc_test_results.json").write_text("[]")
+    (assignment_path / "run.log").write_text("log")
+    (assignment_path / "secret.txt").write_text("secret")
+    (assignment_path / "tmp").mkdir()
+    (assignment_path / "tmp" / "file.txt").write_text("tmp")
+    (assignment_path / "src" / "data.txt").write_text("data")
+    return course_path
+
+
+def test_pack_course(pack_course_path, tmp_path):
+    out_path = tmp_path / "out"
+    packed = tmc_course.pack_course(pack_course_path, out_path, jobs=2)
+
+    zip_path = out_path / "valid_part" / "valid_assignment_en.zip"
+    assert sorted(packed) == [
+        zip_path,
+        out_path / "valid_part" / "valid_assignment_fi.zip",
+    ]
+    with tmc_course.zipfile.ZipFile(zip_path) as assignment_zip:
+        names = assignment_zip.namelist()
+        assert assignment_zip.testzip() is None
+        infos = assignment_zip.infolist()
+    assert names == sorted(names)
+    assert "valid_assignment_en/src/data.txt" in names
+    assert "valid_assignment_en/tmc/__main__.py" in names
+    assert "valid_assignment_en/.gitignore" in names
+    assert not any(
+        excluded in name
+        for name in names
+        for excluded in (
+            "__pycache__",
+            ".tmc_test_results.json",
+            "run.log",
+            "secret.txt",
+            "tmp/",
+        )
+    )
+    assert all(info.date_time == (1980, 1, 1, 0, 0, 0) for info in infos)
+
+
+def test_pack_course_is_reproducible(pack_course_path, tmp_path):
+    tmc_course.pack_course(pack_course_path, tmp_path / "out1")
+    for path in pack_course_path.rglob("*"):
+        os.utime(path, (0, 0))
+    tmc_course.pack_course(pack_course_path, tmp_path / "out2")
+
+    for name in ("valid_assignment_en.zip", "valid_assignment_fi.zip"):
+        assert (tmp_path / "out1" / "valid_part" / name).read_bytes() == (
+            tmp_path / "out2" / "valid_part" / name
+        ).read_bytes()
+
+
+def test_pack_course_skips_unchanged(pack_course_path, tmp_path):
+    out_path = tmp_path / "out"
+    tmc_course.pack_course(pack_course_path, out_path)
+    assert tmc_course.pack_course(pack_course_path, out_path) == []
+
+    # Ignored files don't count as changes
+    assignment_path = pack_course_path / "valid_part" / "valid_assignment_en"
+    (assignment_path / "other.log").write_text("log")
+    assert tmc_course.pack_course(pack_course_path, out_path) == []
+
+    (assignment_path / "src" / "solution.py").write_text("# changed\n")
+    assert tmc_course.pack_course(pack_course_path, out_path) == [
+        out_path / "valid_part" / "valid_assignment_en.zip"
+    ]
+
+    shutil.rmtree(assignment_path)
+    assert tmc_course.pack_course(pack_course_path, out_path) == []
+    assert not (out_path / "valid_part" / "valid_assignment_en.zip").exists()
+    assert (out_path / "valid_part" / "valid_assignment_fi.zip").exists()
+
+
+def test_main_pack(tmp_course, tmp_path, capsys):
+    with patch.object(tmc_course, "pack_course") as mock:
+        mock.return_value = [tmp_path / "out" / "part01" / "assg01.zip"]
+        tmc_course.main(["pack", str(tmp_course), "--out", str(tmp_path / "out")])
+        mock.assert_called_once_with(tmp_course, tmp_path / "out", jobs=1)
+    assert str(tmp_path / "out" / "part01" / "assg01.zip") in capsys.readouterr().out
+
+
+def test_course_model(tmp_assignments):
+    course_path = tmp_assignments[0].parent.parent
+    course = tmc_course.Course(course_path)
+
+    assert [part.name for part in course.parts] == ["part01"]
+    part = course.part("part01")
+    assert part.course is course
+    assert part.assignments == course.assignments
+    assert [assignment.path for assignment in part.assignments] == tmp_assignments
+    assignment = part.assignment("assg02")
+    assert assignment.course is course
+    assert assignment.task == tmc_course.TestTask(tmp_assignments[1])
+    assert assignment.content_hash == tmc_course.assignment_content_hash(
+        tmp_assignments[1]
+    )
+    assert assignment.files == tmc_course.assignment_files(tmp_assignments[1])
+    assert course.config == {}
+    assert not hasattr(course, "__dict__") and not hasattr(assignment, "__dict__")
+    with pytest.raises(ValueError):
+        course.part("part02")
+    with pytest.raises(ValueError):
+        part.assignment("assg04")
+
+
+def test_course_model_caches_discovery(tmp_assignments, tmp_path):
+    course = tmc_course.Course(tmp_assignments[0].parent.parent)
+    assert len(course.assignments) == 3
+    tmc_course.init_part(course.path, "part02")
+
+    with patch.object(
+        tmc_course, "is_valid_assignment", wraps=tmc_course.is_valid_assignment
+    ) as mock:
+        assert [part.name for part in course.parts] == ["part01"]
+        course.export(tmp_path / "stubs")
+        course.pack(tmp_path / "packed")
+        assert course.check() == []
+        mock.assert_not_called()
+
+    course.refresh()
+    assert [part.name for part in course.parts] == ["part01", "part02"]
+
+
+def test_course_model_init(tmp_path, mock_tester_download):
+    course = tmc_course.Course.init(tmp_path / "NewCourse")
+    part = course.init_part("part01")
+    assignment = part.init_assignment("assg01", "en", ["p1"])
+
+    assert course.parts == [part]
+    assert part.assignments == [assignment]
+    assert tmc_course.is_valid_assignment(assignment.path)
+    with pytest.raises(ValueError):
+        part.init_assignment("foo/bar", "en")
+
+
+def test_course_model_invalid(tmp_path):
+    with pytest.raises(ValueError):
+        tmc_course.Course(tmp_path)
+
+
+def test_course_model_test(test_resource_path):
+    course = tmc_course.Course(test_resource_path / "test_runner_test_some_pass")
+
+    success, results = course.test()
+    assert not success
+    assert [result.task for result in results] == [a.task for a in course.assignments]
+
+    failing = next(r.task.path for r in results if not r.success)
+    part = course.part(failing.parent.name)
+    assert part.assignment(failing.name).test() == (False, [ANY])
+
+
 def test_main_init_course(tmp_path):
     course_paths = [tmp_path / "NewCourse1", tmp_path / "NewCourse2"]
     with patch.object(tmc_course, "init_course") as mock:
@@ -547,10 +1552,41 @@ def test_main_init_assignment_en(tmp_course):
         )
 
 
+def test_main_init_from_manifest(tmp_path):
+    with patch.object(tmc_course, "init_from_manifest") as mock:
+        tmc_course.main(["init", "--from", "manifest.yml", "--yes", "-j", "4"])
+        mock.assert_called_once_with(Path("manifest.yml"), assume_yes=True, jobs=4)
+
+
+def test_main_init_requires_type_or_manifest():
+    with pytest.raises(SystemExit):
+        tmc_course.main(["init"])
+    with pytest.raises(SystemExit):
+        tmc_course.main(["init", "--from", "manifest.yml", "course"])
+
+
 def test_main_update(tmp_course):
     with patch.object(tmc_course, "update_course") as mock:
         tmc_course.main(["update", str(tmp_course)])
-        mock.assert_called_once_with(tmp_course)
+        mock.assert_called_once_with(tmp_course, dry_run=False, jobs=1)
+
+
+def test_main_update_dry_run(tmp_course):
+    with patch.object(tmc_course, "update_course") as mock:
+        tmc_course.main(["update", str(tmp_course), "--dry-run"])
+        mock.assert_called_once_with(tmp_course, dry_run=True, jobs=1)
+
+
+def test_main_update_jobs(tmp_course):
+    with patch.object(tmc_course, "update_course") as mock:
+        mock.return_value = [
+            tmc_course.UpdateResult(
+                tmp_course / "part01" / "assg01", tmc_course.UpdateStatus.FAILED
+            )
+        ]
+        res = tmc_course.main(["update", str(tmp_course), "--jobs", "4"])
+        mock.assert_called_once_with(tmp_course, dry_run=False, jobs=4)
+        assert res == 1
 
 
 def test_verbosity_quiet():
@@ -735,6 +1771,1128 @@ def test_test_multi(test_resource_path, tmp_path):
     assert len(results) == 8
 
 
+def test_test_archives(test_resource_path, tmp_path):
+    shutil.copytree(
+        test_resource_path / "test_runner_test_all_pass",
+        tmp_path / "test_runner_test_all_pass",
+    )
+    packed = tmc_course.pack_course(
+        tmp_path / "test_runner_test_all_pass", tmp_path / "out"
+    )
+    assert len(packed) == 4
+
+    success, results = tmc_course.test(packed)
+    assert success
+    assert len(results) == 4
+    assert all(result.task.is_archive for result in results)
+    assert not list((tmp_path / "out").rglob(".tmcproject.yml"))
+
+
+def test_test_archive_without_assignment(tmp_path):
+    archive_path = tmp_path / "empty.zip"
+    with tmc_course.zipfile.ZipFile(archive_path, "w") as archive_zip:
+        archive_zip.writestr("empty/readme.txt", "nothing here")
+    with pytest.raises(ValueError):
+        tmc_course.run_test_task(tmc_course.TestTask(archive_path))
+
+
+def test_test_skips_other_archives(test_resource_path, tmp_path):
+    # What the pre-commit hook passes when the tester of the course changes
+    shutil.copytree(
+        test_resource_path / "test_runner_test_all_pass", tmp_path / "course"
+    )
+    shutil.copy(
+        test_resource_path / "tmc-python-tester.zip",
+        tmp_path / "course" / "tmc-python-tester.zip",
+    )
+    data_path = tmp_path / "course" / "part01" / "assg01" / "src" / "data.zip"
+    shutil.copy(test_resource_path / "simple-zip.zip", data_path)
+
+    success, results = tmc_course.test(
+        [tmp_path / "course" / "tmc-python-tester.zip", data_path]
+    )
+    assert success
+    assert [result.task.path for result in results] == [data_path.parent.parent]
+
+
+def make_test_results(course_path, outcomes):
+    return [
+        tmc_course.TestResult(
+            tmc_course.TestTask(course_path / part / assignment), success, "", ""
+        )
+        for (part, assignment), success in outcomes.items()
+    ]
+
+
+def test_render_test_output(tmp_path):
+    results = make_test_results(
+        tmp_path / "course",
+        {
+            ("part02", "assg03"): True,
+            ("part01", "assg02"): False,
+            ("part01", "assg01"): True,
+        },
+    )
+    lines = list(tmc_course.render_test_output(results))
+    assert lines == [
+        "Test Results",
+        "└── course",
+        "    ├── part01",
+        f"    │   ├── assg01 - {tmc_course.TEST_SUCCESS_AFFIX}",
+        f"    │   └── assg02 - {tmc_course.TEST_FAIL_AFFIX}",
+        "    └── part02",
+        f"        └── assg03 - {tmc_course.TEST_SUCCESS_AFFIX}",
+    ]
+
+
+def test_render_test_output_summary(tmp_path):
+    results = make_test_results(
+        tmp_path / "course",
+        {
+            ("part01", "assg01"): True,
+            ("part01", "assg02"): False,
+            ("part02", "assg03"): True,
+            ("part02", "assg04"): True,
+        },
+    )
+    lines = list(tmc_course.render_test_output(results, summary=True))
+    assert lines == [
+        "Test Results",
+        "└── course",
+        "    ├── part01",
+        f"    │   ├── assg01 - {tmc_course.TEST_SUCCESS_AFFIX}",
+        f"    │   └── assg02 - {tmc_course.TEST_FAIL_AFFIX}",
+        f"    └── part02 - {tmc_course.TEST_SUCCESS_AFFIX} (2 assignments)",
+    ]
+
+
+def test_render_test_output_large(tmp_path):
+    results = make_test_results(
+        tmp_path / "course",
+        {
+            (f"part{part:03}", f"assg{assignment:03}"): assignment % 7 != 0
+            for part in range(100)
+            for assignment in range(100)
+        },
+    )
+    start = time.perf_counter()
+    lines = list(tmc_course.render_test_output(results))
+    assert time.perf_counter() - start < 1
+    assert len(lines) == 2 + 100 + 10_000
+
+
+def test_test_files(test_resource_path, tmp_path):
+    course_path = tmp_path / "test_runner_test_all_pass"
+    shutil.copytree(test_resource_path / "test_runner_test_all_pass", course_path)
+    (course_path / "README.md").write_text("Not part of any assignment")
+    success, results = tmc_course.test(
+        [
+            course_path / "part01" / "assg01" / "src" / "solution.py",
+            course_path / "part01" / "assg01" / "test" / "test_solution.py",
+            course_path / "part01" / "assg01" / "test",
+            course_path / "part02" / "assg03" / "src" / "solution.py",
+            course_path / "README.md",
+            course_path / ".tmcproject.yml",
+        ]
+    )
+    assert success
+    assert [result.task.path for result in results] == [
+        course_path / "part01" / "assg01",
+        course_path / "part02" / "assg03",
+    ]
+
+
+def test_owning_assignment(test_resource_path):
+    course_path = test_resource_path / "test_runner_test_all_pass"
+    assignment_path = course_path / "part01" / "assg01"
+    assert tmc_course.owning_assignment(assignment_path / "src") == assignment_path
+    assert tmc_course.owning_assignment(assignment_path) == assignment_path
+    assert tmc_course.owning_assignment(course_path / "part01") is None
+
+    # The walk stops at the course root
+    tmc_course.owning_assignment.cache_clear()
+    with patch.object(
+        tmc_course, "is_valid_assignment", wraps=tmc_course.is_valid_assignment
+    ) as mock:
+        assert tmc_course.owning_assignment(course_path / "part02") is None
+    assert [call.args[0] for call in mock.call_args_list] == [
+        course_path / "part02",
+        course_path,
+    ]
+
+
+requires_rlimits = pytest.mark.skipif(
+    sys.platform == "win32", reason="resource limits need the resource module"
+)
+
+
+@requires_rlimits
+def test_resource_limits_from_config():
+    course_limits = tmc_course.ResourceLimits.from_config(
+        {"memory_limit_mb": "512", "cpu_limit_s": "10", "process_limit": "32"}
+    )
+    assert course_limits == tmc_course.ResourceLimits(512 * 1024 * 1024, 10, None, 32)
+
+    assignment_limits = tmc_course.ResourceLimits.from_config(
+        {"cpu_limit_s": "unlimited", "file_size_limit_mb": "1"}
+    )
+    limits = course_limits.override(assignment_limits)
+    assert limits == tmc_course.ResourceLimits(512 * 1024 * 1024, 0, 1024 * 1024, 32)
+    assert [limit for limit, _ in limits.rlimits()] == [
+        tmc_course.resource.RLIMIT_AS,
+        tmc_course.resource.RLIMIT_FSIZE,
+        tmc_course.resource.RLIMIT_NPROC,
+    ]
+
+    with pytest.raises(ValueError):
+        tmc_course.ResourceLimits.from_config({"memory_limit_mb": "lots"})
+
+
+@requires_rlimits
+def test_resource_limits_exceeded():
+    limits = tmc_course.ResourceLimits(cpu_time=2)
+    assert limits.exceeded(-tmc_course.signal.SIGXCPU, "") == "cpu_time"
+    assert limits.exceeded(-tmc_course.signal.SIGKILL, "", cpu_time=3.0) == "cpu_time"
+    # Killed by something else, e.g. the OOM killer
+    assert limits.exceeded(-tmc_course.signal.SIGKILL, "", cpu_time=0.1) is None
+    assert limits.exceeded(1, "MemoryError") is None
+
+
+@requires_rlimits
+def test_test_memory_limit(all_pass_course):
+    write_course_config(all_pass_course, memory_limit_mb=256)
+    assignment_path = all_pass_course / "part01" / "assg01"
+    (assignment_path / "src" / "solution.py").write_text(
+        "def function():\n    return len(bytearray(1024 ** 3)) // 1024 ** 3\n"
+    )
+    success, results = tmc_course.test([all_pass_course / "part01"])
+    assert not success
+    assert [result.limit_exceeded for result in results] == ["memory", None]
+
+    # Assignments can lift the course's limits
+    with (assignment_path / ".tmcproject.yml").open("a") as fh:
+        fh.write("tmc_course:\n  memory_limit_mb: unlimited\n")
+    success, _ = tmc_course.test([assignment_path])
+    assert success
+
+
+@requires_rlimits
+def test_test_cpu_limit(all_pass_course):
+    write_course_config(all_pass_course, cpu_limit_s=1)
+    assignment_path = all_pass_course / "part01" / "assg01"
+    (assignment_path / "src" / "solution.py").write_text(
+        "def function():\n    while True:\n        pass\n"
+    )
+    success, results = tmc_course.test([assignment_path])
+    assert not success
+    assert results[0].limit_exceeded == "cpu_time"
+    assert tmc_course.TEST_LIMIT_AFFIX in "\n".join(
+        tmc_course.render_test_output(results)
+    )
+
+
+def test_test_stdin_is_closed(all_pass_course):
+    assignment_path = all_pass_course / "part01" / "assg01"
+    (assignment_path / "src" / "solution.py").write_text(
+        "def function():\n    return int(input())\n"
+    )
+    success, results = tmc_course.test([assignment_path])
+    assert not success
+    assert "EOFError" in results[0].stderr
+
+
+def test_test_timeout(all_pass_course):
+    assignment_path = all_pass_course / "part01" / "assg01"
+    (assignment_path / "src" / "solution.py").write_text(
+        "import time\n\n\ndef function():\n    time.sleep(60)\n"
+    )
+    start = time.monotonic()
+    success, results = tmc_course.test([all_pass_course / "part01"], test_timeout=0.5)
+    assert time.monotonic() - start < 30
+    assert not success
+    assert [result.limit_exceeded for result in results] == ["test_timeout", None]
+    # The stack dump shows where the test got stuck
+    assert 'solution.py", line 5 in function' in results[0].stderr
+    assert "in test_1" in results[0].stderr
+    # The rest of the assignment's tests didn't get to run
+    assert results[0].outcomes == []
+
+
+def test_test_scratch(all_pass_course):
+    success, results = tmc_course.test([all_pass_course], scratch=True, jobs=2)
+    assert success
+    assert len(results) == 4
+    assert all(result.outcomes for result in results)
+
+    generated = [
+        path
+        for path in all_pass_course.rglob("*")
+        if path.name in ("__pycache__", *tmc_course.GENERATED_FILE_NAMES)
+    ]
+    assert generated == []
+    assert list((all_pass_course / ".tmc-course" / "scratch").iterdir()) == []
+
+
+def test_scratch_workspace_shares_only_tester(all_pass_course):
+    assignment_path = all_pass_course / "part01" / "assg01"
+    with tmc_course.scratch_workspace(assignment_path) as workspace_path:
+        assert workspace_path.name == "assg01"
+        assert tmc_course.is_valid_assignment(workspace_path)
+        tester_file = Path("tmc") / "__main__.py"
+        assert (workspace_path / tester_file).samefile(assignment_path / tester_file)
+        solution_file = Path("src") / "solution.py"
+        assert not (workspace_path / solution_file).samefile(
+            assignment_path / solution_file
+        )
+    assert not workspace_path.exists()
+
+
+def test_test_same_assignment_concurrently(all_pass_course):
+    task = tmc_course.TestTask(all_pass_course / "part01" / "assg01")
+    with tmc_course.ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(
+            executor.map(
+                lambda _: tmc_course.run_test_task(task, scratch=True), range(4)
+            )
+        )
+    assert all(result.success for result in results)
+    assert all(len(result.outcomes) == 2 for result in results)
+
+
+@pytest.fixture
+def writes_bytecode(monkeypatch):
+    monkeypatch.delenv("PYTHONDONTWRITEBYTECODE", raising=False)
+
+
+def test_test_precompiled(all_pass_course, writes_bytecode):
+    success, results = tmc_course.test([all_pass_course], precompile_sources=True)
+    assert success
+    assert len(results) == 4
+    assert list(all_pass_course.rglob("__pycache__")) == []
+
+    pycache_path = all_pass_course / ".tmc-course" / "pycache"
+    tester_pycs = [
+        tmc_course.pycache_path(
+            all_pass_course / part / assignment / "tmc" / "__main__.py",
+            pycache_path / "tree",
+        )
+        for part, assignment in (("part01", "assg01"), ("part02", "assg03"))
+    ]
+    assert tester_pycs[0].samefile(tester_pycs[1])
+    store = list((pycache_path / "store").iterdir())
+    assert len(store) < len(list(all_pass_course.rglob("*.py")))
+
+    # Scratch runs share the prefix, and clean up after their workspaces
+    success, _ = tmc_course.test(
+        [all_pass_course], scratch=True, jobs=2, precompile_sources=True
+    )
+    assert success
+    scratch_mirror = tmc_course.pycache_path(
+        all_pass_course / ".tmc-course" / "scratch" / "x.py", pycache_path / "tree"
+    ).parent
+    assert list(scratch_mirror.iterdir()) == []
+    assert list(all_pass_course.rglob("__pycache__")) == []
+
+
+def test_test_precompile_reports_syntax_errors(
+    all_pass_course, writes_bytecode, caplog
+):
+    solution_path = all_pass_course / "part01" / "assg01" / "src" / "solution.py"
+    solution_path.write_text("def function(:\n    return 1\n")
+    stream = io.StringIO()
+    success, _ = tmc_course.test(
+        [all_pass_course / "part01"],
+        events=tmc_course.EventStream(stream),
+        precompile_sources=True,
+    )
+    assert not success
+    events = [json.loads(line) for line in stream.getvalue().splitlines()]
+    errors = [event for event in events if event["event"] == "syntax_error"]
+    assert [(error["path"], error["message"]) for error in errors] == [
+        (str(solution_path), "line 1: invalid syntax")
+    ]
+    # Reported before any of the tests are run
+    assert events.index(errors[0]) < min(
+        events.index(event)
+        for event in events
+        if event["event"] == "assignment_started"
+    )
+    assert f"Syntax error in {solution_path}" in caplog.text
+
+
+def test_test_precompile_without_bytecode(all_pass_course, monkeypatch):
+    monkeypatch.setenv("PYTHONDONTWRITEBYTECODE", "1")
+    with patch.object(tmc_course, "precompile") as mock:
+        success, _ = tmc_course.test([all_pass_course], precompile_sources=True)
+    assert success
+    mock.assert_not_called()
+
+
+def test_test_events(test_resource_path, tmp_path):
+    shutil.copytree(
+        test_resource_path / "test_runner_test_some_pass",
+        tmp_path / "test_runner_test_some_pass",
+    )
+    stream = io.StringIO()
+    success, results = tmc_course.test(
+        [tmp_path / "test_runner_test_some_pass"],
+        events=tmc_course.EventStream(stream),
+    )
+    events = [json.loads(line) for line in stream.getvalue().splitlines()]
+
+    assert [event["event"] for event in events[:2]] == [
+        "collection_started",
+        "collection_finished",
+    ]
+    assert events[1]["assignments"] == 4
+    assert [event["event"] for event in events[2:6]] == ["assignment_queued"] * 4
+    assert [event["event"] for event in events[6:-1]] == [
+        "assignment_started",
+        "assignment_finished",
+    ] * 4
+    finished = [event for event in events if event["event"] == "assignment_finished"]
+    assert all(event["duration"] > 0 for event in finished)
+    assert sorted(event["success"] for event in finished) == [False, True, True, True]
+    assert all(event["tests"] for event in finished)
+    assert {test["passed"] for event in finished for test in event["tests"]} == {
+        True,
+        False,
+    }
+    assert events[-1]["event"] == "run_finished"
+    assert (events[-1]["passed"], events[-1]["failed"]) == (3, 1)
+    assert not events[-1]["success"]
+    assert sum(len(result.outcomes) for result in results) == sum(
+        len(event["tests"]) for event in finished
+    )
+
+
+def record_durations(course_path, runs, **options):
+    course_path.mkdir(exist_ok=True)
+    for durations in runs:
+        results = [
+            tmc_course.TestResult(
+                tmc_course.TestTask(course_path / "part01" / name),
+                success,
+                "",
+                "",
+                returncode=0 if success else 1,
+                duration=duration,
+                outcomes=[
+                    tmc_course.TestOutcome("test.test_solution.Test.test_1", success)
+                ],
+            )
+            for name, (duration, success) in durations.items()
+        ]
+        tmc_course.record_history(results, [course_path], 0.0, 1.0, **options)
+
+
+async def collect_async(paths, **options):
+    return [result async for result in tmc_course.test_async(paths, **options)]
+
+
+def test_test_async(test_resource_path, tmp_path):
+    course_path = tmp_path / "test_runner_test_some_pass"
+    shutil.copytree(test_resource_path / "test_runner_test_some_pass", course_path)
+
+    results = asyncio.run(collect_async([course_path], concurrency=2))
+
+    assert sorted(result.task.path for result in results) == sorted(
+        path.parent for path in course_path.glob("part*/assg*/src")
+    )
+    assert sorted(result.success for result in results) == [False, True, True, True]
+    assert all(result.outcomes and result.duration > 0 for result in results)
+
+
+def test_test_async_file_system_work_off_the_loop(all_pass_course, tmp_path):
+    archive_path = tmp_path / "archives" / "assg01.zip"
+    tmc_course.pack_assignment(all_pass_course / "part01" / "assg01", archive_path)
+    threads = []
+
+    def recording(function):
+        def record(*args, **kwargs):
+            threads.append((function.__name__, threading.current_thread()))
+            return function(*args, **kwargs)
+
+        return record
+
+    @contextlib.contextmanager
+    def staged_archive(archive_path):
+        threads.append(("staged_archive", threading.current_thread()))
+        with real_staged_archive(archive_path) as assignment_path:
+            yield assignment_path
+
+    real_staged_archive = tmc_course.staged_archive
+    with (
+        patch.object(
+            tmc_course, "prepare_test_run", recording(tmc_course.prepare_test_run)
+        ),
+        patch.object(
+            tmc_course, "finish_test_run", recording(tmc_course.finish_test_run)
+        ),
+        patch.object(tmc_course, "staged_archive", staged_archive),
+    ):
+        results = asyncio.run(
+            collect_async([archive_path, all_pass_course / "part01" / "assg02"])
+        )
+
+    assert all(result.success for result in results)
+    assert sorted(name for name, _ in threads) == [
+        "finish_test_run",
+        "finish_test_run",
+        "prepare_test_run",
+        "prepare_test_run",
+        "staged_archive",
+    ]
+    assert all(thread is not threading.main_thread() for _, thread in threads)
+
+
+def test_test_async_concurrency(test_resource_path):
+    running = []
+    peak = 0
+
+    async def fake_run(task, assignment_path, test_timeout=None):
+        nonlocal peak
+        running.append(task)
+        peak = max(peak, len(running))
+        # The second of two concurrent runs finishes first
+        await asyncio.sleep(0.1 * (3 - len(running)))
+        running.remove(task)
+        return tmc_course.TestResult(task, True, "", "")
+
+    with patch.object(tmc_course, "run_tests_async", fake_run):
+        results = asyncio.run(
+            collect_async(
+                [test_resource_path / "test_runner_test_all_pass"], concurrency=2
+            )
+        )
+
+    assert peak == 2
+    assert len(results) == 4
+    # Yielded as they finish, not in the order they were started
+    assert results[0].task.path.name == "assg02"
+
+
+def test_test_async_cancel(all_pass_course, monkeypatch):
+    monkeypatch.setattr(
+        tmc_course,
+        "tmc_runner_command",
+        lambda test_timeout=None: ["python3", "-c", "import time; time.sleep(60)"],
+    )
+    start = time.monotonic()
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(asyncio.wait_for(collect_async([all_pass_course]), timeout=0.5))
+    assert time.monotonic() - start < 10
+
+
+def test_test_history(test_resource_path, tmp_path):
+    course_path = tmp_path / "test_runner_test_some_pass"
+    shutil.copytree(test_resource_path / "test_runner_test_some_pass", course_path)
+    for _ in range(2):
+        tmc_course.test([course_path], history=True)
+    # Kept out of version control even where the course's .gitignore doesn't list it
+    assert (course_path / ".tmc-course" / ".gitignore").read_text() == "*\n"
+
+    runs = tmc_course.history_runs(course_path)
+    assert [run.run_id for run in runs] == [2, 1]
+    assert all((run.passed, run.failed) == (3, 1) for run in runs)
+    assert len(tmc_course.slowest_assignments(course_path)) == 4
+    failing = tmc_course.failing_tests(course_path)
+    assert failing and all(test.failures == 2 for test in failing)
+
+    results = tmc_course.load_history_run(course_path)
+    assert sorted(result.task.path for result in results) == sorted(
+        path.parent for path in course_path.glob("part*/assg*/src")
+    )
+    assert all(result.outcomes for result in results)
+    assert all(result.max_rss > 0 for result in results)
+    assert sum(not result.success for result in results) == 1
+
+
+def test_history_keeps_latest_runs(tmp_path):
+    course_path = tmp_path / "course"
+    record_durations(
+        course_path, [{"assg01": (float(n), True)} for n in range(5)], max_runs=3
+    )
+
+    assert [run.run_id for run in tmc_course.history_runs(course_path)] == [5, 4, 3]
+    with tmc_course.open_history(course_path) as connection:
+        assert connection.execute("SELECT COUNT(*) FROM assignments").fetchone() == (3,)
+        assert connection.execute("SELECT COUNT(*) FROM tests").fetchone() == (3,)
+
+
+def test_history_without_runs(tmp_path):
+    with pytest.raises(ValueError):
+        tmc_course.history_runs(tmp_path)
+    assert not (tmp_path / ".tmc-course").exists()
+
+
+def test_test_result_dict_round_trip(tmp_path):
+    result = tmc_course.TestResult(
+        tmc_course.TestTask(tmp_path / "part01" / "assignment01"),
+        False,
+        "out",
+        "err",
+        returncode=1,
+        duration=0.5,
+        outcomes=[tmc_course.TestOutcome("test.Test.test_1", False, "boom", ["1.1"])],
+        limit_exceeded="memory",
+    )
+    data = json.loads(json.dumps(result.to_dict(tmp_path)))
+    assert data["path"] == "part01/assignment01"
+    assert tmc_course.TestResult.from_dict(data, tmp_path) == result
+
+
+requires_unix_sockets = pytest.mark.skipif(
+    not hasattr(socket, "AF_UNIX"), reason="needs Unix sockets"
+)
+
+
+@pytest.mark.parametrize(
+    "address, expected",
+    (
+        pytest.param(
+            "unix:/tmp/work.sock",
+            ("AF_UNIX", "/tmp/work.sock"),
+            marks=requires_unix_sockets,
+        ),
+        ("localhost:8000", ("AF_INET", ("localhost", 8000))),
+        (":8000", ("AF_INET", ("", 8000))),
+    ),
+)
+def test_parse_address(address, expected):
+    family, server_address = tmc_course.parse_address(address)
+    assert (family.name, server_address) == expected
+
+
+@pytest.mark.parametrize("address", ("localhost", "localhost:http"))
+def test_parse_address_invalid(address):
+    with pytest.raises(ValueError):
+        tmc_course.parse_address(address)
+
+
+def start_worker(address, root):
+    return subprocess.Popen(
+        [sys.executable, "-m", "tmc_course", "-q", "worker", address],
+        cwd=root,
+    )
+
+
+@requires_unix_sockets
+def test_serve_work(test_resource_path, tmp_path):
+    course_path = tmp_path / "test_runner_test_some_pass"
+    shutil.copytree(test_resource_path / "test_runner_test_some_pass", course_path)
+    address = f"unix:{tmp_path / 'work.sock'}"
+    workers = [start_worker(address, tmp_path) for _ in range(2)]
+    stream = io.StringIO()
+
+    success, results = tmc_course.test(
+        [course_path],
+        events=tmc_course.EventStream(stream),
+        serve_address=address,
+        root=tmp_path,
+    )
+
+    assert [worker.wait(timeout=30) for worker in workers] == [0, 0]
+    assert not success
+    assert sorted(result.success for result in results) == [False, True, True, True]
+    assert all(result.task.course_path == course_path for result in results)
+    assert all(result.outcomes for result in results)
+    events = [json.loads(line) for line in stream.getvalue().splitlines()]
+    started = [event for event in events if event["event"] == "assignment_started"]
+    assert len(started) == 4 and all(event["worker"] for event in started)
+    assert not (tmp_path / "work.sock").exists()
+
+
+@requires_unix_sockets
+@pytest.mark.parametrize("failure", ("disconnect", "invalid_result", "stall"))
+def test_serve_work_requeues_tasks_of_failed_workers(
+    failure, test_resource_path, tmp_path, monkeypatch
+):
+    monkeypatch.setattr(tmc_course, "WORKER_REPORT_GRACE", 0)
+    course_path = tmp_path / "test_runner_test_all_pass"
+    shutil.copytree(test_resource_path / "test_runner_test_all_pass", course_path)
+    address = f"unix:{tmp_path / 'work.sock'}"
+    tasks = list(tmc_course.collect_tasks([course_path]))
+    stream = io.StringIO()
+    results = []
+    coordinator = threading.Thread(
+        target=lambda: results.extend(
+            tmc_course.serve_work(
+                tasks,
+                address,
+                tmp_path,
+                tmc_course.EventStream(stream),
+                task_timeout=2,
+            )
+        )
+    )
+    coordinator.start()
+
+    # A worker that fails after taking a task
+    with tmc_course.connect(address, timeout=10) as sock:
+        sock.sendall(b'{"type": "hello", "worker": "doomed"}\n')
+        with sock.makefile("rb") as rfile:
+            lost = json.loads(rfile.readline())
+            if failure == "invalid_result":
+                sock.sendall(b'{"type": "result", "id": 0}\n')
+            if failure != "disconnect":
+                # The coordinator hangs up on it
+                assert rfile.readline() == b""
+    assert lost["type"] == "task"
+
+    assert tmc_course.work(address, tmp_path) == len(tasks)
+    coordinator.join(timeout=30)
+    assert [result.task.path for result in results] == [task.path for task in tasks]
+    assert all(result.success for result in results)
+    events = [json.loads(line) for line in stream.getvalue().splitlines()]
+    requeued = [event for event in events if event["event"] == "assignment_requeued"]
+    assert [event["path"] for event in requeued] == [str(tmp_path / lost["path"])]
+
+
+@requires_unix_sockets
+def test_work_outside_root(tmp_path):
+    replies = []
+    with socket.socket(socket.AF_UNIX) as server:
+        server.bind(str(tmp_path / "work.sock"))
+        server.listen()
+
+        def coordinate():
+            connection, _ = server.accept()
+            with connection, connection.makefile("rb") as rfile:
+                rfile.readline()
+                task = {"type": "task", "id": 0, "path": "../elsewhere"}
+                connection.sendall(json.dumps(task).encode() + b"\n")
+                replies.append(json.loads(rfile.readline()))
+                connection.sendall(b'{"type": "done"}\n')
+
+        coordinator = threading.Thread(target=coordinate)
+        coordinator.start()
+        assert tmc_course.work(f"unix:{tmp_path / 'work.sock'}", tmp_path / "root") == 1
+        coordinator.join(timeout=10)
+    result = replies[0]["result"]
+    assert result["path"] == "../elsewhere"
+    assert not result["success"] and "Refusing to test" in result["stderr"]
+
+
+@requires_unix_sockets
+def test_serve_work_stops_hanging_assignments(all_pass_course, tmp_path):
+    assignment_path = all_pass_course / "part01" / "assg01"
+    (assignment_path / "src" / "solution.py").write_text(
+        "import time\n\n\ndef function():\n    time.sleep(60)\n"
+    )
+    address = f"unix:{tmp_path / 'work.sock'}"
+    workers = [start_worker(address, tmp_path) for _ in range(2)]
+
+    start = time.monotonic()
+    success, results = tmc_course.test(
+        [assignment_path], serve_address=address, root=tmp_path, task_timeout=2
+    )
+
+    assert time.monotonic() - start < 30
+    assert [worker.wait(timeout=30) for worker in workers] == [0, 0]
+    assert not success
+    assert [result.limit_exceeded for result in results] == ["task_timeout"]
+
+
+@requires_unix_sockets
+def test_serve_work_gives_up_after_attempts(test_resource_path, tmp_path):
+    course_path = tmp_path / "test_runner_test_all_pass"
+    shutil.copytree(test_resource_path / "test_runner_test_all_pass", course_path)
+    address = f"unix:{tmp_path / 'work.sock'}"
+    tasks = list(tmc_course.collect_tasks([course_path / "part01" / "assg01"]))
+    stream = io.StringIO()
+    results = []
+    coordinator = threading.Thread(
+        target=lambda: results.extend(
+            tmc_course.serve_work(
+                tasks, address, tmp_path, tmc_course.EventStream(stream)
+            )
+        )
+    )
+    coordinator.start()
+
+    for _ in range(tmc_course.WORKER_TASK_ATTEMPTS):
+        # A worker that dies after taking the task
+        with tmc_course.connect(address, timeout=10) as sock:
+            sock.sendall(b'{"type": "hello", "worker": "doomed"}\n')
+            with sock.makefile("rb") as rfile:
+                assert json.loads(rfile.readline())["type"] == "task"
+    coordinator.join(timeout=30)
+
+    assert not coordinator.is_alive()
+    assert not results[0].success
+    assert "gave up after 3 attempts" in results[0].stderr
+    events = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [event["event"] for event in events].count("assignment_requeued") == 2
+
+
+def test_serve_work_outside_root(test_resource_path, tmp_path):
+    tasks = list(
+        tmc_course.collect_tasks([test_resource_path / "test_runner_test_all_pass"])
+    )
+    with pytest.raises(ValueError):
+        tmc_course.serve_work(tasks, "unix:work.sock", tmp_path / "elsewhere")
+
+
+def test_test_result_cache(all_pass_course):
+    first_success, first = tmc_course.test(
+        [all_pass_course], result_cache=tmc_course.ResultCache()
+    )
+    assert first_success and not any(result.cached for result in first)
+
+    solution_path = all_pass_course / "part01" / "assg01" / "src" / "solution.py"
+    solution_path.write_text(solution_path.read_text() + "\n# edited\n")
+    stream = io.StringIO()
+    success, results = tmc_course.test(
+        [all_pass_course],
+        events=tmc_course.EventStream(stream),
+        result_cache=tmc_course.ResultCache(),
+    )
+
+    assert success
+    assert [result.task for result in results] == [result.task for result in first]
+    assert [result.cached for result in results] == [False, True, True, True]
+    assert [result.outcomes for result in results] == [
+        result.outcomes for result in first
+    ]
+    events = [json.loads(line) for line in stream.getvalue().splitlines()]
+    started = [event for event in events if event["event"] == "assignment_started"]
+    assert [event["path"] for event in started] == [str(solution_path.parent.parent)]
+
+
+def test_result_cache_key(all_pass_course, tmp_path):
+    task = tmc_course.TestTask(all_pass_course / "part01" / "assg01")
+    key = tmc_course.result_cache_key(task)
+    copy_path = tmp_path / "copy"
+    shutil.copytree(all_pass_course, copy_path)
+    copy_task = tmc_course.TestTask(copy_path / "part01" / "assg01")
+
+    assert tmc_course.result_cache_key(copy_task) == key
+    assert tmc_course.result_cache_key(task, test_timeout=10) != key
+    write_course_config(all_pass_course, cpu_limit_s=10)
+    assert tmc_course.result_cache_key(task) != key
+    (copy_task.path / "tmc" / "__init__.py").write_text("# another tester\n")
+    assert tmc_course.result_cache_key(copy_task) != key
+
+
+@pytest.mark.parametrize("remote", ("directory", "http"))
+def test_result_cache_remote(remote, all_pass_course, tmp_path, http_server):
+    # Identical assignments would share their results
+    for init_path in all_pass_course.glob("part*/assg*/src/__init__.py"):
+        init_path.write_text(f"# {init_path}\n")
+    if remote == "directory":
+        store = tmc_course.result_store(str(tmp_path / "shared"))
+    else:
+        store = tmc_course.result_store(http_server.url + "/cache")
+    tmc_course.test([all_pass_course], result_cache=tmc_course.ResultCache(store))
+
+    # Another machine, with nothing cached locally
+    other_path = tmp_path / "other" / all_pass_course.name
+    shutil.copytree(
+        all_pass_course,
+        other_path,
+        ignore=shutil.ignore_patterns(".tmc-course", "__pycache__"),
+    )
+    success, results = tmc_course.test(
+        [other_path], result_cache=tmc_course.ResultCache(store)
+    )
+
+    assert success
+    assert all(result.cached for result in results)
+    assert [result.task.path.parent.parent for result in results] == [other_path] * 4
+    assert len(list((other_path / ".tmc-course" / "results").iterdir())) == 4
+    if remote == "http":
+        methods = [method for method, _, _ in http_server.requests]
+        assert methods == ["GET"] * 4 + ["PUT"] * 4 + ["GET"] * 4
+
+
+def test_result_cache_unreachable_remote(all_pass_course, caplog):
+    store = tmc_course.result_store("http://127.0.0.1:1/cache")
+    success, results = tmc_course.test(
+        [all_pass_course / "part01"], result_cache=tmc_course.ResultCache(store)
+    )
+    assert success and len(results) == 2
+    assert "Couldn't read from the remote result cache" in caplog.text
+    assert "Couldn't write to the remote result cache" in caplog.text
+
+
+@pytest.fixture
+def daemon_course(test_resource_path):
+    # Socket paths can't be much longer than 100 bytes, which tmp_path can be
+    with tempfile.TemporaryDirectory() as directory:
+        course_path = Path(directory) / "course"
+        shutil.copytree(test_resource_path / "test_runner_test_all_pass", course_path)
+        yield course_path
+
+
+@pytest.fixture
+def daemon(daemon_course):
+    thread = threading.Thread(target=tmc_course.serve_daemon, args=(daemon_course,))
+    thread.start()
+    socket_path = tmc_course.daemon_socket_path(daemon_course)
+    tmc_course.connect(f"unix:{socket_path}", timeout=10).close()
+    yield socket_path
+    tmc_course.stop_daemon(daemon_course)
+    thread.join(timeout=30)
+    assert not thread.is_alive()
+    assert not socket_path.exists()
+
+
+@requires_unix_sockets
+def test_daemon(daemon_course, daemon, capsys, caplog):
+    caplog.set_level(logging.INFO)
+    # Identical assignments would share their results
+    for init_path in daemon_course.glob("part*/assg*/src/__init__.py"):
+        init_path.write_text(f"# {init_path}\n")
+    assert tmc_course.find_daemon([daemon_course / "part01"]) == daemon
+
+    assert tmc_course.main(["test", "--cache", str(daemon_course)]) == 0
+    output = capsys.readouterr().out
+    assert "assg04" in output and "(cached)" not in output
+    assert tmc_course.main(["test", "--cache", str(daemon_course / "part02")]) == 0
+    assert capsys.readouterr().out.count("(cached)") == 2
+    # Without --cache, everything is run again
+    assert tmc_course.main(["test", "-j", "2", str(daemon_course / "part02")]) == 0
+    assert "(cached)" not in capsys.readouterr().out
+
+    solution_path = daemon_course / "part01" / "assg01" / "src" / "solution.py"
+    solution_path.write_text("def function():\n    return 0\n")
+    stream = io.StringIO()
+    success, results = tmc_course.test_with_daemon(
+        daemon,
+        [daemon_course / "part01"],
+        events=tmc_course.EventStream(stream),
+        cache=True,
+    )
+    assert not success
+    assert sorted((r.task.path.name, r.success, r.cached) for r in results) == [
+        ("assg01", False, False),
+        ("assg02", True, True),
+    ]
+    events = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [event["event"] for event in events] == ["assignment_finished"] * 2 + [
+        "run_finished"
+    ]
+
+    # Assignments added after the daemon started are picked up
+    shutil.copytree(
+        daemon_course / "part02" / "assg03", daemon_course / "part02" / "assg05"
+    )
+    _, results = tmc_course.test_with_daemon(daemon, [daemon_course / "part02"])
+    assert sorted(result.task.path.name for result in results) == [
+        "assg03",
+        "assg04",
+        "assg05",
+    ]
+
+
+def test_test_daemon_keeps_latest_results(all_pass_course):
+    daemon = tmc_course.TestDaemon(tmc_course.Course(all_pass_course), runners=1)
+    try:
+        (task,) = daemon.collect_tasks([all_pass_course / "part01" / "assg01"])
+        solution_path = task.path / "src" / "solution.py"
+        for n in range(3):
+            solution_path.write_text(solution_path.read_text() + f"# edit {n}\n")
+            assert not daemon.run(task, cache=True).cached
+        assert daemon.run(task, cache=True).cached
+        assert list(daemon.results) == [task.path]
+    finally:
+        daemon.close()
+
+
+@requires_unix_sockets
+def test_daemon_test_timeout(daemon_course, daemon):
+    assignment_path = daemon_course / "part01" / "assg01"
+    (assignment_path / "src" / "solution.py").write_text(
+        "import time\n\n\ndef function():\n    time.sleep(60)\n"
+    )
+    success, results = tmc_course.test_with_daemon(
+        daemon, [assignment_path], test_timeout=0.5
+    )
+    assert not success
+    assert results[0].limit_exceeded == "test_timeout"
+    assert 'solution.py", line 5 in function' in results[0].stderr
+
+
+@requires_unix_sockets
+def test_daemon_already_running(daemon_course, daemon):
+    with pytest.raises(ValueError):
+        tmc_course.serve_daemon(daemon_course)
+
+
+@requires_unix_sockets
+@pytest.mark.parametrize("option", ("--no-daemon", "--scratch", "--precompile"))
+def test_main_test_without_daemon(option, all_pass_course):
+    socket_path = tmc_course.daemon_socket_path(all_pass_course)
+    socket_path.parent.mkdir()
+    socket_path.touch()
+    assert tmc_course.test_with_daemon(socket_path, [all_pass_course]) is None
+    with patch.object(tmc_course, "test_with_daemon") as test_with_daemon:
+        assert tmc_course.main(["test", option, str(all_pass_course)]) == 0
+    test_with_daemon.assert_not_called()
+    # A daemon that's no longer running falls back to testing here
+    assert tmc_course.main(["test", str(all_pass_course)]) == 0
+
+
+def test_duration_regressions(tmp_path):
+    course_path = tmp_path / "course"
+    record_durations(
+        course_path,
+        [
+            {"assg01": (1.0, True), "assg02": (1.0, True)},
+            {"assg01": (3.0, True), "assg02": (1.0, False)},
+            {"assg01": (1.5, True), "assg02": (2.0, False)},
+        ],
+    )
+    regressions = tmc_course.duration_regressions(course_path, 50)
+    assert [(r.path, r.previous_mean, r.latest) for r in regressions] == [
+        ("part01/assg02", 1.0, 2.0)
+    ]
+    assert regressions[0].change == pytest.approx(100)
+    assert tmc_course.duration_regressions(course_path, 100) == []
+
+    slowest = tmc_course.slowest_assignments(course_path, limit=1)
+    assert [(t.path, t.runs, t.max_duration) for t in slowest] == [
+        ("part01/assg01", 3, 3.0)
+    ]
+    failing = tmc_course.failing_tests(course_path)
+    assert [(t.path, t.failures, t.runs) for t in failing] == [("part01/assg02", 2, 3)]
+
+    first_run = tmc_course.load_history_run(course_path, 1)
+    assert all(result.success for result in first_run)
+    with pytest.raises(ValueError):
+        tmc_course.load_history_run(course_path, 4)
+
+
+def test_main_history(tmp_path, capsys):
+    course_path = tmp_path / "course"
+    record_durations(
+        course_path,
+        [{"assg01": (1.0, True)}, {"assg01": (2.0, False)}],
+    )
+    assert tmc_course.main(["history", str(course_path)]) == 0
+    assert capsys.readouterr().out.startswith("#2 ")
+
+    assert tmc_course.main(["history", str(course_path), "--regressed", "10"]) == 0
+    assert "+100.0%" in capsys.readouterr().out
+
+    assert tmc_course.main(["history", str(course_path), "--show"]) == 1
+    assert "assg01" in capsys.readouterr().out
+    assert tmc_course.main(["history", str(course_path), "--show", "1"]) == 0
+
+
+def test_check_course_clean(tmp_assignments):
+    assert tmc_course.check_course(tmp_assignments[0].parent.parent) == []
+
+
+def test_check_course_problems(tmp_assignments):
+    course_path = tmp_assignments[0].parent.parent
+    assg01, assg02, assg03 = tmp_assignments
+    test_path = assg01 / "test" / "test_solution.py"
+    test_path.write_text(
+        test_path.read_text()
+        .replace('"src.solution"', '"src.missing"')
+        .replace('@points("assg01")', '@points("POINTNAME")')
+    )
+    test_path = assg02 / "test" / "test_solution.py"
+    test_path.write_text(test_path.read_text().replace('"assg02"', '"assg03"'))
+    (assg02 / "test" / "test_more.py").write_text(
+        "import unittest\n\n\nclass MoreTest(unittest.TestCase):\n"
+        "    def test_more(self):\n        pass\n"
+    )
+    (assg02 / "src" / "helper.py").write_text("def helper():\n    return 1\n")
+    (assg03 / "src" / "__init__.py").unlink()
+    (assg03 / "src" / "broken.py").write_text("# BEGIN SOLUTION\nx = (\n")
+    (assg03 / "src" / "unbalanced.py").write_text("# BEGIN SOLUTION\nx = 1\n")
+
+    problems = [
+        problem.format(course_path) for problem in tmc_course.check_course(course_path)
+    ]
+    assert problems == [
+        "part01/assg01/test/test_solution.py:6: Exercise module src.missing not found",
+        "part01/assg01/test/test_solution.py:9: Leftover template placeholder",
+        "part01/assg02/src/helper.py:1: "
+        "No # BEGIN SOLUTION markers; students get the whole file",
+        "part01/assg02/test/test_more.py:4: Test class MoreTest has no @points",
+        "part01/assg03/src:0: Missing __init__.py",
+        "part01/assg03/src/broken.py:2: Syntax error: '(' was never closed",
+        "part01/assg03/src/unbalanced.py:1: # BEGIN SOLUTION without # END SOLUTION",
+        "part01/assg03/test/test_solution.py:9: "
+        "Point assg03 is also awarded in part01/assg02",
+    ]
+
+
+def test_analyze_source_placeholders():
+    source = (
+        'message = f"{{ {name} }}"\n'
+        'template = "{{ user }}"\n'
+        "points = [{{ points }}]\n"
+        "assignment = '{{assignment}}'\n"
+        '@points("POINTNAME")\n'
+    )
+    facts = tmc_course.analyze_source("src", source.encode())
+    assert [
+        lineno for lineno, problem in facts.problems if "placeholder" in problem
+    ] == [
+        3,
+        4,
+        5,
+    ]
+
+
+def test_check_course_caches_by_content(tmp_assignments):
+    course_path = tmp_assignments[0].parent.parent
+    tmc_course.check_course(course_path)
+    assert (course_path / ".tmc-course" / "check-cache.json").is_file()
+
+    solution_path = tmp_assignments[0] / "src" / "solution.py"
+    solution_path.write_text("def function():\n    return 1\n")
+    with patch.object(
+        tmc_course, "analyze_source", wraps=tmc_course.analyze_source
+    ) as mock:
+        problems = tmc_course.check_course(course_path)
+    mock.assert_called_once_with("src", solution_path.read_bytes())
+    assert [problem.path for problem in problems] == [solution_path]
+
+
+def test_check_course_process_pool(tmp_assignments, monkeypatch):
+    course_path = tmp_assignments[0].parent.parent
+    (tmp_assignments[0] / "src" / "__init__.py").unlink()
+    monkeypatch.setattr(tmc_course, "PROCESS_POOL_MIN_FILES", 1)
+    problems = tmc_course.check_course(course_path, jobs=2)
+    assert [problem.message for problem in problems] == ["Missing __init__.py"]
+
+
+def test_main_check(tmp_assignments, capsys):
+    course_path = tmp_assignments[0].parent.parent
+    assert tmc_course.main(["check", str(course_path)]) == 0
+    assert capsys.readouterr().out == ""
+
+    (tmp_assignments[0] / "src" / "__init__.py").unlink()
+    assert tmc_course.main(["check", str(course_path), "-j", "1"]) == 1
+    assert capsys.readouterr().out == "part01/assg01/src:0: Missing __init__.py\n"
+
+
+def test_main_test_events(test_resource_path, tmp_path):
+    shutil.copytree(
+        test_resource_path / "test_runner_test_all_pass",
+        tmp_path / "test_runner_test_all_pass",
+    )
+    events_path = tmp_path / "events.ndjson"
+    res = tmc_course.main(
+        [
+            "test",
+            str(tmp_path / "test_runner_test_all_pass" / "part01"),
+            "--events",
+            str(events_path),
+        ]
+    )
+    assert res == 0
+    events = [json.loads(line) for line in events_path.read_text().splitlines()]
+    assert events[-1]["event"] == "run_finished"
+    assert events[-1]["passed"] == 2
+
+
 def test_main_test(tmp_course):
     paths = [tmp_course / "part01", tmp_course / "part02"]
     with patch.object(tmc_course, "test") as mock:
@@ -746,6 +2904,14 @@ def test_main_test(tmp_course):
                 paths[1],
             ],
             detailed=False,
+            summary=False,
+            events=ANY,
+            history=True,
+            test_timeout=None,
+            result_cache=None,
+            scratch=False,
+            jobs=1,
+            precompile_sources=False,
         )
         assert res == 0
 
@@ -754,12 +2920,110 @@ def test_main_test_detailed(tmp_course):
     paths = [tmp_course / "part01", tmp_course / "part02"]
     with patch.object(tmc_course, "test") as mock:
         mock.return_value = (False, [])
-        res = tmc_course.main(["test", str(paths[0]), str(paths[1]), "--details"])
+        res = tmc_course.main(
+            ["test", str(paths[0]), str(paths[1]), "--details", "--precompile"]
+        )
         mock.assert_called_once_with(
             [
                 paths[0],
                 paths[1],
             ],
             detailed=True,
+            summary=False,
+            events=ANY,
+            history=True,
+            test_timeout=None,
+            result_cache=None,
+            scratch=False,
+            jobs=1,
+            precompile_sources=True,
         )
         assert res == 1
+
+
+def test_main_serve_work(tmp_course):
+    with patch.object(tmc_course, "test") as mock:
+        mock.return_value = (True, [])
+        res = tmc_course.main(
+            ["serve-work", ":8000", str(tmp_course), "--root", str(tmp_course.parent)]
+        )
+        mock.assert_called_once_with(
+            [tmp_course],
+            detailed=False,
+            summary=False,
+            events=ANY,
+            history=True,
+            test_timeout=None,
+            result_cache=None,
+            serve_address=":8000",
+            root=tmp_course.parent,
+            task_timeout=tmc_course.WORKER_TASK_TIMEOUT,
+        )
+        assert res == 0
+
+
+def test_main_test_remote_cache(tmp_course, tmp_path, monkeypatch):
+    monkeypatch.setenv("TMC_COURSE_REMOTE_CACHE", str(tmp_path / "shared"))
+    with patch.object(tmc_course, "test") as mock:
+        mock.return_value = (True, [])
+        assert tmc_course.main(["test", str(tmp_course)]) == 0
+    result_cache = mock.call_args.kwargs["result_cache"]
+    assert result_cache.remote.path == tmp_path / "shared"
+
+
+def test_main_version(capsys):
+    with pytest.raises(SystemExit) as exc_info:
+        tmc_course.main(["--version"])
+    assert exc_info.value.code == 0
+    assert capsys.readouterr().out.strip() == importlib.metadata.version("tmc_course")
+
+
+def test_package_exports():
+    import tmc_course as package
+
+    assert package.Course is tmc_course.Course
+    assert package.Part is tmc_course.Part
+    assert package.Assignment is tmc_course.Assignment
+    with pytest.raises(AttributeError):
+        package.Missing
+    # Running the module mustn't find it already imported by the package
+    result = subprocess.run(
+        [sys.executable, "-W", "error", "-m", "tmc_course.tmc_course", "--help"],
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0, result.stderr
+
+
+def test_import_is_lightweight():
+    # Regression guard for start-up time: heavy dependencies must only be imported
+    # by the commands that need them.
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import tmc_course.tmc_course"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    imported = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        name = line.rsplit("|", 1)[1]
+        if not name.startswith("   "):
+            # A top-level import; everything listed since was imported by it
+            if name.strip() == "tmc_course.tmc_course":
+                break
+            imported = []
+            continue
+        imported.append(name.strip())
+
+    assert "argparse" in imported
+    for heavy in (
+        "requests",
+        "tqdm",
+        "urllib.request",
+        "importlib.metadata",
+        "multiprocessing",
+        "socketserver",
+    ):
+        assert heavy not in imported
@@ -0,0 +1,16 @@
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from .tmc_course import Assignment, Course, Part
+
+__all__ = ["Assignment", "Course", "Part"]
+
+
+def __getattr__(name: str) -> Any:
+    # Imported on first use, so that running the tmc_course.tmc_course module
+    # doesn't find it imported already
+    if name in __all__:
+        from . import tmc_course
+
+        return getattr(tmc_course, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,24 +1,181 @@
 import argparse
+import ast
+import collections
 import contextlib
-import importlib.metadata
+import csv
+import errno
+import functools
+import hashlib
 import importlib.resources
+import io
+import itertools
+import json
 import logging
 import os
+import py_compile
+import re
 import shutil
+import signal
+import socket
+import stat
 import subprocess
+import sys
+import tempfile
+import threading
+import time
 import zipfile
-from dataclasses import dataclass
+import zlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import asdict, dataclass, field, fields, replace
 from enum import Enum, auto
-from pathlib import Path
-from typing import Generator, Literal, Optional
+from pathlib import Path, PurePosixPath
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncGenerator,
+    Callable,
+    Generator,
+    Literal,
+    Optional,
+    TextIO,
+    Union,
+    cast,
+)
+from urllib.parse import urlparse
+
+if TYPE_CHECKING:
+    import sqlite3
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover (Windows)
+    fcntl = None  # type: ignore
+
+try:
+    import resource
+except ImportError:  # pragma: no cover (Windows)
+    resource = None  # type: ignore
 
-import requests
-import treelib  # type: ignore
-from tqdm import tqdm
 
 TMC_PYTHON_TESTER_ZIP_URL = (
     "https://github.com/testmycode/tmc-python-tester/archive/refs/heads/master.zip"
 )
+TMC_PYTHON_TESTER_ARCHIVE_URL = (
+    "https://github.com/testmycode/tmc-python-tester/archive/{ref}.zip"
+)
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+TMC_PYTHON_TESTER_LOCKFILE = "tmc-python-tester.lock"
+GIT_COMMIT_SHA_PATTERN = re.compile(r"[0-9a-f]{7,40}")
+EXPORT_MANIFEST_NAME = ".tmc-export-manifest.json"
+PACK_MANIFEST_NAME = ".tmc-pack-manifest.json"
+# Bump these whenever the output changes, so that everything gets rebuilt
+EXPORT_MANIFEST_VERSION = 1
+PACK_MANIFEST_VERSION = 1
+TEST_RESULTS_FILE_NAME = ".tmc_test_results.json"
+# Per-course state such as the test history and caches; not part of the course itself
+COURSE_STATE_DIR_NAME = ".tmc-course"
+HISTORY_DB_NAME = "history.sqlite3"
+# Runs kept in a course's test history; older ones are deleted as new ones are recorded
+HISTORY_MAX_RUNS = 500
+CHECK_CACHE_NAME = "check-cache.json"
+# Bump whenever analyze_source changes, so that cached results are discarded
+CHECK_CACHE_VERSION = 2
+RESULT_CACHE_DIR_NAME = "results"
+# Bump whenever the format of cached results or what goes into their keys changes
+RESULT_CACHE_VERSION = 1
+REMOTE_RESULT_CACHE_ENV = "TMC_COURSE_REMOTE_CACHE"
+REMOTE_RESULT_CACHE_TIMEOUT = 30
+# Seconds a serve-work worker may test an assignment before it stops the tests and
+# reports them as failed
+WORKER_TASK_TIMEOUT = 600.0
+# Extra seconds the coordinator waits for that report before handing the assignment to
+# another worker
+WORKER_REPORT_GRACE = 10.0
+# Times an assignment is handed out before it's reported as failed without a result
+WORKER_TASK_ATTEMPTS = 3
+# Directories owning_assignment remembers, enough for the files of a large commit
+OWNING_ASSIGNMENT_CACHE_SIZE = 4096
+# Below this many files to process, starting worker processes costs more than it saves
+PROCESS_POOL_MIN_FILES = 64
+GENERATED_FILE_NAMES = (TEST_RESULTS_FILE_NAME, ".available_points.json")
+# Files at the root of a course that are only used to author it
+COURSE_AUTHORING_FILE_NAMES = ("tmc-python-tester.zip", TMC_PYTHON_TESTER_LOCKFILE)
+TEMPLATE_PLACEHOLDER_PATTERN = re.compile(r"\{\{ *(\w+) *\}\}")
+# What skeleton_context fills in; other double braces are e.g. escapes in f-strings
+TEMPLATE_VARIABLES = ("course", "part", "assignment", "language", "points")
+LEFTOVER_PLACEHOLDER_PATTERN = re.compile(
+    r"POINTNAME|\{\{ *(?:" + "|".join(TEMPLATE_VARIABLES) + r") *\}\}"
+)
+POINT_NAME_PATTERN = re.compile(r"[\w.-]+")
+
+# Runs the TMC runner, which is killed after dumping the stacks of all threads to
+# stderr if any single test takes longer than sys.argv[1] seconds. A stuck test can't be
+# interrupted reliably, so the rest of the tests don't run and no results are written
+TEST_TIMEOUT_BOOTSTRAP = """
+import faulthandler, runpy, sys, unittest
+
+timeout = float(sys.argv.pop(1))
+run = unittest.TestCase.run
+
+
+def run_with_timeout(self, *args, **kwargs):
+    faulthandler.dump_traceback_later(timeout, exit=True)
+    try:
+        return run(self, *args, **kwargs)
+    finally:
+        faulthandler.cancel_dump_traceback_later()
+
+
+unittest.TestCase.run = run_with_timeout
+runpy.run_module("tmc", run_name="__main__", alter_sys=True)
+"""
+# Applies the rlimits in sys.argv[1] and runs the command in the rest of it, as
+# preexec_fn isn't safe to use in threaded programs
+RLIMIT_BOOTSTRAP = """
+import json, os, resource, sys
+
+for limit, soft, hard in json.loads(sys.argv[1]):
+    resource.setrlimit(limit, (soft, hard))
+os.execvp(sys.argv[2], sys.argv[2:])
+"""
+TMC_RUNNER_CODE = (
+    'import runpy; runpy.run_module("tmc", run_name="__main__", alter_sys=True)'
+)
+# A Python process started ahead of time with what every test run imports anyway. It
+# waits for a JSON request with the assignment to test, and the code to run it with
+RUNNER_POOL_BOOTSTRAP = """
+import faulthandler, json, os, runpy, sys, unittest
+
+# The standard library modules TMC-python-tester imports
+import bdb, copy, hashlib, hmac, importlib, inspect, traceback, unittest.mock
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+request = json.loads(sys.stdin.readline())
+os.dup2(os.open(os.devnull, os.O_RDONLY), 0)
+os.chdir(request["path"])
+if resource:
+    for limit, soft, hard in request["rlimits"]:
+        resource.setrlimit(limit, (soft, hard))
+sys.argv = request["argv"]
+exec(request["code"], {"__name__": "__main__"})
+"""
+DAEMON_SOCKET_NAME = "daemon.sock"
+# What faulthandler writes before the stacks when the timeout expires
+TEST_TIMEOUT_PATTERN = re.compile(r"Timeout \([\d:.]+\)!$", re.MULTILINE)
+TEST_SUCCESS_AFFIX = "\x1b[32;1mSUCCESS\x1b[0m"
+TEST_FAIL_AFFIX = "\x1b[31;1mFAIL\x1b[0m"
+TEST_LIMIT_AFFIX = "\x1b[33;1mLIMIT EXCEEDED\x1b[0m"
+TREE_BRANCH = "├── "
+TREE_LAST = "└── "
+TREE_PIPE = "│   "
+TREE_SPACE = "    "
+
+# ioctl request number for cloning a file on copy-on-write file systems (Linux)
+FICLONE = 0x40049409
 
 
 class ActionCancelledException(BaseException):
@@ -54,21 +211,92 @@ def check_from_user(
         raise ActionCancelledException
 
 
-def add_skeleton_file(skeleton_file: SkeletonFile, path: Path) -> None:
-    path = path.resolve()
-    logging.debug(f"Copying resource {skeleton_file.name} to {path}")
+@dataclass(frozen=True)
+class Template:
+    """A skeleton file template, split into literal text and {{ placeholders }}.
+
+    Placeholders that are not given a value when rendering are left as they are,
+    so that e.g. f-strings in templates don't need escaping.
+    """
+
+    chunks: tuple[tuple[str, str], ...]
+
+    @classmethod
+    def parse(cls, text: str) -> "Template":
+        chunks: list[tuple[str, str]] = []
+        position = 0
+        for match in TEMPLATE_PLACEHOLDER_PATTERN.finditer(text):
+            chunks.append(("", text[position : match.start()]))
+            chunks.append((match.group(1), match.group(0)))
+            position = match.end()
+        chunks.append(("", text[position:]))
+        return cls(tuple(chunks))
+
+    def render(self, context: dict[str, str]) -> str:
+        return "".join(
+            context.get(placeholder, text) if placeholder else text
+            for placeholder, text in self.chunks
+        )
+
+
+@functools.lru_cache(maxsize=None)
+def load_template(
+    skeleton_file: SkeletonFile, template_pack: Optional[Path] = None
+) -> Template:
     template_file_name = skeleton_file.name.casefold() + ".template"
-    resource_path = importlib.resources.files("tmc_course.resources").joinpath(
-        template_file_name
-    )
-    logging.debug(f"Template file path is {resource_path}")
-    shutil.copy(Path(str(resource_path)), path)
+    if template_pack is not None and (template_pack / template_file_name).is_file():
+        template_path = template_pack / template_file_name
+    else:
+        template_path = Path(
+            str(
+                importlib.resources.files("tmc_course.resources").joinpath(
+                    template_file_name
+                )
+            )
+        )
+    logging.debug(f"Loading template {template_path}")
+    with template_path.open("r", encoding="utf-8", newline="") as fh:
+        return Template.parse(fh.read())
+
+
+def template_pack_path(course_path: Path) -> Optional[Path]:
+    template_pack = read_course_config(course_path).get("template_pack")
+    return (course_path / template_pack).resolve() if template_pack else None
+
+
+def add_skeleton_file(
+    skeleton_file: SkeletonFile,
+    path: Path,
+    context: Optional[dict[str, str]] = None,
+    template_pack: Optional[Path] = None,
+) -> None:
+    path = path.resolve()
+    logging.debug(f"Rendering template {skeleton_file.name} to {path}")
+    template = load_template(skeleton_file, template_pack)
+    with path.open("w", encoding="utf-8", newline="") as fh:
+        fh.write(template.render(context or {}))
+
 
+def skeleton_context(
+    assignment_path: Path,
+    language: str,
+    point_names: Optional[list[str]] = None,
+) -> dict[str, str]:
+    return {
+        "course": assignment_path.parent.parent.name,
+        "part": assignment_path.parent.name,
+        "assignment": assignment_path.name,
+        "language": language,
+        "points": ", ".join(
+            f'"{point_name}"' for point_name in point_names or [assignment_path.name]
+        ),
+    }
 
-def init_course(course_path: Path) -> None:
+
+def init_course(course_path: Path, assume_yes: bool = False) -> None:
     course_path = course_path.resolve()
     logging.info(f"Initializing a new course in {course_path}")
-    if course_path.exists():
+    if course_path.exists() and not assume_yes:
         check_from_user(
             f"Directory {course_path} already exists. Continue and overwrite?"
         )
@@ -105,12 +333,59 @@ def is_valid_course(course_path: Path) -> bool:
     return True
 
 
+def read_tmcproject_yml(path: Path) -> dict[str, Union[str, dict[str, str]]]:
+    """Read the simple subset of YAML used in .tmcproject.yml files.
+
+    Only scalar values and a single level of nested mappings are supported, which
+    is all TMC and tmc-course need. Pulling in a full YAML parser isn't worth it.
+    """
+    config: dict[str, Union[str, dict[str, str]]] = {}
+    section: Optional[dict[str, str]] = None
+    for line in path.read_text().splitlines():
+        content = line.split(" #", 1)[0].rstrip()
+        if not content.strip() or content.lstrip().startswith("#"):
+            continue
+        key, separator, value = content.partition(":")
+        if not separator:
+            continue
+        key, value = key.strip(), value.strip().strip("\"'")
+        if line[0].isspace():
+            if section is not None:
+                section[key] = value
+        elif value:
+            config[key] = value
+            section = None
+        else:
+            section = {}
+            config[key] = section
+    return config
+
+
+def read_course_config(course_path: Path) -> dict[str, str]:
+    """Read the tmc-course settings from the "tmc_course" section of the course's
+    .tmcproject.yml, e.g.
+
+        tmc_course:
+          tester_ref: 068859680c7a2449e39579dac236c17bf8e6bbc5
+          tester_sha256: 0123...cdef
+    """
+    tmcproject_yml = course_path / ".tmcproject.yml"
+    if not tmcproject_yml.is_file():
+        return {}
+    section = read_tmcproject_yml(tmcproject_yml).get("tmc_course", {})
+    return section if isinstance(section, dict) else {}
+
+
 def init_part(course_path: Path, part_name: str) -> None:
     course_path = course_path.resolve()
 
     if not is_valid_course(course_path):
         raise ValueError(f"{course_path} is not a TMC course")
+    create_part(course_path, part_name)
 
+
+def create_part(course_path: Path, part_name: str) -> None:
+    """Create a part in a course that is known to be valid."""
     if not part_name.replace("_", "").isalnum():
         raise ValueError("Part name must be alphanumeric (underscores allowed)")
 
@@ -141,7 +416,11 @@ def is_valid_part(part: Path) -> bool:
     return True
 
 
-def create_src_skeleton(assignment_path: Path, language: Literal["en", "fi"]) -> None:
+def create_src_skeleton(
+    assignment_path: Path,
+    language: Literal["en", "fi"],
+    template_pack: Optional[Path] = None,
+) -> None:
     assignment_path = assignment_path.resolve()
     if language not in ("fi", "en"):
         raise ValueError("Language must be 'fi' or 'en'")
@@ -152,82 +431,460 @@ def create_src_skeleton(assignment_path: Path, language: Literal["en", "fi"]) ->
     logging.debug('Creating {assignment_path / "src" / "__init__.py"}"')
     (assignment_path / "src" / "__init__.py").touch(exist_ok=True)
 
+    context = skeleton_context(assignment_path, language)
     if language == "en":
         add_skeleton_file(
             SkeletonFile.ASSIGNMENT_SOLUTION_EN,
             assignment_path / "src" / "solution.py",
+            context,
+            template_pack,
         )
     else:
         add_skeleton_file(
             SkeletonFile.ASSIGNMENT_SOLUTION_FI,
             assignment_path / "src" / "ratkaisu.py",
+            context,
+            template_pack,
         )
 
 
 def create_test_skeleton(
-    assignment_path: Path, assignment_name: str, language: Literal["en", "fi"]
+    assignment_path: Path,
+    assignment_name: str,
+    language: Literal["en", "fi"],
+    point_names: Optional[list[str]] = None,
+    template_pack: Optional[Path] = None,
 ) -> None:
     assignment_path = assignment_path.resolve()
+    if language not in ("fi", "en"):
+        raise ValueError("Language must be 'fi' or 'en'")
+
     logging.debug(f'Creating {assignment_path / "test"}')
     (assignment_path / "test").mkdir(exist_ok=True)
 
     logging.debug(f'Creating {assignment_path / "test" / "__init__.py"}')
     (assignment_path / "test" / "__init__.py").touch(exist_ok=True)
 
+    context = skeleton_context(
+        assignment_path, language, point_names or [assignment_name]
+    )
     if language == "en":
-        test_file_path = assignment_path / "test" / "test_solution.py"
-        add_skeleton_file(SkeletonFile.ASSIGNMENT_TEST_EN, test_file_path)
-    elif language == "fi":
-        test_file_path = assignment_path / "test" / "test_ratkaisu.py"
-        add_skeleton_file(SkeletonFile.ASSIGNMENT_TEST_FI, test_file_path)
+        add_skeleton_file(
+            SkeletonFile.ASSIGNMENT_TEST_EN,
+            assignment_path / "test" / "test_solution.py",
+            context,
+            template_pack,
+        )
     else:
-        raise ValueError("Language must be 'fi' or 'en'")
-
-    logging.debug("Inserting assignment name into test file")
-    with test_file_path.open("r") as fh:
-        file_contents = fh.read()
-    file_contents = file_contents.replace("POINTNAME", assignment_name)
-    with test_file_path.open("w") as fh:
-        fh.write(file_contents)
+        add_skeleton_file(
+            SkeletonFile.ASSIGNMENT_TEST_FI,
+            assignment_path / "test" / "test_ratkaisu.py",
+            context,
+            template_pack,
+        )
     logging.debug("Test skeleton complete")
 
 
-def download_tmc_python_tester(course_path: Path, update: bool) -> None:
+def file_sha256(path: Path) -> str:
+    sha256 = hashlib.sha256()
+    with path.open("rb") as fh:
+        while chunk := fh.read(DOWNLOAD_CHUNK_SIZE):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def verify_tmc_python_tester(tester_zip_path: Path, config: dict[str, str]) -> None:
+    if not zipfile.is_zipfile(tester_zip_path):
+        raise ValueError(f"{tester_zip_path} is not a valid zip file")
+
+    pinned_sha256 = config.get("tester_sha256", "").casefold()
+    if pinned_sha256:
+        actual_sha256 = file_sha256(tester_zip_path)
+        if actual_sha256 != pinned_sha256:
+            raise ValueError(
+                f"SHA-256 of {tester_zip_path} is {actual_sha256}, "
+                f"but the course pins {pinned_sha256}"
+            )
+
+    # GitHub stores the SHA of the archived commit as the zip comment, so commit
+    # pins can be checked. Branch and tag names can't, they are only used in the URL
+    pinned_ref = config.get("tester_ref", "").casefold()
+    if GIT_COMMIT_SHA_PATTERN.fullmatch(pinned_ref):
+        with zipfile.ZipFile(tester_zip_path) as tester_zip:
+            commit = tester_zip.comment.decode("ascii", errors="replace").strip()
+        if not commit.casefold().startswith(pinned_ref):
+            raise ValueError(
+                f"{tester_zip_path} was built from commit {commit or '(unknown)'}, "
+                f"but the course pins {pinned_ref}"
+            )
+
+
+def download_file(url: str, partial_path: Path) -> None:
+    """Download url into partial_path, resuming from whatever it already contains."""
+    import requests
+    from tqdm import tqdm
+
+    offset = partial_path.stat().st_size if partial_path.exists() else 0
+    headers = {"Range": f"bytes={offset}-"} if offset else {}
+    if offset:
+        logging.debug(f"Resuming download of {url} from byte {offset}")
+
+    with requests.get(url, stream=True, headers=headers, timeout=60) as response:
+        if response.status_code == 416 and offset:
+            # Range Not Satisfiable: the previous attempt already got everything
+            logging.debug(f"{partial_path} is already complete")
+            return
+        response.raise_for_status()
+        if response.status_code != 206:
+            offset = 0
+        content_length = response.headers.get("Content-Length")
+        with (
+            partial_path.open("ab" if offset else "wb") as fh,
+            tqdm(
+                total=int(content_length) + offset if content_length else None,
+                initial=offset,
+                unit="B",
+                unit_scale=True,
+                unit_divisor=1024,
+                disable=not logging.getLogger().isEnabledFor(logging.INFO),
+            ) as progress,
+        ):
+            for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                fh.write(chunk)
+                progress.update(len(chunk))
+
+
+def zip_tmc_python_tester_dir(tester_path: Path, zip_path: Path) -> None:
+    if not (tester_path / "tmc").is_dir():
+        raise ValueError(f"{tester_path} is not a TMC-python-tester (missing tmc/)")
+    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as tester_zip:
+        for path in sorted((tester_path / "tmc").rglob("*")):
+            if path.is_dir() or "__pycache__" in path.parts:
+                continue
+            arcname = (
+                f"tmc-python-tester-local/{path.relative_to(tester_path).as_posix()}"
+            )
+            tester_zip.write(path, arcname)
+
+
+def tmc_python_tester_source(config: dict[str, str]) -> str:
+    if "tester_source" in config:
+        return config["tester_source"]
+    if "tester_ref" in config:
+        return TMC_PYTHON_TESTER_ARCHIVE_URL.format(ref=config["tester_ref"])
+    return TMC_PYTHON_TESTER_ZIP_URL
+
+
+def fetch_tmc_python_tester(source: str, course_path: Path, target: Path) -> None:
+    """Fetch the TMC-python-tester zip from source into target.
+
+    The source is either "vendored" for the copy shipped with tmc-course, a http(s)
+    or file:// URL, or a path (relative to the course) of a zip or a directory.
+    """
+    if source.startswith(("http://", "https://")):
+        logging.info("Downloading TMC-python-tester")
+        download_file(source, target)
+        return
+
+    if source == "vendored":
+        resource = importlib.resources.files("tmc_course.resources").joinpath(
+            "tmc-python-tester.zip"
+        )
+        source_path = Path(str(resource))
+    elif source.startswith("file:"):
+        from urllib.request import url2pathname
+
+        source_path = Path(url2pathname(urlparse(source).path))
+    else:
+        source_path = course_path / source
+
+    logging.info(f"Copying TMC-python-tester from {source_path}")
+    if source_path.is_dir():
+        zip_tmc_python_tester_dir(source_path, target)
+    else:
+        shutil.copyfile(source_path, target)
+
+
+def read_tmc_python_tester_lock(course_path: Path) -> dict[str, str]:
+    lockfile = course_path / TMC_PYTHON_TESTER_LOCKFILE
+    if not lockfile.is_file():
+        return {}
+    return {
+        key: value
+        for key, value in read_tmcproject_yml(lockfile).items()
+        if isinstance(value, str)
+    }
+
+
+def write_tmc_python_tester_lock(
+    course_path: Path, source: str, tester_zip_path: Path
+) -> None:
+    with zipfile.ZipFile(tester_zip_path) as tester_zip:
+        commit = tester_zip.comment.decode("ascii", errors="replace").strip()
+    lockfile = course_path / TMC_PYTHON_TESTER_LOCKFILE
+    logging.debug(f"Writing {lockfile}")
+    lockfile.write_text(
+        "# Generated by tmc-course, run `tmc-course update` to refresh\n"
+        f"source: {source}\n"
+        f"commit: {commit}\n"
+        f"sha256: {file_sha256(tester_zip_path)}\n"
+    )
+
+
+def download_tmc_python_tester(
+    course_path: Path, update: bool, target: Optional[Path] = None
+) -> Path:
+    """Make sure the course has a usable tmc-python-tester.zip, returning its path.
+
+    Unless updating, the version recorded in the course's lockfile is used. After
+    fetching a new version, the lockfile is rewritten. With a target, a new version
+    is fetched there instead, leaving the course's zip and lockfile untouched.
+    """
     course_path = course_path.resolve()
     tester_zip_path = course_path / "tmc-python-tester.zip"
     logging.debug(
         f'Looking for TMC-python-tester zip at {course_path / "tmc-python-tester.zip"}'
     )
+    config = read_course_config(course_path)
+    lock = read_tmc_python_tester_lock(course_path)
+    if not update and "sha256" in lock:
+        config.setdefault("tester_sha256", lock["sha256"])
+        # Branches move on, so fetch the very commit the lock was made from
+        if (
+            "tester_source" not in config
+            and GIT_COMMIT_SHA_PATTERN.fullmatch(lock.get("commit", ""))
+            and lock.get("source") == tmc_python_tester_source(config)
+        ):
+            config["tester_ref"] = lock["commit"]
+    pinned = "tester_sha256" in config or "tester_ref" in config
 
-    if update or not tester_zip_path.exists():
-        logging.info("Downloading TMC-python-tester")
-        logging.debug(f"URL: {TMC_PYTHON_TESTER_ZIP_URL}")
-        response = requests.get(TMC_PYTHON_TESTER_ZIP_URL, stream=True)
-        with open(tester_zip_path, "wb") as fh:
-            for chunk in response.iter_content(chunk_size=128):
-                fh.write(chunk)
+    if tester_zip_path.exists() and not (update or pinned):
+        return tester_zip_path
+    if tester_zip_path.exists() and pinned:
+        try:
+            verify_tmc_python_tester(tester_zip_path, config)
+            logging.debug("Existing TMC-python-tester zip matches the pinned version")
+            return tester_zip_path
+        except ValueError as e:
+            logging.info(f"Existing TMC-python-tester zip is unusable: {e}")
+
+    source = tmc_python_tester_source(config)
+    logging.debug(f"TMC-python-tester source: {source}")
+    # The new archive goes to a separate file, which is renamed into place only
+    # once it is complete and verified. An interrupted download is resumed next time.
+    partial_path = (target or tester_zip_path).with_name(tester_zip_path.name + ".part")
+    fetch_tmc_python_tester(source, course_path, partial_path)
+    try:
+        verify_tmc_python_tester(partial_path, config)
+    except ValueError:
+        partial_path.unlink()
+        raise
+    if target:
+        os.replace(partial_path, target)
+        return target
+    os.replace(partial_path, tester_zip_path)
+    write_tmc_python_tester_lock(course_path, source, tester_zip_path)
+    return tester_zip_path
+
+
+def tmc_python_tester_members(
+    tester_zip: zipfile.ZipFile,
+) -> Generator[tuple[zipfile.ZipInfo, PurePosixPath], None, None]:
+    # Archives from GitHub wrap everything in a single "<repo>-<ref>/" directory,
+    # the name of which depends on the ref that was downloaded.
+    for file_info in tester_zip.infolist():
+        parts = PurePosixPath(file_info.filename).parts
+        if len(parts) < 3 or parts[1] != "tmc" or file_info.is_dir():
+            continue
+        yield file_info, PurePosixPath(*parts[2:])
+
+
+def extract_tmc_python_tester(tester_zip_path: Path, target_path: Path) -> None:
+    logging.debug(f"Extracting TMC-python-tester from {tester_zip_path}")
+    with zipfile.ZipFile(tester_zip_path) as tester_zip:
+        for file_info, relative_path in tmc_python_tester_members(tester_zip):
+            file_path = target_path.joinpath(*relative_path.parts)
+            logging.debug(f"Extracting {file_info.filename} to {file_path}")
+            file_path.parent.mkdir(parents=True, exist_ok=True)
+            with tester_zip.open(file_info) as src, file_path.open("wb") as dst:
+                shutil.copyfileobj(src, dst)
+
+
+class TmcPythonTesterStaging:
+    """The tmc/ directory of a TMC-python-tester zip, extracted on first use.
+
+    The index of (CRC32, size) pairs comes straight from the zip's central
+    directory, so comparing assignments against it never decompresses anything.
+    """
+
+    def __init__(self, tester_zip_path: Path, staging_path: Path) -> None:
+        self.tester_zip_path = tester_zip_path
+        self.staging_path = staging_path
+        self.extracted = False
+        self.lock = threading.Lock()
+        with zipfile.ZipFile(tester_zip_path) as tester_zip:
+            self.index: dict[PurePosixPath, tuple[int, int]] = {
+                relative_path: (file_info.CRC, file_info.file_size)
+                for file_info, relative_path in tmc_python_tester_members(tester_zip)
+            }
+
+    def file(self, relative_path: PurePosixPath) -> Path:
+        with self.lock:
+            if not self.extracted:
+                extract_tmc_python_tester(self.tester_zip_path, self.staging_path)
+                self.extracted = True
+        return self.staging_path.joinpath(*relative_path.parts)
+
+
+@contextlib.contextmanager
+def tmc_python_tester_staging(
+    course_path: Path, tester_zip_path: Optional[Path] = None
+) -> Generator[TmcPythonTesterStaging, None, None]:
+    """Stage the TMC-python-tester once so that it can be linked to assignments.
+
+    The staging directory lives inside the course so that it is on the same file
+    system as the assignments, which is what allows hard links to be used. Unless
+    another tester_zip_path is given, the course's own tmc-python-tester.zip is used.
+    """
+    course_path = course_path.resolve()
+    if tester_zip_path is None:
+        tester_zip_path = download_tmc_python_tester(course_path, update=False)
+    with tempfile.TemporaryDirectory(
+        prefix=".tmc-python-tester-", dir=course_path
+    ) as staging_dir:
+        yield TmcPythonTesterStaging(tester_zip_path, Path(staging_dir))
+
+
+def reflink(source: Path, destination: Path) -> None:
+    with source.open("rb") as src, destination.open("wb") as dst:
+        if hasattr(fcntl, "ioctl"):
+            with contextlib.suppress(OSError):
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+                return
+        if not hasattr(os, "copy_file_range"):
+            raise OSError(errno.EOPNOTSUPP, "copy_file_range is not available")
+        remaining = os.fstat(src.fileno()).st_size
+        while remaining > 0:
+            copied = os.copy_file_range(src.fileno(), dst.fileno(), remaining)
+            if copied == 0:
+                raise OSError(errno.EIO, f"copy_file_range stalled on {source}")
+            remaining -= copied
+
+
+def link_or_copy(source: Path, destination: Path, hardlink: bool = True) -> None:
+    """Populate destination with the contents of source as cheaply as possible.
+
+    Tries a hard link first (unless hardlink is False), then a reflink (or in-kernel
+    copy), and finally falls back to a plain copy, e.g. when source and destination
+    are on different file systems. An existing destination is replaced rather than
+    written into, so that files hard linked elsewhere are never modified.
+    """
+    destination.unlink(missing_ok=True)
+    if hardlink:
+        try:
+            os.link(source, destination)
+            logging.debug(f"Hard linked {source} to {destination}")
+            return
+        except OSError:
+            pass
+    try:
+        reflink(source, destination)
+        logging.debug(f"Reflinked {source} to {destination}")
+        return
+    except OSError:
+        destination.unlink(missing_ok=True)
+    shutil.copyfile(source, destination)
+    logging.debug(f"Copied {source} to {destination}")
+
+
+@dataclass
+class TmcDirDiff:
+    assignment_path: Path
+    added: list[PurePosixPath] = field(default_factory=list)
+    changed: list[PurePosixPath] = field(default_factory=list)
+    removed: list[PurePosixPath] = field(default_factory=list)
+
+    @property
+    def has_changes(self) -> bool:
+        return bool(self.added or self.changed or self.removed)
+
+    def format(self) -> str:
+        lines = [f'{self.assignment_path / "tmc"}:']
+        lines.extend(f"  + {path}" for path in self.added)
+        lines.extend(f"  ~ {path}" for path in self.changed)
+        lines.extend(f"  - {path}" for path in self.removed)
+        return "\n".join(lines)
+
+
+def file_crc32(path: Path) -> int:
+    crc = 0
+    with path.open("rb") as fh:
+        while chunk := fh.read(1024 * 1024):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+def diff_tmc_dir(
+    assignment_path: Path, index: dict[PurePosixPath, tuple[int, int]]
+) -> TmcDirDiff:
+    tmc_path = assignment_path / "tmc"
+    diff = TmcDirDiff(assignment_path)
+    existing: set[PurePosixPath] = set()
+    if tmc_path.is_dir():
+        for path in tmc_path.rglob("*"):
+            relative_path = PurePosixPath(path.relative_to(tmc_path).as_posix())
+            if "__pycache__" in relative_path.parts or path.is_dir():
+                continue
+            existing.add(relative_path)
+            if relative_path not in index:
+                diff.removed.append(relative_path)
+                continue
+            crc, size = index[relative_path]
+            if path.stat().st_size != size or file_crc32(path) != crc:
+                diff.changed.append(relative_path)
+    diff.added.extend(path for path in index if path not in existing)
+    diff.added.sort()
+    diff.changed.sort()
+    diff.removed.sort()
+    return diff
 
 
-def create_tmc_dir(assignment_path: Path) -> None:
+def apply_tmc_dir_diff(diff: TmcDirDiff, staging: TmcPythonTesterStaging) -> None:
+    tmc_path = diff.assignment_path / "tmc"
+    for relative_path in diff.added + diff.changed:
+        destination = tmc_path.joinpath(*relative_path.parts)
+        logging.debug(f"Writing {destination}")
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        link_or_copy(staging.file(relative_path), destination)
+    for relative_path in diff.removed:
+        destination = tmc_path.joinpath(*relative_path.parts)
+        logging.debug(f"Removing {destination}")
+        destination.unlink()
+        # Clean up directories left empty, but never the tmc/ directory itself
+        for parent in destination.parents:
+            if parent == tmc_path or any(parent.iterdir()):
+                break
+            parent.rmdir()
+
+
+def create_tmc_dir(
+    assignment_path: Path,
+    staging: Optional[TmcPythonTesterStaging] = None,
+    dry_run: bool = False,
+) -> TmcDirDiff:
     assignment_path = assignment_path.resolve()
+    if staging is None:
+        with tmc_python_tester_staging(assignment_path.parent.parent) as staging:
+            return create_tmc_dir(assignment_path, staging, dry_run)
+
+    diff = diff_tmc_dir(assignment_path, staging.index)
+    if dry_run or not diff.has_changes:
+        return diff
+
     logging.debug(f'Creating {assignment_path / "tmc"}')
     (assignment_path / "tmc").mkdir(exist_ok=True)
-
-    course_path = assignment_path.parent.parent
-    download_tmc_python_tester(course_path, update=False)
-
-    with zipfile.ZipFile(course_path / "tmc-python-tester.zip") as tester_zip:
-        for file_info in tester_zip.infolist():
-            logging.debug(f"Looking at file {file_info.filename=}")
-            if file_info.filename.startswith("tmc-python-tester-master/tmc/"):
-                # Need to remove prefix, s.t. we don't retain the parent folders
-                file_info.filename = file_info.filename.replace(
-                    "tmc-python-tester-master/tmc", ""
-                )
-                logging.debug(
-                    f'Extracting {file_info.filename} to {assignment_path / "tmc"}'
-                )
-                tester_zip.extract(file_info, assignment_path / "tmc")
+    apply_tmc_dir_diff(diff, staging)
+    return diff
 
 
 def init_assignment(
@@ -235,32 +892,60 @@ def init_assignment(
     part_name: str,
     assignment_name: str,
     language: Literal["fi", "en"],
+    point_names: Optional[list[str]] = None,
+    staging: Optional[TmcPythonTesterStaging] = None,
+    assume_yes: bool = False,
 ) -> None:
     course_path = course_path.resolve()
     if not is_valid_course(course_path):
         raise ValueError(f"{course_path} is not a valid TMC course")
     if not is_valid_part(course_path / part_name):
         raise ValueError(f"{course_path / part_name} is not a valid course part")
+    create_assignment(
+        course_path / part_name,
+        assignment_name,
+        language,
+        point_names,
+        staging,
+        assume_yes,
+    )
+
 
+def create_assignment(
+    part_path: Path,
+    assignment_name: str,
+    language: Literal["fi", "en"],
+    point_names: Optional[list[str]] = None,
+    staging: Optional[TmcPythonTesterStaging] = None,
+    assume_yes: bool = False,
+) -> None:
+    """Create an assignment in a part that is known to be valid."""
     if not assignment_name.replace("_", "").isalnum():
         raise ValueError("Assignment name must be alphanumeric (underscores allowed)")
 
-    assignment_path = course_path / part_name / assignment_name
+    course_path = part_path.parent
+    assignment_path = part_path / assignment_name
     logging.info(f"Initializing a new assignment in {assignment_name}")
 
-    if assignment_path.exists():
+    if assignment_path.exists() and not assume_yes:
         check_from_user(
             f"Directory {assignment_path} already exists. Continue and overwrite?"
         )
     logging.debug(f"Creating {assignment_path}")
     assignment_path.mkdir(exist_ok=True)
 
+    template_pack = template_pack_path(course_path)
     add_skeleton_file(
-        SkeletonFile.ASSIGNMENT_TMCPROJECT_YML, assignment_path / ".tmcproject.yml"
+        SkeletonFile.ASSIGNMENT_TMCPROJECT_YML,
+        assignment_path / ".tmcproject.yml",
+        skeleton_context(assignment_path, language, point_names),
+        template_pack,
+    )
+    create_src_skeleton(assignment_path, language, template_pack)
+    create_test_skeleton(
+        assignment_path, assignment_name, language, point_names, template_pack
     )
-    create_src_skeleton(assignment_path, language)
-    create_test_skeleton(assignment_path, assignment_name, language)
-    create_tmc_dir(assignment_path)
+    create_tmc_dir(assignment_path, staging)
 
 
 def is_valid_assignment(assignment_path: Path) -> bool:
@@ -279,173 +964,3162 @@ def is_valid_assignment(assignment_path: Path) -> bool:
     return True
 
 
-def update_course(course_path: Path) -> None:
-    course_path = course_path.resolve()
-    logging.info(f"Updating TMC-python-tester for course {course_path}")
-    download_tmc_python_tester(course_path, update=True)
-    is_valid_course(course_path)
-    for maybe_part in course_path.iterdir():
-        logging.debug(f"Checking whether {maybe_part} is a course part")
-        if not is_valid_part(maybe_part):
-            logging.debug("Not a part, skipping")
+@dataclass
+class ManifestAssignment:
+    part_name: str
+    assignment_name: str
+    language: str
+    point_names: list[str]
+
+
+def read_manifest(
+    manifest_path: Path,
+) -> tuple[Path, list[ManifestAssignment], list[str]]:
+    """Read a course manifest, either YAML
+
+        course: my_course  # relative to the manifest, defaults to its directory
+        language: en  # default for all assignments
+        parts:
+          - name: part01
+            assignments:
+              - name: assg01
+                language: fi
+                points: [assg01_1, assg01_2]
+
+    or CSV with the columns part, assignment, language and points (space separated).
+    Entries that don't have this structure are returned as errors for
+    validate_manifest to report.
+    """
+    manifest_path = manifest_path.resolve()
+    course_path = manifest_path.parent
+    entries: list[ManifestAssignment] = []
+    errors: list[str] = []
+
+    if manifest_path.suffix.casefold() == ".csv":
+        with manifest_path.open(newline="") as fh:
+            for row in csv.DictReader(fh):
+                entries.append(
+                    ManifestAssignment(
+                        (row.get("part") or "").strip(),
+                        (row.get("assignment") or "").strip(),
+                        (row.get("language") or "en").strip(),
+                        (row.get("points") or "").split(),
+                    )
+                )
+        return course_path, entries, errors
+
+    try:
+        import yaml
+    except ImportError:
+        raise ValueError(
+            "YAML manifests require PyYAML (pip install tmc-course[yaml]), "
+            "use a CSV manifest instead"
+        )
+    manifest = yaml.safe_load(manifest_path.read_text()) or {}
+    if not isinstance(manifest, dict):
+        raise ValueError(f"{manifest_path} must contain a mapping")
+    course_path = course_path / str(manifest.get("course", "."))
+    default_language = manifest.get("language", "en")
+    parts = manifest.get("parts") or []
+    if not isinstance(parts, list):
+        errors.append("parts must be a list")
+        parts = []
+    for part_number, part in enumerate(parts, 1):
+        if not isinstance(part, dict):
+            errors.append(f"part {part_number}: must be a mapping, not {part!r}")
             continue
-        for maybe_assignment in maybe_part.iterdir():
-            logging.debug(f"Checking whether {maybe_assignment} is an assignment")
-            if not is_valid_assignment(maybe_assignment):
-                logging.debug("Not an assignment, skipping")
+        part_name = str(part.get("name", ""))
+        assignments = part.get("assignments") or []
+        if not isinstance(assignments, list):
+            errors.append(f"{part_name}: assignments must be a list")
+            continue
+        for assignment_number, assignment in enumerate(assignments, 1):
+            if not isinstance(assignment, dict):
+                errors.append(
+                    f"{part_name}: assignment {assignment_number} must be a mapping, "
+                    f"not {assignment!r}"
+                )
                 continue
-            logging.info(f"Updating assignment at {maybe_assignment}")
-            create_tmc_dir(maybe_assignment)
+            label = f"{part_name}/{assignment.get('name', '')}"
+            points = assignment.get("points") or []
+            if isinstance(points, str):
+                points = [points]
+            elif not isinstance(points, list):
+                errors.append(f"{label}: points must be a list")
+                points = []
+            entries.append(
+                ManifestAssignment(
+                    part_name,
+                    str(assignment.get("name", "")),
+                    str(assignment.get("language", default_language)),
+                    [str(point_name) for point_name in points],
+                )
+            )
+    return course_path.resolve(), entries, errors
 
 
-@dataclass
-class TestTask:
-    path: Path
+def validate_manifest(
+    entries: list[ManifestAssignment],
+    errors: Optional[list[str]] = None,
+    new_course_path: Optional[Path] = None,
+) -> None:
+    """Raise a ValueError listing everything wrong with the manifest at once.
 
-    @property
-    def course_path(self) -> Path:
-        return self.path.parent.parent
+    new_course_path is the course the manifest would create, if it doesn't exist yet.
+    """
+    errors = list(errors or [])
+    if new_course_path and not new_course_path.name.replace("_", "").isalnum():
+        errors.append(
+            f"{new_course_path.name}: course name must be alphanumeric "
+            "(underscores allowed)"
+        )
+    seen_assignments: set[tuple[str, str]] = set()
+    seen_points: dict[str, str] = {}
+    for entry in entries:
+        label = f"{entry.part_name}/{entry.assignment_name}"
+        if not entry.part_name.replace("_", "").isalnum():
+            errors.append(f"{label}: part name must be alphanumeric")
+        if not entry.assignment_name.replace("_", "").isalnum():
+            errors.append(f"{label}: assignment name must be alphanumeric")
+        if entry.language not in ("fi", "en"):
+            errors.append(f"{label}: language must be 'fi' or 'en'")
+        if (entry.part_name, entry.assignment_name) in seen_assignments:
+            errors.append(f"{label}: listed more than once")
+        seen_assignments.add((entry.part_name, entry.assignment_name))
+        for point_name in entry.point_names:
+            if not POINT_NAME_PATTERN.fullmatch(point_name):
+                errors.append(f"{label}: invalid point name {point_name!r}")
+            elif point_name in seen_points:
+                errors.append(
+                    f"{label}: point {point_name!r} is already used by "
+                    f"{seen_points[point_name]}"
+                )
+            else:
+                seen_points[point_name] = label
+    if errors:
+        raise ValueError("Invalid manifest:\n" + "\n".join(errors))
 
-    @property
-    def part_path(self) -> Path:
-        return self.path.parent
 
+def init_from_manifest(
+    manifest_path: Path, assume_yes: bool = False, jobs: int = 1
+) -> list[Path]:
+    course_path, entries, errors = read_manifest(manifest_path)
+    new_course = not is_valid_course(course_path)
+    validate_manifest(entries, errors, course_path if new_course else None)
 
-@dataclass
-class TestResult:
-    task: TestTask
-    success: bool
-    stdout: str
-    stderr: str
+    part_names = sorted(set(entry.part_name for entry in entries))
+    existing = [
+        path
+        for path in [course_path / part_name for part_name in part_names]
+        + [course_path / e.part_name / e.assignment_name for e in entries]
+        if path.exists()
+    ]
+    if new_course and course_path.exists():
+        # init_course would overwrite its .gitignore and .tmcproject.yml
+        existing.insert(0, course_path)
+    if existing and not assume_yes:
+        check_from_user(
+            f"{len(existing)} existing path(s) would be overwritten, "
+            f"e.g. {existing[0]}. Continue and overwrite?"
+        )
+        assume_yes = True
 
+    logging.info(
+        f"Initializing {len(part_names)} part(s) and {len(entries)} assignment(s) "
+        f"in {course_path}"
+    )
+    from tqdm import tqdm
 
-def collect_tasks(paths: list[Path]) -> Generator[TestTask, None, None]:
-    paths = [p.resolve() for p in paths]
-    for path in paths:
-        if is_valid_assignment(path):
-            logging.debug(f"{path} is assignment")
-            yield TestTask(path)
-        elif is_valid_part(path):
-            logging.debug(f"{path} appears to be a part")
-            yield from collect_tasks(
-                list(child for child in path.iterdir() if child.is_dir())
-            )
-        elif is_valid_course(path):
-            logging.debug(f"{path} appears to be a course")
-            yield from collect_tasks(
-                list(child for child in path.iterdir() if child.is_dir())
+    if new_course:
+        init_course(course_path, assume_yes=assume_yes)
+    for part_name in part_names:
+        (course_path / part_name).mkdir(exist_ok=True)
+
+    with (
+        tmc_python_tester_staging(course_path) as staging,
+        ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor,
+    ):
+        # The course and the parts were validated above, no need to do it for every
+        # assignment
+        futures = [
+            executor.submit(
+                create_assignment,
+                course_path / entry.part_name,
+                entry.assignment_name,
+                cast(Literal["fi", "en"], entry.language),
+                entry.point_names or None,
+                staging,
+                True,
             )
-        else:
-            logging.debug(f"{path} is neither an assignment, a part, or a course")
+            for entry in entries
+        ]
+        for future in tqdm(
+            as_completed(futures),
+            total=len(futures),
+            unit=" assg",
+            disable=not logging.getLogger().isEnabledFor(logging.INFO),
+        ):
+            future.result()
 
+    return [course_path / e.part_name / e.assignment_name for e in entries]
 
-def is_last_child_of_parent(nodeid: object, tree: treelib.Tree) -> bool:
-    if not tree.parent(nodeid):
-        return True
 
-    # variable needed for mypy; treelib is untyped, so otherwise the result
-    # of this __eq__ is Any
-    result: bool = (
-        tree.get_node(nodeid) == tree.children(tree.parent(nodeid).identifier)[-1]
-    )
-    return result
+class UpdateStatus(Enum):
+    UPDATED = auto()
+    SKIPPED = auto()
+    FAILED = auto()
 
 
-def print_test_output(results: list[TestResult]) -> None:
-    tree = treelib.Tree()
-    tree.create_node("Test Results", "root")
+@dataclass
+class UpdateResult:
+    assignment_path: Path
+    status: UpdateStatus
+    diff: Optional[TmcDirDiff] = None
+    error: Optional[str] = None
 
-    for course_path in set(result.task.course_path for result in results):
-        tree.create_node(course_path.name, course_path, parent="root")
 
-    for part_path in set(result.task.part_path for result in results):
-        tree.create_node(part_path.name, part_path, parent=part_path.parent)
+def find_assignments(course_path: Path) -> Generator[Path, None, None]:
+    if not is_valid_course(course_path):
+        return
+    for assignment in Course(course_path).assignments:
+        yield assignment.path
 
-    for idx, result in enumerate(results):
-        affix = (
-            "\x1b[32;1mSUCCESS\x1b[0m" if result.success else "\x1b[31;1mFAIL\x1b[0m"
-        )
-        tree.create_node(
-            f"{result.task.path.name} - {affix}",
-            result.task.path,
-            parent=result.task.part_path,
-        )
 
-    tree.show()
+class Course:
+    """A TMC course, for driving tmc-course from Python.
 
+    The course is validated once, when created. Its config, parts and their
+    assignments are read from disk when first needed and then kept, so a program
+    can walk a course once and reuse the objects to update, test or export it. Call
+    refresh() after changing the course by other means than these objects.
+    """
 
-def test(paths: list[Path], detailed: bool = False) -> tuple[bool, list[TestResult]]:
-    paths = [p.resolve() for p in paths]
-    logging.debug("Collecting assignments")
-    tasks: list[TestTask] = list(collect_tasks(paths))
+    __slots__ = ("path", "_config", "_parts")
 
-    results: list[TestResult] = []
-    logging.debug("Running tests")
-    for task in tqdm(
-        tasks, unit=" assg", disable=not logging.getLogger().isEnabledFor(logging.INFO)
-    ):
-        results.append(run_test_task(task))
+    def __init__(self, path: Path) -> None:
+        path = path.resolve()
+        if not is_valid_course(path):
+            raise ValueError(f"{path} is not a valid TMC course")
+        self.path = path
+        self._config: Optional[dict[str, str]] = None
+        self._parts: Optional[dict[str, Part]] = None
 
-    for result in results:
-        if detailed or not result.success:
-            logging.info("")
-            logging.info(f"\nTEST RESULTS FOR {result.task.path}:")
-            tabbed_stderr = "\n".join(
-                "\t" + line for line in result.stderr.splitlines()
-            )
-            logging.info(tabbed_stderr)
-    logging.info("\n")
+    @classmethod
+    def init(cls, path: Path, assume_yes: bool = False) -> "Course":
+        init_course(path, assume_yes)
+        return cls(path)
 
-    all_passed = all(result.success for result in results)
-    if logging.getLogger().isEnabledFor(logging.INFO) or detailed:
-        print_test_output(results)
-    if all_passed:
-        logging.info("\x1b[32;1mALL TEST PASSED\x1b[0m")
-    else:
-        logging.warning("\x1b[31;1mSOME TESTS FAILED\x1b[0m")
+    def __repr__(self) -> str:
+        return f"Course({str(self.path)!r})"
 
-    return all_passed, results
+    @property
+    def name(self) -> str:
+        return self.path.name
 
+    @property
+    def config(self) -> dict[str, str]:
+        """The "tmc_course" section of the course's .tmcproject.yml."""
+        if self._config is None:
+            self._config = read_course_config(self.path)
+        return self._config
 
-@contextlib.contextmanager
-def cwd(path: Path) -> Generator[None, None, None]:
-    old_wd = os.getcwd()
-    os.chdir(path)
-    try:
-        yield
-    finally:
-        os.chdir(old_wd)
+    @property
+    def parts(self) -> list["Part"]:
+        if self._parts is None:
+            # Hidden directories are things like .git and the course state
+            self._parts = {
+                path.name: Part(self, path)
+                for path in sorted(self.path.iterdir())
+                if path.is_dir() and not path.name.startswith(".")
+            }
+        return list(self._parts.values())
 
+    def part(self, name: str) -> "Part":
+        for part in self.parts:
+            if part.name == name:
+                return part
+        raise ValueError(f"{self.path / name} is not a valid course part")
 
-def run_test_task(task: TestTask) -> TestResult:
-    assignment_path = task.path.resolve()
-    logging.debug(f"Running tests for {assignment_path}")
-    if not is_valid_assignment(assignment_path):
-        raise ValueError(f"{assignment_path} is not a valid TMC assignment")
-    with cwd(assignment_path):
-        logging.debug(f"{assignment_path=}, {os.getcwd()=}")
-        result = subprocess.run(
-            ["python3", "-m", "tmc"],
-            cwd=assignment_path,
-            capture_output=True,
-            text=True,
-        )
-    logging.debug(f"Test run complete; {result.returncode=}")
-    return TestResult(task, result.returncode == 0, result.stdout, result.stderr)
+    @property
+    def assignments(self) -> list["Assignment"]:
+        return [assignment for part in self.parts for assignment in part.assignments]
 
+    def refresh(self) -> None:
+        self._config = None
+        self._parts = None
 
-def main(argv: Optional[list[str]] = None) -> int:
-    parser = argparse.ArgumentParser(
-        "tmc-course",
-        description="Helper for building TestMyCode python programming courses",
-    )
-    parser.add_argument(
-        "--version",
-        action="version",
-        version=importlib.metadata.version(__package__ or __name__),
-    )
+    def init_part(self, name: str) -> "Part":
+        create_part(self.path, name)
+        self._parts = None
+        return self.part(name)
 
-    verbosity_grp = parser.add_mutually_exclusive_group()
+    def update(self, dry_run: bool = False, jobs: int = 1) -> list[UpdateResult]:
+        return update_course(
+            self.path, dry_run, jobs, [a.path for a in self.assignments]
+        )
+
+    def export(self, out_path: Path, jobs: int = 1) -> list[Path]:
+        return export_stubs(
+            self.path, out_path, jobs, [a.path for a in self.assignments]
+        )
+
+    def pack(self, out_path: Path, jobs: int = 1) -> list[Path]:
+        return pack_course(
+            self.path, out_path, jobs, [a.path for a in self.assignments]
+        )
+
+    def check(self, jobs: Optional[int] = None) -> list["CheckProblem"]:
+        return check_course(self.path, jobs, [a.path for a in self.assignments])
+
+    def test(self, **options: Any) -> tuple[bool, list["TestResult"]]:
+        """Test every assignment; options are passed on to test()."""
+        return test([self.path], tasks=[a.task for a in self.assignments], **options)
+
+
+class Part:
+    """A part of a Course; get them from Course.parts or Course.part()."""
+
+    __slots__ = ("course", "path", "_assignments")
+
+    def __init__(self, course: Course, path: Path) -> None:
+        self.course = course
+        self.path = path
+        self._assignments: Optional[list[Assignment]] = None
+
+    def __repr__(self) -> str:
+        return f"Part({str(self.path)!r})"
+
+    @property
+    def name(self) -> str:
+        return self.path.name
+
+    @property
+    def assignments(self) -> list["Assignment"]:
+        if self._assignments is None:
+            self._assignments = [
+                Assignment(self, path)
+                for path in sorted(self.path.iterdir())
+                if is_valid_assignment(path)
+            ]
+        return self._assignments
+
+    def assignment(self, name: str) -> "Assignment":
+        for assignment in self.assignments:
+            if assignment.name == name:
+                return assignment
+        raise ValueError(f"{self.path / name} is not a valid TMC assignment")
+
+    def init_assignment(
+        self,
+        name: str,
+        language: Literal["fi", "en"],
+        point_names: Optional[list[str]] = None,
+        assume_yes: bool = False,
+    ) -> "Assignment":
+        create_assignment(self.path, name, language, point_names, None, assume_yes)
+        self._assignments = None
+        return self.assignment(name)
+
+    def test(self, **options: Any) -> tuple[bool, list["TestResult"]]:
+        """Test every assignment; options are passed on to test()."""
+        return test([self.path], tasks=[a.task for a in self.assignments], **options)
+
+
+class Assignment:
+    """An assignment of a Part; get them from Part.assignments or Part.assignment().
+
+    Its files and their hash are kept once read, so call refresh() after editing
+    the assignment.
+    """
+
+    __slots__ = ("part", "path", "_config", "_files", "_content_hash")
+
+    def __init__(self, part: Part, path: Path) -> None:
+        self.part = part
+        self.path = path
+        self._config: Optional[dict[str, str]] = None
+        self._files: Optional[list[Path]] = None
+        self._content_hash: Optional[str] = None
+
+    def __repr__(self) -> str:
+        return f"Assignment({str(self.path)!r})"
+
+    @property
+    def name(self) -> str:
+        return self.path.name
+
+    @property
+    def course(self) -> Course:
+        return self.part.course
+
+    @property
+    def config(self) -> dict[str, str]:
+        """The "tmc_course" section of the assignment's .tmcproject.yml."""
+        if self._config is None:
+            self._config = read_course_config(self.path)
+        return self._config
+
+    @property
+    def files(self) -> list[Path]:
+        """The files of the assignment, see assignment_files()."""
+        if self._files is None:
+            self._files = assignment_files(self.path)
+        return self._files
+
+    @property
+    def content_hash(self) -> str:
+        if self._content_hash is None:
+            self._content_hash = files_content_hash(self.path, self.files)
+        return self._content_hash
+
+    @property
+    def task(self) -> "TestTask":
+        return TestTask(self.path)
+
+    def refresh(self) -> None:
+        self._config = None
+        self._files = None
+        self._content_hash = None
+
+    def test(self, **options: Any) -> tuple[bool, list["TestResult"]]:
+        """Test the assignment; options are passed on to test()."""
+        return test([self.path], tasks=[self.task], **options)
+
+
+def update_assignment(
+    assignment_path: Path, staging: TmcPythonTesterStaging, dry_run: bool
+) -> UpdateResult:
+    try:
+        diff = create_tmc_dir(assignment_path, staging, dry_run)
+    except Exception as e:
+        logging.debug(f"Updating {assignment_path} failed", exc_info=True)
+        return UpdateResult(assignment_path, UpdateStatus.FAILED, error=str(e))
+    status = UpdateStatus.UPDATED if diff.has_changes else UpdateStatus.SKIPPED
+    return UpdateResult(assignment_path, status, diff)
+
+
+def update_course(
+    course_path: Path,
+    dry_run: bool = False,
+    jobs: int = 1,
+    assignment_paths: Optional[list[Path]] = None,
+) -> list[UpdateResult]:
+    course_path = course_path.resolve()
+    from tqdm import tqdm
+
+    if assignment_paths is None:
+        assignment_paths = list(find_assignments(course_path))
+
+    results: list[UpdateResult] = []
+    with contextlib.ExitStack() as stack:
+        logging.info(f"Updating TMC-python-tester for course {course_path}")
+        if dry_run:
+            # Compare against the new version without replacing the course's own
+            download_dir = Path(stack.enter_context(tempfile.TemporaryDirectory()))
+            tester_zip_path = download_tmc_python_tester(
+                course_path, update=True, target=download_dir / "tmc-python-tester.zip"
+            )
+        else:
+            tester_zip_path = download_tmc_python_tester(course_path, update=True)
+        staging = stack.enter_context(
+            tmc_python_tester_staging(course_path, tester_zip_path)
+        )
+        executor = stack.enter_context(ThreadPoolExecutor(max_workers=max(jobs, 1)))
+        futures = [
+            executor.submit(update_assignment, assignment_path, staging, dry_run)
+            for assignment_path in assignment_paths
+        ]
+        for future in tqdm(
+            as_completed(futures),
+            total=len(futures),
+            unit=" assg",
+            disable=not logging.getLogger().isEnabledFor(logging.INFO),
+        ):
+            result = future.result()
+            if result.status == UpdateStatus.FAILED:
+                logging.error(
+                    f"Failed to update {result.assignment_path}: {result.error}"
+                )
+            else:
+                logging.debug(f"{result.status.name}: {result.assignment_path}")
+            results.append(result)
+
+    results.sort(key=lambda result: result.assignment_path)
+    if dry_run:
+        for result in results:
+            if result.diff and result.diff.has_changes:
+                print(result.diff.format())
+
+    counts = {
+        status: sum(result.status == status for result in results)
+        for status in UpdateStatus
+    }
+    logging.info(
+        f"{counts[UpdateStatus.UPDATED]} "
+        + ("to update" if dry_run else "updated")
+        + f", {counts[UpdateStatus.SKIPPED]} up to date"
+        + f", {counts[UpdateStatus.FAILED]} failed"
+    )
+    return results
+
+
+def strip_solution(text: str) -> Optional[str]:
+    """Turn a model solution into the student's stub.
+
+    Everything between "# BEGIN SOLUTION" and "# END SOLUTION" is removed and
+    "# STUB: " is dropped from the start of stub lines. Returns None for files
+    marked with "# SOLUTION FILE", which are not given to students at all.
+    """
+    stub_lines: list[str] = []
+    in_solution = False
+    for line in text.splitlines(keepends=True):
+        stripped = line.strip()
+        if stripped.startswith("# SOLUTION FILE"):
+            return None
+        if stripped.startswith("# BEGIN SOLUTION"):
+            if in_solution:
+                raise ValueError("Nested # BEGIN SOLUTION")
+            in_solution = True
+        elif stripped.startswith("# END SOLUTION"):
+            if not in_solution:
+                raise ValueError("# END SOLUTION without # BEGIN SOLUTION")
+            in_solution = False
+        elif in_solution:
+            continue
+        elif stripped.startswith("# STUB:"):
+            indent = line[: len(line) - len(line.lstrip())]
+            stub_lines.append(indent + line.lstrip()[len("# STUB:") :].lstrip(" "))
+        else:
+            stub_lines.append(line)
+    if in_solution:
+        raise ValueError("# BEGIN SOLUTION without # END SOLUTION")
+    return "".join(stub_lines)
+
+
+@dataclass(frozen=True)
+class GitignorePattern:
+    regex: "re.Pattern[str]"
+    negated: bool
+    directory_only: bool
+
+
+def gitignore_regex(pattern: str) -> "re.Pattern[str]":
+    # Patterns without a slash match at any depth, others relative to the
+    # .gitignore file's directory
+    anchored = "/" in pattern
+    pattern = pattern.lstrip("/")
+    regex = ""
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            regex += "(?:.*/)?"
+            i += 3
+        elif pattern.startswith("**", i):
+            regex += ".*"
+            i += 2
+        elif pattern[i] == "*":
+            regex += "[^/]*"
+            i += 1
+        elif pattern[i] == "?":
+            regex += "[^/]"
+            i += 1
+        elif pattern[i] == "[":
+            end = pattern.find("]", i + 1)
+            if end == -1:
+                regex += re.escape(pattern[i])
+                i += 1
+            else:
+                regex += "[" + pattern[i + 1 : end].replace("!", "^", 1) + "]"
+                i = end + 1
+        else:
+            regex += re.escape(pattern[i])
+            i += 1
+    return re.compile(("" if anchored else "(?:.*/)?") + regex)
+
+
+def read_gitignore(gitignore_path: Path) -> list[GitignorePattern]:
+    patterns: list[GitignorePattern] = []
+    if not gitignore_path.is_file():
+        return patterns
+    for line in gitignore_path.read_text().splitlines():
+        line = line.rstrip()
+        if not line or line.startswith("#"):
+            continue
+        negated = line.startswith("!")
+        line = line.lstrip("!")
+        directory_only = line.endswith("/")
+        patterns.append(
+            GitignorePattern(gitignore_regex(line.rstrip("/")), negated, directory_only)
+        )
+    return patterns
+
+
+def is_gitignored(
+    relative_path: str, is_dir: bool, patterns: list[GitignorePattern]
+) -> bool:
+    ignored = False
+    for pattern in patterns:
+        if pattern.directory_only and not is_dir:
+            continue
+        if pattern.regex.fullmatch(relative_path):
+            ignored = not pattern.negated
+    return ignored
+
+
+def assignment_files(assignment_path: Path) -> list[Path]:
+    """List the files that make up an assignment, in a stable order.
+
+    Generated files, __pycache__ and anything ignored by the .gitignore of the
+    course or of the assignment itself are left out.
+    """
+    course_path = assignment_path.parent.parent
+    ignore_rules = [
+        (course_path, read_gitignore(course_path / ".gitignore")),
+        (assignment_path, read_gitignore(assignment_path / ".gitignore")),
+    ]
+
+    def ignored(path: Path, is_dir: bool) -> bool:
+        if path.name in GENERATED_FILE_NAMES or path.name == "__pycache__":
+            return True
+        return any(
+            is_gitignored(path.relative_to(base).as_posix(), is_dir, patterns)
+            for base, patterns in ignore_rules
+        )
+
+    files: list[Path] = []
+    for dir_path, dir_names, file_names in os.walk(assignment_path):
+        root = Path(dir_path)
+        dir_names[:] = sorted(
+            name for name in dir_names if not ignored(root / name, True)
+        )
+        files.extend(
+            root / name for name in file_names if not ignored(root / name, False)
+        )
+    return sorted(files)
+
+
+def course_files(course_path: Path) -> list[Path]:
+    """List the files at the root of a course, outside its parts, in a stable order.
+
+    Generated files, the TMC-python-tester files used to author the course and
+    anything ignored by the course's .gitignore are left out.
+    """
+    patterns = read_gitignore(course_path / ".gitignore")
+    return sorted(
+        path
+        for path in course_path.iterdir()
+        if path.is_file()
+        and path.name not in GENERATED_FILE_NAMES + COURSE_AUTHORING_FILE_NAMES
+        and not is_gitignored(path.name, False, patterns)
+    )
+
+
+def assignment_content_hash(assignment_path: Path) -> str:
+    return files_content_hash(assignment_path, assignment_files(assignment_path))
+
+
+def files_content_hash(assignment_path: Path, files: list[Path]) -> str:
+    sha256 = hashlib.sha256()
+    for path in files:
+        sha256.update(path.relative_to(assignment_path).as_posix().encode() + b"\0")
+        sha256.update(file_sha256(path).encode())
+    return sha256.hexdigest()
+
+
+def build_incrementally(
+    course_path: Path,
+    out_path: Path,
+    manifest_name: str,
+    manifest_version: int,
+    target: Callable[[Path], Path],
+    build: Callable[[Path, Path], None],
+    jobs: int = 1,
+    assignment_paths: Optional[list[Path]] = None,
+) -> list[Path]:
+    """Build target(assignment) from each assignment in the course with build.
+
+    Assignments whose contents have not changed since the previous build, as
+    recorded in a manifest in out_path, are not built again. Targets of assignments
+    that are no longer in the course are removed.
+    """
+    manifest_path = out_path / manifest_name
+    previous: dict[str, str] = {}
+    if manifest_path.exists():
+        manifest = json.loads(manifest_path.read_text())
+        if manifest.get("version") == manifest_version:
+            previous = manifest["assignments"]
+
+    def build_if_changed(assignment_path: Path) -> tuple[str, str, Optional[Path]]:
+        key = assignment_path.relative_to(course_path).as_posix()
+        content_hash = assignment_content_hash(assignment_path)
+        target_path = target(assignment_path)
+        if previous.get(key) == content_hash and target_path.exists():
+            return key, content_hash, None
+        build(assignment_path, target_path)
+        return key, content_hash, target_path
+
+    current: dict[str, str] = {}
+    built: list[Path] = []
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+        for key, content_hash, target_path in executor.map(
+            build_if_changed,
+            (
+                find_assignments(course_path)
+                if assignment_paths is None
+                else assignment_paths
+            ),
+        ):
+            current[key] = content_hash
+            if target_path:
+                logging.debug(f"Built {target_path}")
+                built.append(target_path)
+
+    for key in set(previous) - set(current):
+        stale_path = target(course_path / key)
+        logging.debug(f"Removing {stale_path}, {key} is no longer in the course")
+        if stale_path.is_dir():
+            shutil.rmtree(stale_path)
+        else:
+            stale_path.unlink(missing_ok=True)
+        # Along with its part, if that was the last of it
+        part_path = stale_path.parent
+        if part_path != out_path and part_path.is_dir():
+            if not any(part_path.iterdir()):
+                part_path.rmdir()
+
+    out_path.mkdir(parents=True, exist_ok=True)
+    manifest_path.write_text(
+        json.dumps(
+            {"version": manifest_version, "assignments": current},
+            indent=2,
+            sort_keys=True,
+        )
+    )
+    return built
+
+
+def export_assignment_stubs(assignment_path: Path, out_path: Path) -> None:
+    if out_path.exists():
+        shutil.rmtree(out_path)
+    for path in assignment_files(assignment_path):
+        destination = out_path / path.relative_to(assignment_path)
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        if path.suffix != ".py":
+            shutil.copyfile(path, destination)
+            continue
+        with path.open("r", encoding="utf-8", newline="") as fh:
+            try:
+                stub = strip_solution(fh.read())
+            except ValueError as e:
+                raise ValueError(f"{path}: {e}")
+        if stub is not None:
+            with destination.open("w", encoding="utf-8", newline="") as fh:
+                fh.write(stub)
+
+
+def export_stubs(
+    course_path: Path,
+    out_path: Path,
+    jobs: int = 1,
+    assignment_paths: Optional[list[Path]] = None,
+) -> list[Path]:
+    """Export the student version of the course to out_path: the files at its root and
+    each assignment with the solutions stripped."""
+    course_path = course_path.resolve()
+    out_path = out_path.resolve()
+    if not is_valid_course(course_path):
+        raise ValueError(f"{course_path} is not a valid TMC course")
+    logging.info(f"Exporting stubs of {course_path} to {out_path}")
+
+    exported = build_incrementally(
+        course_path,
+        out_path,
+        EXPORT_MANIFEST_NAME,
+        EXPORT_MANIFEST_VERSION,
+        lambda assignment_path: out_path / assignment_path.relative_to(course_path),
+        export_assignment_stubs,
+        jobs,
+        assignment_paths,
+    )
+    for path in course_files(course_path):
+        shutil.copyfile(path, out_path / path.name)
+    logging.info(f"Exported {len(exported)} changed assignment(s)")
+    return exported
+
+
+def pack_assignment(assignment_path: Path, zip_path: Path) -> None:
+    """Zip an assignment reproducibly: the same contents give the same bytes."""
+    zip_path.parent.mkdir(parents=True, exist_ok=True)
+    partial_path = zip_path.with_name(zip_path.name + ".part")
+    with zipfile.ZipFile(partial_path, "w") as assignment_zip:
+        for path in assignment_files(assignment_path):
+            arcname = PurePosixPath(
+                assignment_path.name, path.relative_to(assignment_path).as_posix()
+            )
+            file_info = zipfile.ZipInfo(str(arcname), date_time=(1980, 1, 1, 0, 0, 0))
+            file_info.compress_type = zipfile.ZIP_DEFLATED
+            file_info.create_system = 3  # Unix, whatever system we are packing on
+            mode = 0o755 if os.access(path, os.X_OK) and os.name != "nt" else 0o644
+            file_info.external_attr = (stat.S_IFREG | mode) << 16
+            with path.open("rb") as src, assignment_zip.open(file_info, "w") as dst:
+                shutil.copyfileobj(src, dst, DOWNLOAD_CHUNK_SIZE)
+    os.replace(partial_path, zip_path)
+
+
+def pack_course(
+    course_path: Path,
+    out_path: Path,
+    jobs: int = 1,
+    assignment_paths: Optional[list[Path]] = None,
+) -> list[Path]:
+    """Zip each assignment in the course to out_path/<part>/<assignment>.zip.
+
+    Returns the archives that were (re)written; the rest are byte-identical to what
+    their current contents would produce, and so don't need to be uploaded again.
+    """
+    course_path = course_path.resolve()
+    out_path = out_path.resolve()
+    if not is_valid_course(course_path):
+        raise ValueError(f"{course_path} is not a valid TMC course")
+    logging.info(f"Packing assignments of {course_path} to {out_path}")
+
+    packed = build_incrementally(
+        course_path,
+        out_path,
+        PACK_MANIFEST_NAME,
+        PACK_MANIFEST_VERSION,
+        lambda assignment_path: (
+            out_path / assignment_path.relative_to(course_path)
+        ).with_suffix(".zip"),
+        pack_assignment,
+        jobs,
+        assignment_paths,
+    )
+    logging.info(f"Packed {len(packed)} changed assignment(s)")
+    return packed
+
+
+@dataclass
+class SourceFacts:
+    """What check needs to know about a single file, as (line, value) pairs."""
+
+    problems: list[tuple[int, str]] = field(default_factory=list)
+    points: list[tuple[int, str]] = field(default_factory=list)
+    exercises: list[tuple[int, str]] = field(default_factory=list)
+
+    @classmethod
+    def from_dict(cls, data: dict[str, list[list[Union[int, str]]]]) -> "SourceFacts":
+        def pairs(key: str) -> list[tuple[int, str]]:
+            return [(int(line), str(value)) for line, value in data.get(key, [])]
+
+        return cls(pairs("problems"), pairs("points"), pairs("exercises"))
+
+
+@dataclass
+class CheckProblem:
+    path: Path
+    line: int
+    message: str
+
+    def format(self, relative_to: Path) -> str:
+        return f"{self.path.relative_to(relative_to)}:{self.line}: {self.message}"
+
+
+def decorator_points(decorators: list[ast.expr]) -> Optional[list[tuple[int, str]]]:
+    """Point names given with @points, or None if there is no @points."""
+    found: Optional[list[tuple[int, str]]] = None
+    for decorator in decorators:
+        if not isinstance(decorator, ast.Call):
+            continue
+        func = decorator.func
+        name = func.id if isinstance(func, ast.Name) else getattr(func, "attr", None)
+        if name != "points":
+            continue
+        found = found or []
+        found.extend(
+            (arg.lineno, arg.value)
+            for arg in decorator.args
+            if isinstance(arg, ast.Constant) and isinstance(arg.value, str)
+        )
+    return found
+
+
+def is_test_case(node: ast.ClassDef) -> bool:
+    return any(
+        (isinstance(base, ast.Name) and base.id.endswith("TestCase"))
+        or (isinstance(base, ast.Attribute) and base.attr.endswith("TestCase"))
+        for base in node.bases
+    )
+
+
+def analyze_source(kind: Literal["src", "test"], source: bytes) -> SourceFacts:
+    """Find the problems check can see from a single source or test file."""
+    facts = SourceFacts()
+    text = source.decode("utf-8", errors="replace")
+    for lineno, line in enumerate(text.splitlines(), start=1):
+        if LEFTOVER_PLACEHOLDER_PATTERN.search(line):
+            facts.problems.append((lineno, "Leftover template placeholder"))
+    try:
+        tree = ast.parse(source)
+    except SyntaxError as e:
+        facts.problems.append((e.lineno or 1, f"Syntax error: {e.msg}"))
+        return facts
+
+    if kind == "src":
+        try:
+            stub = strip_solution(text)
+        except ValueError as e:
+            facts.problems.append((1, str(e)))
+        else:
+            if stub == text and text.strip() and "# BEGIN SOLUTION" not in text:
+                facts.problems.append(
+                    (1, "No # BEGIN SOLUTION markers; students get the whole file")
+                )
+        return facts
+
+    for node in tree.body:
+        if (
+            isinstance(node, ast.Assign)
+            and any(
+                isinstance(target, ast.Name) and target.id == "exercise"
+                for target in node.targets
+            )
+            and isinstance(node.value, ast.Constant)
+            and isinstance(node.value.value, str)
+        ):
+            facts.exercises.append((node.lineno, node.value.value))
+    for class_node in ast.walk(tree):
+        if not isinstance(class_node, ast.ClassDef) or not is_test_case(class_node):
+            continue
+        class_points = decorator_points(class_node.decorator_list)
+        facts.points.extend(class_points or [])
+        unpointed = False
+        for member in class_node.body:
+            if not isinstance(member, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                continue
+            method_points = decorator_points(member.decorator_list)
+            facts.points.extend(method_points or [])
+            if member.name.startswith("test") and method_points is None:
+                unpointed = True
+        if class_points is None and unpointed:
+            facts.problems.append(
+                (class_node.lineno, f"Test class {class_node.name} has no @points")
+            )
+    return facts
+
+
+def module_exists(assignment_path: Path, module: str) -> bool:
+    module_path = assignment_path.joinpath(*module.split("."))
+    return (
+        module_path.with_suffix(".py").is_file()
+        or (module_path / "__init__.py").is_file()
+    )
+
+
+def check_course(
+    course_path: Path,
+    jobs: Optional[int] = None,
+    assignment_paths: Optional[list[Path]] = None,
+) -> list[CheckProblem]:
+    """Statically check the assignments of a course for common mistakes.
+
+    Files are analyzed in a process pool, and the results cached by content so that
+    only changed files are parsed again.
+    """
+    course_path = course_path.resolve()
+    if not is_valid_course(course_path):
+        raise ValueError(f"{course_path} is not a valid TMC course")
+    logging.info(f"Checking {course_path}")
+
+    files: list[tuple[Path, Path, Literal["src", "test"], str, bytes]] = []
+    if assignment_paths is None:
+        assignment_paths = list(find_assignments(course_path))
+    for assignment_path in assignment_paths:
+        for kind in ("src", "test"):
+            for path in sorted((assignment_path / kind).rglob("*.py")):
+                source = path.read_bytes()
+                key = f"{kind}:{hashlib.sha256(source).hexdigest()}"
+                files.append((assignment_path, path, kind, key, source))
+
+    cache_path = course_path / COURSE_STATE_DIR_NAME / CHECK_CACHE_NAME
+    cache: dict[str, SourceFacts] = {}
+    if cache_path.is_file():
+        cached = json.loads(cache_path.read_text())
+        if cached.get("version") == CHECK_CACHE_VERSION:
+            cache = {
+                key: SourceFacts.from_dict(facts)
+                for key, facts in cached["files"].items()
+            }
+
+    missing = {
+        key: (kind, source) for _, _, kind, key, source in files if key not in cache
+    }
+    logging.debug(f"Analyzing {len(missing)} of {len(files)} file(s)")
+    jobs = jobs or os.cpu_count() or 1
+    if len(missing) >= PROCESS_POOL_MIN_FILES and jobs > 1:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            analyzed = executor.map(
+                analyze_source,
+                [kind for kind, _ in missing.values()],
+                [source for _, source in missing.values()],
+                chunksize=max(1, len(missing) // (jobs * 4)),
+            )
+            cache.update(zip(missing, analyzed))
+    else:
+        cache.update(
+            (key, analyze_source(kind, source))
+            for key, (kind, source) in missing.items()
+        )
+
+    problems: list[CheckProblem] = []
+    point_owners: dict[str, Path] = {}
+    for assignment_path in dict.fromkeys(file[0] for file in files):
+        if not (assignment_path / "src" / "__init__.py").is_file():
+            problems.append(
+                CheckProblem(assignment_path / "src", 0, "Missing __init__.py")
+            )
+    for assignment_path, path, _, key, _ in files:
+        facts = cache[key]
+        problems.extend(CheckProblem(path, line, msg) for line, msg in facts.problems)
+        for line, module in facts.exercises:
+            if not module_exists(assignment_path, module):
+                problems.append(
+                    CheckProblem(path, line, f"Exercise module {module} not found")
+                )
+        for line, point in facts.points:
+            owner = point_owners.setdefault(point, assignment_path)
+            if owner != assignment_path:
+                problems.append(
+                    CheckProblem(
+                        path,
+                        line,
+                        f"Point {point} is also awarded in "
+                        f"{owner.relative_to(course_path)}",
+                    )
+                )
+
+    used = {file[3] for file in files}
+    if missing or set(cache) != used:
+        course_state_dir(course_path)
+        cache_path.write_text(
+            json.dumps(
+                {
+                    "version": CHECK_CACHE_VERSION,
+                    "files": {
+                        key: asdict(facts)
+                        for key, facts in cache.items()
+                        if key in used
+                    },
+                },
+                sort_keys=True,
+            )
+        )
+    return sorted(problems, key=lambda problem: (problem.path, problem.line))
+
+
+@dataclass
+class TestTask:
+    path: Path
+
+    @property
+    def course_path(self) -> Path:
+        return self.path.parent.parent
+
+    @property
+    def part_path(self) -> Path:
+        return self.path.parent
+
+    @property
+    def is_archive(self) -> bool:
+        return self.path.suffix.casefold() == ".zip"
+
+
+@dataclass
+class TestOutcome:
+    name: str
+    passed: bool
+    message: str = ""
+    points: list[str] = field(default_factory=list)
+
+
+@dataclass
+class TestResult:
+    task: TestTask
+    success: bool
+    stdout: str
+    stderr: str
+    returncode: Optional[int] = None
+    duration: float = 0.0
+    cpu_time: float = 0.0
+    max_rss: int = 0
+    outcomes: list[TestOutcome] = field(default_factory=list)
+    # Name of the resource limit the tests ran into, if any
+    limit_exceeded: Optional[str] = None
+    # Whether the result is from an earlier run of identical inputs
+    cached: bool = False
+
+    def to_dict(self, root: Path) -> dict[str, Any]:
+        """JSON-serializable form, with the assignment path relative to root."""
+        data: dict[str, Any] = {
+            f.name: getattr(self, f.name) for f in fields(self) if f.name != "task"
+        }
+        data["path"] = self.task.path.relative_to(root).as_posix()
+        data["outcomes"] = [asdict(outcome) for outcome in self.outcomes]
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any], root: Path) -> "TestResult":
+        data = dict(data)
+        task = TestTask(root / data.pop("path"))
+        outcomes = [TestOutcome(**outcome) for outcome in data.pop("outcomes")]
+        return cls(task=task, outcomes=outcomes, **data)
+
+
+class EventStream:
+    """Writes the progress of a test run as newline-delimited JSON events.
+
+    Without a stream, events are simply discarded.
+    """
+
+    def __init__(self, stream: Optional[TextIO] = None) -> None:
+        self.stream = stream
+        self.lock = threading.Lock()
+
+    def emit(self, event: str, **fields: object) -> None:
+        if self.stream is None:
+            return
+        line = json.dumps({"event": event, "time": time.time(), **fields})
+        with self.lock:
+            self.stream.write(f"{line}\n")
+            self.stream.flush()
+
+
+def collect_tasks(paths: list[Path]) -> Generator[TestTask, None, None]:
+    paths = [p.resolve() for p in paths]
+    for path in paths:
+        if is_valid_assignment(path):
+            logging.debug(f"{path} is assignment")
+            yield TestTask(path)
+        elif path.suffix.casefold() == ".zip" and archive_assignment_root(path):
+            logging.debug(f"{path} is an assignment archive")
+            yield TestTask(path)
+        elif is_valid_part(path):
+            logging.debug(f"{path} appears to be a part")
+            yield from collect_tasks(
+                list(child for child in path.iterdir() if child.is_dir())
+            )
+        elif is_valid_course(path):
+            logging.debug(f"{path} appears to be a course")
+            yield from collect_tasks(
+                list(child for child in path.iterdir() if child.is_dir())
+            )
+        elif assignment_path := owning_assignment(
+            path if path.is_dir() else path.parent
+        ):
+            logging.debug(f"{path} belongs to assignment {assignment_path}")
+            yield TestTask(assignment_path)
+        else:
+            logging.debug(
+                f"{path} is neither an assignment, a part, or a course, "
+                "nor inside an assignment"
+            )
+
+
+def archive_assignment_root(archive_path: Path) -> Optional[PurePosixPath]:
+    """The directory of the assignment in a zip, or None if it isn't an assignment
+    archive (e.g. tmc-python-tester.zip)."""
+    if not zipfile.is_zipfile(archive_path):
+        return None
+    with zipfile.ZipFile(archive_path) as archive_zip:
+        names = {PurePosixPath(name) for name in archive_zip.namelist()}
+    roots = sorted(
+        (name.parent for name in names if name.name == ".tmcproject.yml"),
+        key=lambda root: len(root.parts),
+    )
+    for root in roots:
+        if any(root / "tmc" in name.parents for name in names):
+            return root
+    return None
+
+
+def course_state_dir(course_path: Path) -> Path:
+    """The state directory of the course, created if necessary.
+
+    It ignores itself, as courses created before it existed don't list it in their
+    .gitignore.
+    """
+    state_path = course_path / COURSE_STATE_DIR_NAME
+    gitignore_path = state_path / ".gitignore"
+    if not gitignore_path.exists():
+        state_path.mkdir(parents=True, exist_ok=True)
+        gitignore_path.write_text("*\n")
+    return state_path
+
+
+@functools.lru_cache(maxsize=OWNING_ASSIGNMENT_CACHE_SIZE)
+def owning_assignment(directory: Path) -> Optional[Path]:
+    """The assignment directory is in, if any.
+
+    Looks no further up than the course root, the first directory above with a
+    .tmcproject.yml that isn't an assignment. Cached, so that mapping many files of
+    the same assignments (e.g. the files of a commit) to their assignments only
+    checks each directory once.
+    """
+    if is_valid_assignment(directory):
+        return directory
+    if directory.parent == directory or (directory / ".tmcproject.yml").exists():
+        return None
+    return owning_assignment(directory.parent)
+
+
+def test_result_sort_key(result: TestResult) -> tuple[str, str, str, str, str]:
+    task = result.task
+    return (
+        task.course_path.name,
+        str(task.course_path),
+        task.part_path.name,
+        str(task.part_path),
+        task.path.name,
+    )
+
+
+def render_test_output(
+    results: list[TestResult], summary: bool = False
+) -> Generator[str, None, None]:
+    """Render results as a course/part/assignment tree in a single pass.
+
+    In summary mode, parts where every assignment passed are collapsed into a
+    single line.
+    """
+    yield "Test Results"
+    courses = [
+        (course_path, list(course_results))
+        for course_path, course_results in itertools.groupby(
+            sorted(results, key=test_result_sort_key),
+            key=lambda result: result.task.course_path,
+        )
+    ]
+    for course_idx, (course_path, course_results) in enumerate(courses):
+        last_course = course_idx == len(courses) - 1
+        yield f"{TREE_LAST if last_course else TREE_BRANCH}{course_path.name}"
+        course_indent = TREE_SPACE if last_course else TREE_PIPE
+
+        parts = [
+            (part_path, list(part_results))
+            for part_path, part_results in itertools.groupby(
+                course_results, key=lambda result: result.task.part_path
+            )
+        ]
+        for part_idx, (part_path, part_results) in enumerate(parts):
+            last_part = part_idx == len(parts) - 1
+            part_prefix = course_indent + (TREE_LAST if last_part else TREE_BRANCH)
+            if summary and all(result.success for result in part_results):
+                yield (
+                    f"{part_prefix}{part_path.name} - {TEST_SUCCESS_AFFIX} "
+                    f"({len(part_results)} assignments)"
+                )
+                continue
+            yield f"{part_prefix}{part_path.name}"
+            part_indent = course_indent + (TREE_SPACE if last_part else TREE_PIPE)
+
+            for result_idx, result in enumerate(part_results):
+                last_result = result_idx == len(part_results) - 1
+                if result.limit_exceeded:
+                    affix = f"{TEST_LIMIT_AFFIX} ({result.limit_exceeded})"
+                elif result.success:
+                    affix = TEST_SUCCESS_AFFIX
+                else:
+                    affix = TEST_FAIL_AFFIX
+                if result.cached:
+                    affix += " (cached)"
+                yield (
+                    f"{part_indent}{TREE_LAST if last_result else TREE_BRANCH}"
+                    f"{result.task.path.name} - {affix}"
+                )
+
+
+def log_test_details(results: list[TestResult], detailed: bool = False) -> None:
+    for result in results:
+        if detailed or not result.success:
+            logging.info("")
+            logging.info(f"\nTEST RESULTS FOR {result.task.path}:")
+            tabbed_stderr = "\n".join(
+                "\t" + line for line in result.stderr.splitlines()
+            )
+            logging.info(tabbed_stderr)
+    logging.info("\n")
+
+
+def print_test_output(results: list[TestResult], summary: bool = False) -> None:
+    sys.stdout.writelines(
+        f"{line}\n" for line in render_test_output(results, summary=summary)
+    )
+
+
+def emit_assignment_finished(
+    events: EventStream, result: TestResult, **extra: object
+) -> None:
+    events.emit(
+        "assignment_finished",
+        path=str(result.task.path),
+        success=result.success,
+        returncode=result.returncode,
+        duration=result.duration,
+        cpu_time=result.cpu_time,
+        max_rss=result.max_rss,
+        limit_exceeded=result.limit_exceeded,
+        cached=result.cached,
+        tests=[asdict(outcome) for outcome in result.outcomes],
+        **extra,
+    )
+
+
+def test(
+    paths: list[Path],
+    detailed: bool = False,
+    summary: bool = False,
+    events: Optional[EventStream] = None,
+    history: bool = False,
+    test_timeout: Optional[float] = None,
+    scratch: bool = False,
+    jobs: int = 1,
+    precompile_sources: bool = False,
+    serve_address: Optional[str] = None,
+    root: Optional[Path] = None,
+    result_cache: Optional["ResultCache"] = None,
+    tasks: Optional[list[TestTask]] = None,
+    task_timeout: float = WORKER_TASK_TIMEOUT,
+) -> tuple[bool, list[TestResult]]:
+    """Test the assignments in paths, or just the given tasks from them.
+
+    With serve_address, the tests are run by workers connecting to that address
+    (see serve_work, which task_timeout is passed to) instead of locally. With
+    result_cache, assignments whose results are cached aren't run at all.
+    """
+    from tqdm import tqdm
+
+    events = events or EventStream()
+    started_at = time.time()
+    start = time.monotonic()
+    paths = [p.resolve() for p in paths]
+    logging.debug("Collecting assignments")
+    events.emit("collection_started", paths=[str(path) for path in paths])
+    owning_assignment.cache_clear()
+    # Files of the same assignment, or overlapping paths, would otherwise test it twice
+    tasks = list(
+        {
+            task.path: task
+            for task in (collect_tasks(paths) if tasks is None else tasks)
+        }.values()
+    )
+    events.emit("collection_finished", assignments=len(tasks))
+    for task in tasks:
+        events.emit("assignment_queued", path=str(task.path))
+
+    cache_keys: dict[Path, str] = {}
+    cached: dict[Path, TestResult] = {}
+    if result_cache:
+        cache = result_cache
+
+        def lookup(task: TestTask) -> tuple[Optional[str], Optional[TestResult]]:
+            if task.is_archive:
+                return None, None
+            key = result_cache_key(task, test_timeout)
+            return key, cache.get(task, key)
+
+        logging.debug("Looking up cached results")
+        with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+            for task, (key, result) in zip(tasks, executor.map(lookup, tasks)):
+                if key:
+                    cache_keys[task.path] = key
+                if result:
+                    cached[task.path] = result
+                    emit_assignment_finished(events, result)
+        logging.debug(f"Found cached results for {len(cached)} assignment(s)")
+    all_tasks, tasks = tasks, [task for task in tasks if task.path not in cached]
+
+    precompiled: dict[Path, Precompiled] = {}
+    if serve_address:
+        # The workers run against their own checkouts
+        precompile_sources = False
+    if precompile_sources and os.environ.get("PYTHONDONTWRITEBYTECODE"):
+        # The runs couldn't cache the standard library under the prefix either, and
+        # would compile it again every time
+        logging.debug("PYTHONDONTWRITEBYTECODE is set; not precompiling")
+    elif precompile_sources:
+        by_course: dict[Path, list[Path]] = {}
+        for task in tasks:
+            if not task.is_archive:
+                by_course.setdefault(task.course_path, []).append(task.path)
+        for course_path, assignment_paths in by_course.items():
+            logging.debug(f"Precompiling {len(assignment_paths)} assignment(s)")
+            precompiled[course_path] = precompile(course_path, assignment_paths)
+            for path, error in precompiled[course_path].errors.items():
+                logging.warning(f"Syntax error in {path}, {error}")
+                events.emit("syntax_error", path=str(path), message=error)
+
+    def run(task: TestTask) -> TestResult:
+        events.emit("assignment_started", path=str(task.path))
+        result = run_test_task(
+            task, test_timeout, scratch, precompiled.get(task.course_path)
+        )
+        emit_assignment_finished(events, result)
+        return result
+
+    if serve_address:
+        results = serve_work(
+            tasks, serve_address, root or Path.cwd(), events, test_timeout, task_timeout
+        )
+    else:
+        logging.debug("Running tests")
+        with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+            futures = [executor.submit(run, task) for task in tasks]
+            for future in tqdm(
+                as_completed(futures),
+                total=len(futures),
+                unit=" assg",
+                disable=not logging.getLogger().isEnabledFor(logging.INFO),
+            ):
+                future.result()
+        results = [future.result() for future in futures]
+
+    if result_cache:
+        for result in results:
+            key = cache_keys.get(result.task.path)
+            # Whether a limit is hit depends on the machine, not just the inputs
+            if key and not result.limit_exceeded:
+                result_cache.put(result.task, key, result)
+        ran = {result.task.path: result for result in results}
+        results = [cached.get(task.path) or ran[task.path] for task in all_tasks]
+
+    return report_test_results(
+        results,
+        paths,
+        started_at,
+        time.monotonic() - start,
+        detailed,
+        summary,
+        events,
+        history,
+    )
+
+
+def report_test_results(
+    results: list[TestResult],
+    paths: list[Path],
+    started_at: float,
+    duration: float,
+    detailed: bool = False,
+    summary: bool = False,
+    events: Optional[EventStream] = None,
+    history: bool = False,
+) -> tuple[bool, list[TestResult]]:
+    """Log, print and record the results of a test run, as the end of test()."""
+    events = events or EventStream()
+    log_test_details(results, detailed)
+
+    all_passed = all(result.success for result in results)
+    passed = sum(result.success for result in results)
+    events.emit(
+        "run_finished",
+        success=all_passed,
+        passed=passed,
+        failed=len(results) - passed,
+        total=len(results),
+        duration=duration,
+    )
+    if history:
+        record_history(results, paths, started_at, duration)
+    # Don't mix the tree into an event stream written to stdout
+    if (
+        logging.getLogger().isEnabledFor(logging.INFO) or detailed
+    ) and events.stream is not sys.stdout:
+        print_test_output(results, summary=summary)
+    if all_passed:
+        logging.info("\x1b[32;1mALL TEST PASSED\x1b[0m")
+    else:
+        logging.warning("\x1b[31;1mSOME TESTS FAILED\x1b[0m")
+
+    return all_passed, results
+
+
+def parse_address(address: str) -> tuple[socket.AddressFamily, Any]:
+    """Parse a "HOST:PORT" or "unix:PATH" address into a family and socket address."""
+    if address.startswith("unix:"):
+        if not hasattr(socket, "AF_UNIX"):  # pragma: no cover (Windows)
+            raise ValueError("Unix sockets aren't available on this platform")
+        return socket.AF_UNIX, address[len("unix:") :]
+    host, _, port = address.rpartition(":")
+    if not port.isdigit():
+        raise ValueError(f"Invalid address {address}, expected HOST:PORT or unix:PATH")
+    return socket.AF_INET, (host, int(port))
+
+
+def send_message(stream: io.BufferedIOBase, message: dict[str, Any]) -> None:
+    stream.write(json.dumps(message).encode("utf-8") + b"\n")
+    stream.flush()
+
+
+def receive_message(stream: io.BufferedIOBase) -> Optional[dict[str, Any]]:
+    """The next message from stream, or None if the other end went away."""
+    try:
+        line = stream.readline()
+    except OSError:
+        return None
+    if not line:
+        return None
+    return cast(dict[str, Any], json.loads(line))
+
+
+class WorkQueue:
+    """Hands the tasks of a test run out to workers and collects their results.
+
+    Workers pull one task at a time, and stop the tests of an assignment after
+    task_timeout. The task of a worker that disconnects, sends something other than a
+    result or doesn't report back in time is put back into the queue for the next
+    worker, until it has been handed out WORKER_TASK_ATTEMPTS times.
+    """
+
+    def __init__(
+        self,
+        tasks: list[TestTask],
+        root: Path,
+        events: EventStream,
+        test_timeout: Optional[float] = None,
+        task_timeout: float = WORKER_TASK_TIMEOUT,
+    ) -> None:
+        self.tasks = tasks
+        self.root = root
+        self.events = events
+        self.test_timeout = test_timeout
+        self.task_timeout = task_timeout
+        self.pending = collections.deque(range(len(tasks)))
+        self.attempts: collections.Counter[int] = collections.Counter()
+        self.results: dict[int, TestResult] = {}
+        self.condition = threading.Condition()
+
+    @property
+    def finished(self) -> bool:
+        return len(self.results) == len(self.tasks)
+
+    def take(self) -> Optional[int]:
+        """Index of the next task to run, or None once every task has a result.
+
+        Blocks while the remaining tasks are running elsewhere, as they may yet be
+        requeued.
+        """
+        with self.condition:
+            while not self.pending and not self.finished:
+                self.condition.wait()
+            if self.finished:
+                return None
+            task_id = self.pending.popleft()
+            self.attempts[task_id] += 1
+            return task_id
+
+    def complete(self, task_id: int, result: TestResult) -> None:
+        with self.condition:
+            self.results[task_id] = result
+            self.condition.notify_all()
+
+    def requeue(self, task_id: int, reason: str) -> None:
+        """Put a task back for the next worker, or fail it if it's out of attempts."""
+        task = self.tasks[task_id]
+        with self.condition:
+            attempts = self.attempts[task_id]
+            if attempts < WORKER_TASK_ATTEMPTS:
+                logging.warning(f"{reason}, requeuing {task.path}")
+                self.events.emit("assignment_requeued", path=str(task.path))
+                self.pending.appendleft(task_id)
+                self.condition.notify_all()
+                return
+        logging.warning(f"{reason}, giving up on {task.path}")
+        result = TestResult(
+            task, False, "", f"{reason}; gave up after {attempts} attempts"
+        )
+        emit_assignment_finished(self.events, result)
+        self.complete(task_id, result)
+
+    def wait(self) -> list[TestResult]:
+        with self.condition:
+            while not self.finished:
+                self.condition.wait()
+            return [self.results[task_id] for task_id in range(len(self.tasks))]
+
+    def serve(self, rfile: io.BufferedIOBase, wfile: io.BufferedIOBase) -> None:
+        """Feed tasks to a single connected worker until the run is finished.
+
+        The worker's socket should time out a while after task_timeout, giving the
+        worker time to report the tests it stopped.
+        """
+        hello = receive_message(rfile)
+        if hello is None:
+            return
+        worker = str(hello.get("worker"))
+        logging.debug(f"Worker {worker} connected")
+        while (task_id := self.take()) is not None:
+            task = self.tasks[task_id]
+            self.events.emit("assignment_started", path=str(task.path), worker=worker)
+            try:
+                send_message(
+                    wfile,
+                    {
+                        "type": "task",
+                        "id": task_id,
+                        "path": task.path.relative_to(self.root).as_posix(),
+                        "test_timeout": self.test_timeout,
+                        "task_timeout": self.task_timeout,
+                    },
+                )
+                message = receive_message(rfile)
+                if message is None:
+                    raise ConnectionError("went away or timed out")
+                result = replace(
+                    TestResult.from_dict(message["result"], self.root), task=task
+                )
+            except Exception as e:
+                # Whatever went wrong, the task must not be left hanging
+                self.requeue(task_id, f"Worker {worker} failed ({e})")
+                return
+            emit_assignment_finished(self.events, result, worker=worker)
+            self.complete(task_id, result)
+        with contextlib.suppress(OSError):
+            send_message(wfile, {"type": "done"})
+
+
+def serve_work(
+    tasks: list[TestTask],
+    address: str,
+    root: Path,
+    events: Optional[EventStream] = None,
+    test_timeout: Optional[float] = None,
+    task_timeout: float = WORKER_TASK_TIMEOUT,
+) -> list[TestResult]:
+    """Run tasks on the workers that connect to address, returning their results.
+
+    The workers resolve the assignments against their own checkout of root, so the
+    assignments must be under it. Workers stop tests that run longer than
+    task_timeout seconds; one that doesn't report a result even WORKER_REPORT_GRACE
+    seconds later is dropped, and the assignment handed to another worker.
+    """
+    import socketserver
+
+    root = root.resolve()
+    for task in tasks:
+        if not task.path.is_relative_to(root):
+            raise ValueError(f"{task.path} is not under {root}")
+    queue = WorkQueue(tasks, root, events or EventStream(), test_timeout, task_timeout)
+    if not tasks:
+        return []
+
+    class Handler(socketserver.StreamRequestHandler):
+        timeout = task_timeout + WORKER_REPORT_GRACE
+
+        def handle(self) -> None:
+            queue.serve(self.rfile, self.wfile)
+
+    family, server_address = parse_address(address)
+    server: socketserver.TCPServer
+    if family == socket.AF_UNIX:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(server_address)
+        server = socketserver.ThreadingUnixStreamServer(server_address, Handler)
+    else:
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        server = socketserver.ThreadingTCPServer(server_address, Handler)
+    server.daemon_threads = True
+    logging.info(f"Waiting for workers on {address} to test {len(tasks)} assignments")
+    with server:
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            return queue.wait()
+        finally:
+            server.shutdown()
+            if family == socket.AF_UNIX:
+                with contextlib.suppress(FileNotFoundError):
+                    os.unlink(server_address)
+
+
+def connect(address: str, timeout: float) -> socket.socket:
+    """Connect to address, retrying until timeout in case it's not listening yet."""
+    family, server_address = parse_address(address)
+    if family == socket.AF_INET:
+        host, port = server_address
+        server_address = (host or "localhost", port)
+    deadline = time.monotonic() + timeout
+    while True:
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        try:
+            sock.connect(server_address)
+            return sock
+        except OSError:
+            sock.close()
+            if time.monotonic() >= deadline:
+                raise
+            time.sleep(0.1)
+
+
+def work(
+    address: str, root: Path, scratch: bool = False, connect_timeout: float = 30.0
+) -> int:
+    """Run the tasks handed out by the coordinator at address until it's done.
+
+    Returns the number of assignments tested. Assignments outside root are reported
+    as failed without testing them.
+    """
+    root = root.resolve()
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    tested = 0
+    with connect(address, connect_timeout) as sock:
+        with sock.makefile("rb") as rfile, sock.makefile("wb") as wfile:
+            send_message(wfile, {"type": "hello", "worker": worker})
+            while (message := receive_message(rfile)) and message["type"] == "task":
+                assignment_path = (root / message["path"]).resolve()
+                # Reported under the path it was asked for, which is relative to root
+                task = TestTask(root / message["path"])
+                logging.info(f"Testing {task.path}")
+                try:
+                    if not assignment_path.is_relative_to(root):
+                        raise ValueError(
+                            f"Refusing to test {assignment_path} outside {root}"
+                        )
+                    result = run_test_task(
+                        TestTask(assignment_path),
+                        message.get("test_timeout"),
+                        scratch,
+                        deadline=message.get("task_timeout"),
+                    )
+                except ValueError as e:
+                    result = TestResult(task, False, "", str(e))
+                try:
+                    send_message(
+                        wfile,
+                        {
+                            "type": "result",
+                            "id": message["id"],
+                            "result": replace(result, task=task).to_dict(root),
+                        },
+                    )
+                except OSError as e:
+                    logging.warning(f"Couldn't report the result of {task.path}: {e}")
+                    break
+                tested += 1
+    return tested
+
+
+def result_cache_key(task: TestTask, test_timeout: Optional[float] = None) -> str:
+    """Hash everything the result of testing an assignment depends on.
+
+    That is the contents of the assignment, including its copy of
+    TMC-python-tester, the Python the tests are run with, the resource limits and
+    the test timeout.
+    """
+    limits = ResourceLimits.from_config(read_course_config(task.course_path)).override(
+        ResourceLimits.from_config(read_course_config(task.path))
+    )
+    inputs = {
+        "version": RESULT_CACHE_VERSION,
+        "assignment": assignment_content_hash(task.path),
+        "python": tmc_runner_sys_info("version"),
+        "platform": tmc_runner_sys_info("platform"),
+        "limits": asdict(limits),
+        "test_timeout": test_timeout,
+    }
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+
+class DirectoryResultStore:
+    """Cached test results as files in a directory, which may be shared."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            return (self.path / f"{key}.json").read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, data: bytes) -> None:
+        self.path.mkdir(parents=True, exist_ok=True)
+        # Renamed into place, so that other machines and threads never read a
+        # partial file
+        partial_path = self.path / (
+            f"{key}.{socket.gethostname()}-{os.getpid()}-{threading.get_ident()}.part"
+        )
+        partial_path.write_bytes(data)
+        os.replace(partial_path, self.path / f"{key}.json")
+
+
+class HTTPResultStore:
+    """Cached test results on an HTTP server, read with GET and written with PUT
+    to {url}/{key}.json.
+
+    The cache is only an optimization, so errors are logged instead of raised.
+    """
+
+    def __init__(self, url: str) -> None:
+        self.url = url.rstrip("/")
+
+    def get(self, key: str) -> Optional[bytes]:
+        import requests
+
+        try:
+            response = requests.get(
+                f"{self.url}/{key}.json", timeout=REMOTE_RESULT_CACHE_TIMEOUT
+            )
+            if response.status_code == 404:
+                return None
+            response.raise_for_status()
+        except requests.RequestException as e:
+            logging.warning(f"Couldn't read from the remote result cache: {e}")
+            return None
+        return response.content
+
+    def put(self, key: str, data: bytes) -> None:
+        import requests
+
+        try:
+            requests.put(
+                f"{self.url}/{key}.json",
+                data=data,
+                headers={"Content-Type": "application/json"},
+                timeout=REMOTE_RESULT_CACHE_TIMEOUT,
+            ).raise_for_status()
+        except requests.RequestException as e:
+            logging.warning(f"Couldn't write to the remote result cache: {e}")
+
+
+ResultStore = Union[DirectoryResultStore, HTTPResultStore]
+
+
+def result_store(location: str) -> ResultStore:
+    """An HTTP(S) URL or a directory to keep cached results in."""
+    if urlparse(location).scheme in ("http", "https"):
+        return HTTPResultStore(location)
+    return DirectoryResultStore(Path(location))
+
+
+class ResultCache:
+    """Test results by result_cache_key.
+
+    Results are kept in the state directory of each course and, optionally, in a
+    remote store shared with other machines. Results found remotely are copied into
+    the course.
+    """
+
+    def __init__(self, remote: Optional[ResultStore] = None) -> None:
+        self.remote = remote
+
+    @staticmethod
+    def local(task: TestTask) -> DirectoryResultStore:
+        return DirectoryResultStore(
+            task.course_path / COURSE_STATE_DIR_NAME / RESULT_CACHE_DIR_NAME
+        )
+
+    def get(self, task: TestTask, key: str) -> Optional[TestResult]:
+        data = self.local(task).get(key)
+        if data is None and self.remote:
+            data = self.remote.get(key)
+            if data is not None:
+                self.local(task).put(key, data)
+        if data is None:
+            return None
+        try:
+            result = TestResult.from_dict(json.loads(data), task.path)
+        except (ValueError, KeyError, TypeError) as e:
+            logging.debug(f"Ignoring unreadable cached result {key}: {e}")
+            return None
+        result.cached = True
+        return result
+
+    def put(self, task: TestTask, key: str, result: TestResult) -> None:
+        data = json.dumps(result.to_dict(task.path)).encode("utf-8")
+        course_state_dir(task.course_path)
+        self.local(task).put(key, data)
+        if self.remote:
+            self.remote.put(key, data)
+
+
+class RunnerPool:
+    """Python processes started ahead of time to run tests in, saving the start-up.
+
+    Each process runs the tests of a single assignment, as the test modules it
+    imports can't be unloaded, and is replaced as soon as it's taken.
+    """
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self.idle: collections.deque[subprocess.Popen[str]] = collections.deque()
+        self.lock = threading.Lock()
+        self.fill()
+
+    @staticmethod
+    def start() -> "subprocess.Popen[str]":
+        return subprocess.Popen(
+            ["python3", "-c", RUNNER_POOL_BOOTSTRAP],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+
+    def fill(self) -> None:
+        with self.lock:
+            while len(self.idle) < self.size:
+                self.idle.append(self.start())
+
+    def take(self) -> "subprocess.Popen[str]":
+        with self.lock:
+            process = None
+            while self.idle and process is None:
+                process = self.idle.popleft()
+                if process.poll() is not None:
+                    wait_for_process(process)
+                    process = None
+        self.fill()
+        return process or self.start()
+
+    def run(
+        self,
+        task: TestTask,
+        assignment_path: Path,
+        test_timeout: Optional[float] = None,
+    ) -> TestResult:
+        """Like run_tests, but in a process from the pool."""
+        limits = prepare_test_run(task, assignment_path)
+        start = time.monotonic()
+        process = self.take()
+        assert process.stdin is not None
+        request = {
+            "path": str(assignment_path),
+            "rlimits": limits.settings(),
+            "argv": ["-c", str(test_timeout)] if test_timeout else ["-c"],
+            "code": TEST_TIMEOUT_BOOTSTRAP if test_timeout else TMC_RUNNER_CODE,
+        }
+        process.stdin.write(json.dumps(request) + "\n")
+        process.stdin.close()
+        result = wait_for_process(process)
+        return finish_test_run(
+            task,
+            assignment_path,
+            result,
+            time.monotonic() - start,
+            limits,
+            test_timeout,
+        )
+
+    def close(self) -> None:
+        with self.lock:
+            while self.idle:
+                process = self.idle.popleft()
+                process.kill()
+                wait_for_process(process)
+
+
+def daemon_socket_path(course_path: Path) -> Path:
+    return course_path / COURSE_STATE_DIR_NAME / DAEMON_SOCKET_NAME
+
+
+class TestDaemon:
+    """Tests assignments of a course on request, keeping everything it can between
+    requests: the course index, the results and a pool of runner processes.
+
+    When a request asks for it, unchanged assignments are answered from the result
+    cache. The rest are run in the already started processes of the pool.
+    """
+
+    def __init__(self, course: Course, runners: int = 2) -> None:
+        self.course = course
+        self.pool = RunnerPool(runners)
+        self.result_cache = ResultCache()
+        # The cache key and result of the latest run of each assignment
+        self.results: dict[Path, tuple[str, TestResult]] = {}
+        self.index_lock = threading.Lock()
+        self.index_mtimes = self.directory_mtimes()
+
+    def directory_mtimes(self) -> dict[Path, int]:
+        """Modification times of the directories that list the parts and assignments,
+        which change when those are added or removed."""
+        return {
+            path: path.stat().st_mtime_ns
+            for path in [self.course.path] + [part.path for part in self.course.parts]
+        }
+
+    def collect_tasks(self, paths: list[Path]) -> list[TestTask]:
+        with self.index_lock:
+            try:
+                changed = self.directory_mtimes() != self.index_mtimes
+            except FileNotFoundError:
+                changed = True
+            if changed:
+                logging.debug(f"{self.course.path} has changed, indexing it again")
+                self.course.refresh()
+                self.index_mtimes = self.directory_mtimes()
+            parts = {part.path: part for part in self.course.parts}
+            assignments = {a.path: a for a in self.course.assignments}
+
+        tasks: list[TestTask] = []
+        for path in paths:
+            if path == self.course.path:
+                tasks.extend(a.task for a in assignments.values())
+            elif path in parts:
+                tasks.extend(a.task for a in parts[path].assignments)
+            elif path in assignments:
+                tasks.append(assignments[path].task)
+            else:
+                tasks.extend(collect_tasks([path]))
+        return list({task.path: task for task in tasks}.values())
+
+    def run(
+        self, task: TestTask, test_timeout: Optional[float] = None, cache: bool = False
+    ) -> TestResult:
+        if task.is_archive:
+            return run_test_task(task, test_timeout)
+        if not cache:
+            return self.pool.run(task, task.path, test_timeout)
+        key = result_cache_key(task, test_timeout)
+        latest_key, latest = self.results.get(task.path, (None, None))
+        cached = latest if latest_key == key else self.result_cache.get(task, key)
+        if cached:
+            self.results[task.path] = (key, cached)
+            return replace(cached, task=task, cached=True)
+        result = self.pool.run(task, task.path, test_timeout)
+        if not result.limit_exceeded:
+            self.results[task.path] = (key, result)
+            self.result_cache.put(task, key, result)
+        return result
+
+    def serve(self, rfile: io.BufferedIOBase, wfile: io.BufferedIOBase) -> bool:
+        """Answer a single request; returns whether the daemon should keep running."""
+        request = receive_message(rfile)
+        if request is None:
+            return True
+        if request["type"] == "stop":
+            send_message(wfile, {"type": "done"})
+            return False
+        paths = [Path(path) for path in request["paths"]]
+        test_timeout = request.get("test_timeout")
+        cache = bool(request.get("cache"))
+        logging.info(f"Testing {', '.join(str(path) for path in paths)}")
+        owning_assignment.cache_clear()
+        try:
+            tasks = self.collect_tasks(paths)
+            jobs = max(request.get("jobs", 1), 1)
+            with ThreadPoolExecutor(max_workers=jobs) as executor:
+                futures = [
+                    executor.submit(self.run, task, test_timeout, cache)
+                    for task in tasks
+                ]
+                for future in as_completed(futures):
+                    result = future.result()
+                    send_message(
+                        wfile, {"type": "result", "result": result.to_dict(Path("/"))}
+                    )
+        except ValueError as e:
+            send_message(wfile, {"type": "error", "message": str(e)})
+            return True
+        send_message(wfile, {"type": "done"})
+        return True
+
+    def close(self) -> None:
+        self.pool.close()
+
+
+def serve_daemon(course_path: Path, runners: int = 2) -> None:
+    """Run a TestDaemon for the course on its socket until asked to stop."""
+    import socketserver
+
+    course = Course(course_path)
+    socket_path = daemon_socket_path(course.path)
+    course_state_dir(course.path)
+    if socket_path.exists():
+        with contextlib.suppress(OSError), connect(f"unix:{socket_path}", 0):
+            raise ValueError(f"A daemon is already running for {course.path}")
+        socket_path.unlink()
+    daemon = TestDaemon(course, runners)
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self) -> None:
+            if not daemon.serve(self.rfile, self.wfile):
+                threading.Thread(target=self.server.shutdown).start()
+
+    server = socketserver.ThreadingUnixStreamServer(str(socket_path), Handler)
+    server.daemon_threads = True
+    logging.info(f"Daemon for {course.path} listening on {socket_path}")
+    try:
+        with server:
+            server.serve_forever()
+    finally:
+        socket_path.unlink(missing_ok=True)
+        daemon.close()
+    logging.info("Daemon stopped")
+
+
+def find_daemon(paths: list[Path]) -> Optional[Path]:
+    """The socket of the daemon for the course all paths are in, if one is running."""
+    sockets = set()
+    for path in paths:
+        socket_path = next(
+            (
+                daemon_socket_path(directory)
+                for directory in (path, *path.parents)
+                if daemon_socket_path(directory).exists()
+            ),
+            None,
+        )
+        if socket_path is None:
+            return None
+        sockets.add(socket_path)
+    return sockets.pop() if len(sockets) == 1 else None
+
+
+def stop_daemon(course_path: Path) -> None:
+    with connect(f"unix:{daemon_socket_path(course_path.resolve())}", 0) as sock:
+        with sock.makefile("rb") as rfile, sock.makefile("wb") as wfile:
+            send_message(wfile, {"type": "stop"})
+            receive_message(rfile)
+
+
+def test_with_daemon(
+    socket_path: Path,
+    paths: list[Path],
+    detailed: bool = False,
+    summary: bool = False,
+    events: Optional[EventStream] = None,
+    history: bool = False,
+    test_timeout: Optional[float] = None,
+    jobs: int = 1,
+    cache: bool = False,
+) -> Optional[tuple[bool, list[TestResult]]]:
+    """Like test(), but have the daemon listening on socket_path run the tests.
+
+    Returns None if the daemon turns out not to be running after all.
+    """
+    events = events or EventStream()
+    started_at = time.time()
+    start = time.monotonic()
+    paths = [p.resolve() for p in paths]
+    try:
+        sock = connect(f"unix:{socket_path}", 0)
+    except OSError as e:
+        logging.debug(f"Not using the daemon at {socket_path}: {e}")
+        return None
+    logging.debug(f"Testing with the daemon at {socket_path}")
+    results: list[TestResult] = []
+    with sock, sock.makefile("rb") as rfile, sock.makefile("wb") as wfile:
+        send_message(
+            wfile,
+            {
+                "type": "test",
+                "paths": [str(path) for path in paths],
+                "test_timeout": test_timeout,
+                "jobs": jobs,
+                "cache": cache,
+            },
+        )
+        while (message := receive_message(rfile)) and message["type"] == "result":
+            result = TestResult.from_dict(message["result"], Path("/"))
+            emit_assignment_finished(events, result)
+            results.append(result)
+    if message is None:
+        raise ValueError(f"The daemon at {socket_path} went away")
+    if message["type"] == "error":
+        raise ValueError(message["message"])
+    return report_test_results(
+        results,
+        paths,
+        started_at,
+        time.monotonic() - start,
+        detailed,
+        summary,
+        events,
+        history,
+    )
+
+
+HISTORY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    started_at REAL NOT NULL,
+    duration REAL NOT NULL,
+    success INTEGER NOT NULL,
+    passed INTEGER NOT NULL,
+    failed INTEGER NOT NULL,
+    paths TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS assignments (
+    id INTEGER PRIMARY KEY,
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    path TEXT NOT NULL,
+    success INTEGER NOT NULL,
+    returncode INTEGER,
+    duration REAL NOT NULL,
+    cpu_time REAL NOT NULL,
+    max_rss INTEGER NOT NULL,
+    stdout TEXT NOT NULL,
+    stderr TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS assignments_by_path ON assignments(path, run_id);
+CREATE TABLE IF NOT EXISTS tests (
+    assignment_id INTEGER NOT NULL REFERENCES assignments(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    passed INTEGER NOT NULL,
+    message TEXT NOT NULL,
+    points TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tests_by_assignment ON tests(assignment_id);
+"""
+# Applied in order on top of HISTORY_SCHEMA to bring older databases up to date; the
+# number applied is kept in the database's user_version
+HISTORY_MIGRATIONS = [
+    "ALTER TABLE assignments ADD COLUMN limit_exceeded TEXT",
+]
+
+
+@dataclass
+class HistoryRun:
+    run_id: int
+    started_at: float
+    duration: float
+    passed: int
+    failed: int
+
+
+@dataclass
+class AssignmentTiming:
+    path: str
+    runs: int
+    mean_duration: float
+    max_duration: float
+
+
+@dataclass
+class DurationRegression:
+    path: str
+    previous_mean: float
+    latest: float
+
+    @property
+    def change(self) -> float:
+        return (self.latest / self.previous_mean - 1) * 100
+
+
+@dataclass
+class FailingTest:
+    path: str
+    name: str
+    failures: int
+    runs: int
+
+
+@contextlib.contextmanager
+def open_history(
+    course_path: Path, create: bool = True
+) -> Generator["sqlite3.Connection", None, None]:
+    import sqlite3
+
+    history_path = course_path / COURSE_STATE_DIR_NAME / HISTORY_DB_NAME
+    if not create and not history_path.is_file():
+        raise ValueError(f"No test history recorded for {course_path}")
+    course_state_dir(course_path)
+    connection = sqlite3.connect(history_path)
+    try:
+        connection.execute("PRAGMA foreign_keys = ON")
+        connection.executescript(HISTORY_SCHEMA)
+        version = connection.execute("PRAGMA user_version").fetchone()[0]
+        if version < len(HISTORY_MIGRATIONS):
+            with connection:
+                for migration in HISTORY_MIGRATIONS[version:]:
+                    connection.execute(migration)
+                connection.execute(f"PRAGMA user_version = {len(HISTORY_MIGRATIONS)}")
+        yield connection
+    finally:
+        connection.close()
+
+
+def record_history(
+    results: list[TestResult],
+    paths: list[Path],
+    started_at: float,
+    duration: float,
+    max_runs: int = HISTORY_MAX_RUNS,
+) -> None:
+    """Store a test run in the history of each course it covered.
+
+    Each course's share of the run is written in a single transaction, which also
+    deletes all but the latest max_runs runs.
+    """
+    by_course: dict[Path, list[TestResult]] = {}
+    for result in results:
+        by_course.setdefault(result.task.course_path, []).append(result)
+
+    for course_path, course_results in by_course.items():
+        logging.debug(f"Recording {len(course_results)} result(s) for {course_path}")
+        passed = sum(result.success for result in course_results)
+        with open_history(course_path) as connection, connection:
+            run_id = connection.execute(
+                "INSERT INTO runs (started_at, duration, success, passed, failed, "
+                "paths) VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    started_at,
+                    duration,
+                    passed == len(course_results),
+                    passed,
+                    len(course_results) - passed,
+                    json.dumps([str(path) for path in paths]),
+                ),
+            ).lastrowid
+            for result in course_results:
+                assignment_id = connection.execute(
+                    "INSERT INTO assignments (run_id, path, success, returncode, "
+                    "duration, cpu_time, max_rss, stdout, stderr, limit_exceeded) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        run_id,
+                        result.task.path.relative_to(course_path).as_posix(),
+                        result.success,
+                        result.returncode,
+                        result.duration,
+                        result.cpu_time,
+                        result.max_rss,
+                        result.stdout,
+                        result.stderr,
+                        result.limit_exceeded,
+                    ),
+                ).lastrowid
+                connection.executemany(
+                    "INSERT INTO tests (assignment_id, name, passed, message, points) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (
+                        (
+                            assignment_id,
+                            outcome.name,
+                            outcome.passed,
+                            outcome.message,
+                            json.dumps(outcome.points),
+                        )
+                        for outcome in result.outcomes
+                    ),
+                )
+            # Their assignments and tests go with them
+            connection.execute(
+                "DELETE FROM runs WHERE id <= ("
+                "SELECT id FROM runs ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                (max_runs,),
+            )
+
+
+def history_runs(course_path: Path, limit: int = 10) -> list[HistoryRun]:
+    with open_history(course_path, create=False) as connection:
+        return [
+            HistoryRun(*row)
+            for row in connection.execute(
+                "SELECT id, started_at, duration, passed, failed FROM runs "
+                "ORDER BY id DESC LIMIT ?",
+                (limit,),
+            )
+        ]
+
+
+def slowest_assignments(course_path: Path, limit: int = 10) -> list[AssignmentTiming]:
+    with open_history(course_path, create=False) as connection:
+        return [
+            AssignmentTiming(*row)
+            for row in connection.execute(
+                "SELECT path, COUNT(*), AVG(duration), MAX(duration) FROM assignments "
+                "GROUP BY path ORDER BY AVG(duration) DESC, path LIMIT ?",
+                (limit,),
+            )
+        ]
+
+
+def duration_regressions(
+    course_path: Path, threshold: float
+) -> list[DurationRegression]:
+    """Find assignments whose latest run was more than threshold percent slower than
+    their earlier runs on average."""
+    with open_history(course_path, create=False) as connection:
+        return [
+            DurationRegression(*row)
+            for row in connection.execute(
+                """
+                WITH ranked AS (
+                    SELECT path, duration, ROW_NUMBER() OVER (
+                        PARTITION BY path ORDER BY run_id DESC
+                    ) AS age
+                    FROM assignments
+                )
+                SELECT latest.path, AVG(previous.duration), latest.duration
+                FROM ranked AS latest
+                JOIN ranked AS previous
+                    ON previous.path = latest.path AND previous.age > 1
+                WHERE latest.age = 1
+                GROUP BY latest.path
+                HAVING latest.duration > AVG(previous.duration) * (1 + ? / 100.0)
+                ORDER BY latest.duration / AVG(previous.duration) DESC, latest.path
+                """,
+                (threshold,),
+            )
+        ]
+
+
+def failing_tests(course_path: Path, limit: int = 10) -> list[FailingTest]:
+    with open_history(course_path, create=False) as connection:
+        return [
+            FailingTest(*row)
+            for row in connection.execute(
+                "SELECT assignments.path, tests.name, "
+                "SUM(NOT tests.passed) AS failures, COUNT(*) FROM tests "
+                "JOIN assignments ON assignments.id = tests.assignment_id "
+                "GROUP BY assignments.path, tests.name HAVING failures > 0 "
+                "ORDER BY failures DESC, assignments.path, tests.name LIMIT ?",
+                (limit,),
+            )
+        ]
+
+
+def load_history_run(
+    course_path: Path, run_id: Optional[int] = None
+) -> list[TestResult]:
+    """Rebuild the results of a recorded run, by default the latest one."""
+    with open_history(course_path, create=False) as connection:
+        if run_id is None:
+            row = connection.execute("SELECT MAX(id) FROM runs").fetchone()
+            run_id = row[0] if row else None
+        assignments = connection.execute(
+            "SELECT id, path, success, returncode, duration, cpu_time, max_rss, "
+            "stdout, stderr, limit_exceeded FROM assignments WHERE run_id = ? "
+            "ORDER BY id",
+            (run_id,),
+        ).fetchall()
+        if not assignments:
+            raise ValueError(f"No recorded run {run_id} for {course_path}")
+
+        results = []
+        for (
+            assignment_id,
+            path,
+            success,
+            returncode,
+            duration,
+            cpu_time,
+            max_rss,
+            stdout,
+            stderr,
+            limit_exceeded,
+        ) in assignments:
+            outcomes = [
+                TestOutcome(name, bool(passed), message, json.loads(points))
+                for name, passed, message, points in connection.execute(
+                    "SELECT name, passed, message, points FROM tests "
+                    "WHERE assignment_id = ? ORDER BY rowid",
+                    (assignment_id,),
+                )
+            ]
+            results.append(
+                TestResult(
+                    TestTask(course_path / PurePosixPath(path)),
+                    bool(success),
+                    stdout,
+                    stderr,
+                    returncode=returncode,
+                    duration=duration,
+                    cpu_time=cpu_time,
+                    max_rss=max_rss,
+                    outcomes=outcomes,
+                    limit_exceeded=limit_exceeded,
+                )
+            )
+        return results
+
+
+def print_history(
+    course_path: Path,
+    slowest: bool = False,
+    regressed: Optional[float] = None,
+    failing: bool = False,
+    limit: int = 10,
+) -> None:
+    lines: list[str]
+    if slowest:
+        lines = [
+            f"{timing.mean_duration:8.2f}s mean {timing.max_duration:8.2f}s max "
+            f"{timing.runs:5} run(s)  {timing.path}"
+            for timing in slowest_assignments(course_path, limit)
+        ]
+    elif regressed is not None:
+        lines = [
+            f"{regression.change:+8.1f}%  {regression.previous_mean:.2f}s -> "
+            f"{regression.latest:.2f}s  {regression.path}"
+            for regression in duration_regressions(course_path, regressed)[:limit]
+        ]
+    elif failing:
+        lines = [
+            f"{test.failures:5}/{test.runs} failed  {test.path}: {test.name}"
+            for test in failing_tests(course_path, limit)
+        ]
+    else:
+        lines = [
+            f"#{run.run_id:<5} "
+            f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(run.started_at))}  "
+            f"{run.passed} passed, {run.failed} failed in {run.duration:.1f}s"
+            for run in history_runs(course_path, limit)
+        ]
+    if not lines:
+        logging.info("Nothing to show")
+    for line in lines:
+        print(line)
+
+
+def memory_temp_dir() -> Optional[str]:
+    shm_path = Path("/dev/shm")
+    if shm_path.is_dir() and os.access(shm_path, os.W_OK):
+        return str(shm_path)
+    return None
+
+
+@contextlib.contextmanager
+def staged_archive(archive_path: Path) -> Generator[Path, None, None]:
+    """Extract an assignment archive to a throwaway, memory-backed if possible,
+    directory and yield the root of the assignment in it.
+
+    The TMC runner discovers tests from the file system and writes its results to
+    its working directory, so the archive can't simply be imported with zipimport.
+    """
+    with tempfile.TemporaryDirectory(
+        prefix="tmc-course-", dir=memory_temp_dir()
+    ) as staging_dir:
+        root = archive_assignment_root(archive_path)
+        if root is None:
+            raise ValueError(f"{archive_path} does not contain a TMC assignment")
+        logging.debug(f"Extracting {archive_path} to {staging_dir}")
+        with zipfile.ZipFile(archive_path) as assignment_zip:
+            assignment_zip.extractall(staging_dir)
+        yield Path(staging_dir).joinpath(*root.parts)
+
+
+def run_test_task(
+    task: TestTask,
+    test_timeout: Optional[float] = None,
+    scratch: bool = False,
+    precompiled: Optional["Precompiled"] = None,
+    deadline: Optional[float] = None,
+) -> TestResult:
+    """Test the assignment of task, stopping its tests after deadline seconds."""
+    if task.is_archive:
+        with staged_archive(task.path) as assignment_path:
+            return run_tests(task, assignment_path, test_timeout, deadline=deadline)
+    assignment_path = task.path.resolve()
+    if scratch:
+        with scratch_workspace(assignment_path) as workspace_path:
+            if not precompiled:
+                return run_tests(task, workspace_path, test_timeout, deadline=deadline)
+            # The prefix is shared with the other runs, so that the standard library
+            # and the rest of what the tests import from outside the workspace is
+            # only compiled once
+            prefix_path = precompiled.prefix_path
+            try:
+                precompiled.link(assignment_path, workspace_path, prefix_path)
+                return run_tests(
+                    task, workspace_path, test_timeout, prefix_path, deadline
+                )
+            finally:
+                shutil.rmtree(
+                    prefix_path
+                    / workspace_path.parent.relative_to(workspace_path.anchor),
+                    ignore_errors=True,
+                )
+    if precompiled:
+        precompiled.link(assignment_path, assignment_path, precompiled.prefix_path)
+        return run_tests(
+            task, assignment_path, test_timeout, precompiled.prefix_path, deadline
+        )
+    return run_tests(task, assignment_path, test_timeout, deadline=deadline)
+
+
+@dataclass
+class Precompiled:
+    """Bytecode for the assignments of a course, compiled ahead of the test runs.
+
+    The bytecode is kept out of the assignments with PYTHONPYCACHEPREFIX. It uses
+    hash-based invalidation, so a single file in the store serves every identical
+    source file (like the copies of TMC-python-tester) wherever it is.
+    """
+
+    prefix_path: Path
+    # assignment -> [(source file relative to the assignment, bytecode in the store)]
+    pycs: dict[Path, list[tuple[Path, Path]]] = field(default_factory=dict)
+    # source file -> error message
+    errors: dict[Path, str] = field(default_factory=dict)
+
+    def link(self, assignment_path: Path, run_path: Path, prefix_path: Path) -> None:
+        """Make the bytecode of assignment_path available for a run in run_path."""
+        for source_path, pyc_path in self.pycs.get(assignment_path, []):
+            cached_path = pycache_path(run_path / source_path, prefix_path)
+            cached_path.parent.mkdir(parents=True, exist_ok=True)
+            link_or_copy(pyc_path, cached_path)
+
+
+def pycache_path(source_path: Path, prefix_path: Path) -> Path:
+    """Where Python looks for the bytecode of source_path with the given
+    PYTHONPYCACHEPREFIX (see importlib.util.cache_from_source)."""
+    return (
+        prefix_path
+        / source_path.parent.relative_to(source_path.anchor)
+        / f"{source_path.stem}.{sys.implementation.cache_tag}.pyc"
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def tmc_runner_sys_info(attribute: str) -> Optional[str]:
+    """An attribute of sys in the Python the tests are run with, like "version"."""
+    try:
+        result = subprocess.run(
+            ["python3", "-c", f"import sys; print(sys.{attribute})"],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+
+def tmc_runner_cache_tag() -> Optional[str]:
+    """The bytecode cache tag of the Python the tests are run with."""
+    return tmc_runner_sys_info("implementation.cache_tag")
+
+
+def compile_source(source_path: Path, pyc_path: Path) -> Optional[str]:
+    """Compile source_path to pyc_path, returning the error if it doesn't compile."""
+    try:
+        py_compile.compile(
+            str(source_path),
+            cfile=str(pyc_path),
+            doraise=True,
+            invalidation_mode=py_compile.PycInvalidationMode.CHECKED_HASH,
+        )
+    except py_compile.PyCompileError as e:
+        error = e.exc_value
+        if isinstance(error, SyntaxError):
+            return f"line {error.lineno}: {error.msg}"
+        return str(error)
+    return None
+
+
+def precompile(
+    course_path: Path, assignment_paths: list[Path], jobs: Optional[int] = None
+) -> Precompiled:
+    """Compile the Python files of the assignments into the course's shared store.
+
+    Each distinct file content is only compiled once, in a process pool if there
+    are many of them.
+    """
+    pycache_path = course_state_dir(course_path) / "pycache"
+    store_path = pycache_path / "store"
+    store_path.mkdir(parents=True, exist_ok=True)
+    precompiled = Precompiled(pycache_path / "tree")
+    if tmc_runner_cache_tag() != sys.implementation.cache_tag:
+        logging.debug("Tests run with another Python version; not precompiling")
+        return precompiled
+
+    sources: dict[Path, Path] = {}
+    for assignment_path in assignment_paths:
+        pycs = precompiled.pycs.setdefault(assignment_path, [])
+        for source_path in sorted(assignment_path.rglob("*.py")):
+            digest = hashlib.sha256(source_path.read_bytes()).hexdigest()
+            pyc_path = store_path / f"{digest}.{sys.implementation.cache_tag}.pyc"
+            sources.setdefault(pyc_path, source_path)
+            pycs.append((source_path.relative_to(assignment_path), pyc_path))
+
+    missing = {
+        pyc_path: source_path
+        for pyc_path, source_path in sources.items()
+        if not pyc_path.exists()
+    }
+    logging.debug(f"Compiling {len(missing)} of {len(sources)} distinct file(s)")
+    jobs = jobs or os.cpu_count() or 1
+    if len(missing) >= PROCESS_POOL_MIN_FILES and jobs > 1:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            errors = list(
+                executor.map(
+                    compile_source,
+                    missing.values(),
+                    missing.keys(),
+                    chunksize=max(1, len(missing) // (jobs * 4)),
+                )
+            )
+    else:
+        errors = [compile_source(*item) for item in zip(missing.values(), missing)]
+    failed = {
+        pyc_path: error for pyc_path, error in zip(missing, errors) if error is not None
+    }
+    for assignment_path, pycs in precompiled.pycs.items():
+        for source_path, pyc_path in pycs:
+            if pyc_path in failed:
+                precompiled.errors[assignment_path / source_path] = failed[pyc_path]
+        pycs[:] = [
+            (path, pyc_path) for path, pyc_path in pycs if pyc_path not in failed
+        ]
+    return precompiled
+
+
+@contextlib.contextmanager
+def scratch_workspace(assignment_path: Path) -> Generator[Path, None, None]:
+    """Yield a throwaway copy of the assignment to run its tests in.
+
+    The workspace lives in the course's state directory, on the same file system as
+    the assignment, so that it can be built from links instead of copies. Only the
+    TMC-python-tester is hard linked, as the tests might write into the other files;
+    those are reflinked where the file system supports it, and copied otherwise.
+    Runs in separate workspaces don't see each other's generated files, so even the
+    same assignment can be tested several times at once.
+    """
+    scratch_path = course_state_dir(assignment_path.parent.parent) / "scratch"
+    scratch_path.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(
+        prefix=f"{assignment_path.name}-", dir=scratch_path
+    ) as workspace_dir:
+        workspace_path = Path(workspace_dir) / assignment_path.name
+        tester_path = assignment_path / "tmc"
+        for path in assignment_files(assignment_path):
+            target_path = workspace_path / path.relative_to(assignment_path)
+            target_path.parent.mkdir(parents=True, exist_ok=True)
+            link_or_copy(path, target_path, hardlink=path.is_relative_to(tester_path))
+        logging.debug(f"Created scratch workspace {workspace_path}")
+        yield workspace_path
+
+
+def tmc_runner_command(test_timeout: Optional[float] = None) -> list[str]:
+    if not test_timeout:
+        return ["python3", "-m", "tmc"]
+    return ["python3", "-c", TEST_TIMEOUT_BOOTSTRAP, str(test_timeout)]
+
+
+def run_tests(
+    task: TestTask,
+    assignment_path: Path,
+    test_timeout: Optional[float] = None,
+    pycache_prefix: Optional[Path] = None,
+    deadline: Optional[float] = None,
+) -> TestResult:
+    limits = prepare_test_run(task, assignment_path)
+    start = time.monotonic()
+    env = None
+    if pycache_prefix:
+        env = {**os.environ, "PYTHONPYCACHEPREFIX": str(pycache_prefix)}
+    result = run_process(
+        tmc_runner_command(test_timeout), assignment_path, limits, env, deadline
+    )
+    return finish_test_run(
+        task, assignment_path, result, time.monotonic() - start, limits, test_timeout
+    )
+
+
+def prepare_test_run(task: TestTask, assignment_path: Path) -> "ResourceLimits":
+    """Check that assignment_path can be tested, and find the limits to test it with."""
+    logging.debug(f"Running tests for {assignment_path}")
+    if not is_valid_assignment(assignment_path):
+        raise ValueError(f"{assignment_path} is not a valid TMC assignment")
+    limits = ResourceLimits.from_config(
+        {} if task.is_archive else read_course_config(task.course_path)
+    ).override(ResourceLimits.from_config(read_course_config(assignment_path)))
+    # Don't mistake the results of an earlier run for those of this one
+    (assignment_path / TEST_RESULTS_FILE_NAME).unlink(missing_ok=True)
+    return limits
+
+
+def finish_test_run(
+    task: TestTask,
+    assignment_path: Path,
+    result: "ProcessResult",
+    duration: float,
+    limits: "ResourceLimits",
+    test_timeout: Optional[float] = None,
+) -> TestResult:
+    logging.debug(f"Test run complete; {result.returncode=}")
+    limit_exceeded = limits.exceeded(result.returncode, result.stderr, result.cpu_time)
+    if test_timeout and TEST_TIMEOUT_PATTERN.search(result.stderr):
+        limit_exceeded = "test_timeout"
+    if result.timed_out:
+        limit_exceeded = "task_timeout"
+    if limit_exceeded:
+        logging.debug(f"{assignment_path} exceeded its {limit_exceeded} limit")
+    return TestResult(
+        task,
+        result.returncode == 0 and not limit_exceeded,
+        result.stdout,
+        result.stderr,
+        returncode=result.returncode,
+        duration=duration,
+        cpu_time=result.cpu_time,
+        max_rss=result.max_rss,
+        outcomes=read_test_outcomes(assignment_path),
+        limit_exceeded=limit_exceeded,
+    )
+
+
+async def run_tests_async(
+    task: TestTask, assignment_path: Path, test_timeout: Optional[float] = None
+) -> TestResult:
+    """Like run_tests, but without blocking the event loop.
+
+    The file system work before and after the run is done in a thread. The CPU time
+    and memory use of the run aren't measured. Cancelling kills the run.
+    """
+    import asyncio
+
+    limits = await asyncio.to_thread(prepare_test_run, task, assignment_path)
+    start = time.monotonic()
+    process = await asyncio.create_subprocess_exec(
+        *limits.command(tmc_runner_command(test_timeout)),
+        cwd=assignment_path,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    try:
+        stdout, stderr = await process.communicate()
+    except asyncio.CancelledError:
+        with contextlib.suppress(ProcessLookupError):
+            process.kill()
+        await process.wait()
+        raise
+    assert process.returncode is not None
+    result = ProcessResult(
+        process.returncode,
+        stdout.decode(errors="replace"),
+        stderr.decode(errors="replace"),
+    )
+    return await asyncio.to_thread(
+        finish_test_run,
+        task,
+        assignment_path,
+        result,
+        time.monotonic() - start,
+        limits,
+        test_timeout,
+    )
+
+
+async def test_async(
+    paths: list[Path], *, concurrency: int = 8, test_timeout: Optional[float] = None
+) -> AsyncGenerator[TestResult, None]:
+    """Test the assignments in paths, yielding the results as the runs finish.
+
+    For embedding in asyncio applications: nothing is printed, no progress is shown
+    and at most concurrency runs are going on at a time. Leaving the loop early, or
+    cancelling the task iterating over the results, kills the runs in progress.
+    """
+    import asyncio
+
+    paths = [p.resolve() for p in paths]
+
+    def collect() -> list[TestTask]:
+        owning_assignment.cache_clear()
+        return list({task.path: task for task in collect_tasks(paths)}.values())
+
+    tasks = await asyncio.to_thread(collect)
+    semaphore = asyncio.Semaphore(max(concurrency, 1))
+
+    async def run(task: TestTask) -> TestResult:
+        async with semaphore:
+            if not task.is_archive:
+                return await run_tests_async(task, task.path, test_timeout)
+            # Extracting and removing the archive are done in threads, like the rest
+            # of the file system work
+            staging = staged_archive(task.path)
+            assignment_path = await asyncio.to_thread(staging.__enter__)
+            try:
+                return await run_tests_async(task, assignment_path, test_timeout)
+            finally:
+                await asyncio.to_thread(staging.__exit__, None, None, None)
+
+    runs = [asyncio.ensure_future(run(task)) for task in tasks]
+    try:
+        for next_result in asyncio.as_completed(runs):
+            yield await next_result
+    finally:
+        for pending in runs:
+            pending.cancel()
+        await asyncio.gather(*runs, return_exceptions=True)
+
+
+@dataclass
+class ResourceLimits:
+    """Resource limits for test runs, mirroring those of the TMC sandbox.
+
+    Read from the "tmc_course" section of .tmcproject.yml, where the assignment's
+    file overrides the course's, e.g.
+
+        tmc_course:
+          memory_limit_mb: 512
+          cpu_limit_s: 10
+          file_size_limit_mb: 10
+          process_limit: 32
+
+    "unlimited" lifts a limit set for the course.
+
+    Unlike in the sandbox, the process limit (RLIMIT_NPROC) counts every process of
+    the user running the tests, not just those of the test run, and doesn't apply to
+    root at all.
+    """
+
+    memory: Optional[int] = None
+    cpu_time: Optional[int] = None
+    file_size: Optional[int] = None
+    processes: Optional[int] = None
+
+    # config key -> (field, multiplier to get the rlimit's unit)
+    CONFIG_KEYS = {
+        "memory_limit_mb": ("memory", 1024 * 1024),
+        "cpu_limit_s": ("cpu_time", 1),
+        "file_size_limit_mb": ("file_size", 1024 * 1024),
+        "process_limit": ("processes", 1),
+    }
+    # Errors the tests run into when hitting a limit instead of being killed
+    ERROR_PATTERNS = {
+        "memory": re.compile(r"^MemoryError\b", re.MULTILINE),
+        "file_size": re.compile(r"^\w*Error: \[Errno 27\]", re.MULTILINE),
+        "processes": re.compile(r"^BlockingIOError: \[Errno 11\]", re.MULTILINE),
+    }
+
+    @classmethod
+    def from_config(cls, config: dict[str, str]) -> "ResourceLimits":
+        limits = cls()
+        for key, (name, multiplier) in cls.CONFIG_KEYS.items():
+            value = config.get(key)
+            if value is None:
+                continue
+            if value == "unlimited":
+                setattr(limits, name, 0)
+            elif value.isdigit() and int(value) > 0:
+                setattr(limits, name, int(value) * multiplier)
+            else:
+                raise ValueError(
+                    f"{key} must be a positive integer or unlimited, not {value!r}"
+                )
+        return limits
+
+    def override(self, other: "ResourceLimits") -> "ResourceLimits":
+        """Combine with other, whose limits take precedence when set."""
+        return ResourceLimits(
+            *(
+                theirs if theirs is not None else ours
+                for ours, theirs in (
+                    (self.memory, other.memory),
+                    (self.cpu_time, other.cpu_time),
+                    (self.file_size, other.file_size),
+                    (self.processes, other.processes),
+                )
+            )
+        )
+
+    def rlimits(self) -> list[tuple[int, int]]:
+        if resource is None:  # pragma: no cover (Windows)
+            return []
+        return [
+            (limit, value)
+            for limit, value in (
+                (resource.RLIMIT_AS, self.memory),
+                (resource.RLIMIT_CPU, self.cpu_time),
+                (resource.RLIMIT_FSIZE, self.file_size),
+                (resource.RLIMIT_NPROC, self.processes),
+            )
+            if value
+        ]
+
+    def settings(self) -> list[tuple[int, int, int]]:
+        """The (resource, soft, hard) settings for setrlimit."""
+        return [
+            # A second of grace for the CPU limit so SIGXCPU arrives before SIGKILL
+            (limit, value, value + 1 if limit == resource.RLIMIT_CPU else value)
+            for limit, value in self.rlimits()
+        ]
+
+    def command(self, args: list[str]) -> list[str]:
+        """args wrapped to run with the limits applied."""
+        settings = self.settings()
+        if not settings:
+            return args
+        return [sys.executable, "-c", RLIMIT_BOOTSTRAP, json.dumps(settings), *args]
+
+    def exceeded(
+        self, returncode: int, stderr: str, cpu_time: float = 0.0
+    ) -> Optional[str]:
+        """Name of the limit a process with this outcome ran into, if any.
+
+        cpu_time is the CPU time the process used, if known, which tells a process
+        killed for running past the hard CPU limit from one killed for other reasons.
+        """
+        if not self.rlimits():
+            return None
+        if self.cpu_time and (
+            returncode == -signal.SIGXCPU
+            or (returncode == -signal.SIGKILL and cpu_time >= self.cpu_time)
+        ):
+            return "cpu_time"
+        if self.file_size and returncode == -signal.SIGXFSZ:
+            return "file_size"
+        for name, pattern in self.ERROR_PATTERNS.items():
+            if getattr(self, name) and pattern.search(stderr):
+                return name
+        return None
+
+
+@dataclass
+class ProcessResult:
+    returncode: int
+    stdout: str
+    stderr: str
+    cpu_time: float = 0.0
+    max_rss: int = 0
+    # Whether the process was killed for running past its deadline
+    timed_out: bool = False
+
+
+def run_process(
+    args: list[str],
+    working_dir: Path,
+    limits: Optional[ResourceLimits] = None,
+    env: Optional[dict[str, str]] = None,
+    deadline: Optional[float] = None,
+) -> ProcessResult:
+    """Run a process to completion, capturing its output and resource usage.
+
+    CPU time is in seconds and the peak resident set size in KiB. Resource usage is
+    only available on platforms with os.wait4, and limits on those with rlimits. A
+    process still running after deadline seconds is killed.
+    """
+    process = subprocess.Popen(
+        limits.command(args) if limits else args,
+        cwd=working_dir,
+        env=env,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    if not deadline:
+        return wait_for_process(process)
+    timed_out = threading.Event()
+
+    def kill() -> None:
+        timed_out.set()
+        if not hasattr(os, "wait4"):  # pragma: no cover (Windows)
+            process.kill()
+            return
+        # Popen.kill could reap the process, which wait_for_process does itself
+        with contextlib.suppress(ProcessLookupError):
+            os.kill(process.pid, signal.SIGKILL)
+
+    timer = threading.Timer(deadline, kill)
+    timer.start()
+    try:
+        result = wait_for_process(process)
+    finally:
+        timer.cancel()
+    result.timed_out = timed_out.is_set()
+    return result
+
+
+def wait_for_process(process: "subprocess.Popen[str]") -> ProcessResult:
+    """Read the output of a started process until it exits, see run_process."""
+    with process:
+        assert process.stdout is not None and process.stderr is not None
+        stderr: list[str] = []
+        stderr_reader = threading.Thread(
+            target=lambda stream: stderr.append(stream.read()),
+            args=(process.stderr,),
+        )
+        stderr_reader.start()
+        stdout = process.stdout.read()
+        stderr_reader.join()
+
+        if not hasattr(os, "wait4"):  # pragma: no cover (Windows)
+            return ProcessResult(process.wait(), stdout, "".join(stderr))
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+    max_rss = usage.ru_maxrss
+    if sys.platform == "darwin":  # pragma: no cover
+        max_rss //= 1024  # reported in bytes instead of KiB
+    return ProcessResult(
+        process.returncode,
+        stdout,
+        "".join(stderr),
+        cpu_time=usage.ru_utime + usage.ru_stime,
+        max_rss=max_rss,
+    )
+
+
+def read_test_outcomes(assignment_path: Path) -> list[TestOutcome]:
+    """Read the per-test outcomes the TMC runner left in the assignment."""
+    results_path = assignment_path / TEST_RESULTS_FILE_NAME
+    try:
+        entries = json.loads(results_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        logging.debug(f"No readable test results in {results_path}")
+        return []
+    return [
+        TestOutcome(
+            str(entry.get("name", "")),
+            bool(entry.get("passed", False)),
+            str(entry.get("message", "")),
+            [str(point) for point in entry.get("points", [])],
+        )
+        for entry in entries
+        if isinstance(entry, dict)
+    ]
+
+
+class VersionAction(argparse.Action):
+    """Like argparse's "version" action, but only looks the version up when used."""
+
+    def __init__(
+        self,
+        option_strings: list[str],
+        dest: str = argparse.SUPPRESS,
+        default: str = argparse.SUPPRESS,
+        help: str = "show program's version number and exit",
+    ) -> None:
+        super().__init__(
+            option_strings=option_strings,
+            dest=dest,
+            default=default,
+            nargs=0,
+            help=help,
+        )
+
+    def __call__(
+        self,
+        parser: argparse.ArgumentParser,
+        namespace: argparse.Namespace,
+        values: object,
+        option_string: Optional[str] = None,
+    ) -> None:
+        import importlib.metadata
+
+        print(importlib.metadata.version(__package__ or __name__))
+        parser.exit()
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        "tmc-course",
+        description="Helper for building TestMyCode python programming courses",
+    )
+    parser.add_argument(
+        "--version",
+        action=VersionAction,
+    )
+
+    verbosity_grp = parser.add_mutually_exclusive_group()
     verbosity_grp.add_argument(
         "--quiet", "-q", action="store_true", help="Only output warning"
     )
@@ -463,9 +4137,27 @@ def main(argv: Optional[list[str]] = None) -> int:
     init_grp = actions.add_parser(
         "init", help="Initialize a new course, part or assignment"
     )
-    init_actions = init_grp.add_subparsers(
-        dest="init_action", required=True, metavar="TYPE"
+    init_grp.add_argument(
+        "--from",
+        dest="manifest",
+        type=str,
+        metavar="MANIFEST",
+        help="Initialize all parts and assignments listed in a YAML or CSV manifest",
+    )
+    init_grp.add_argument(
+        "--yes",
+        "-y",
+        action="store_true",
+        help="Overwrite existing parts and assignments without asking",
+    )
+    init_grp.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=1,
+        help="Number of assignments to initialize concurrently (with --from)",
     )
+    init_actions = init_grp.add_subparsers(dest="init_action", metavar="TYPE")
 
     # INIT COURSE
     init_course_grp = init_actions.add_parser("course", help="Initialize a new course")
@@ -506,12 +4198,227 @@ def main(argv: Optional[list[str]] = None) -> int:
         "path",
         type=str,
         nargs="*",
-        help="Path(s) to test (course, part or assignment);"
+        help="Path(s) to test (course, part or assignment); "
         "defaults to CWD if not given",
     )
     test_grp.add_argument(
         "--details", action="store_true", help="Show more details about test results"
     )
+    test_grp.add_argument(
+        "--summary",
+        action="store_true",
+        help="Collapse parts where every assignment passed into a single line",
+    )
+    test_grp.add_argument(
+        "--events",
+        metavar="PATH",
+        help="Write progress as newline-delimited JSON events to PATH ('-' for stdout)",
+    )
+    test_grp.add_argument(
+        "--test-timeout",
+        type=float,
+        metavar="SECONDS",
+        help="Stop an assignment's tests at the first test that runs longer than "
+        "SECONDS, showing the stacks of all threads at the time",
+    )
+    test_grp.add_argument(
+        "--scratch",
+        action="store_true",
+        help="Run each assignment in a throwaway copy instead of in the course",
+    )
+    test_grp.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=1,
+        help="Number of assignments to test concurrently",
+    )
+    test_grp.add_argument(
+        "--precompile",
+        action="store_true",
+        help="Compile the sources once into .tmc-course/pycache instead of into "
+        "__pycache__ directories in each test run",
+    )
+    test_grp.add_argument(
+        "--cache",
+        action="store_true",
+        help="Reuse the results of earlier runs of unchanged assignments",
+    )
+    test_grp.add_argument(
+        "--remote-cache",
+        metavar="LOCATION",
+        default=os.environ.get(REMOTE_RESULT_CACHE_ENV),
+        help="Also share cached results through LOCATION, a directory or an HTTP URL "
+        f"(implies --cache); defaults to ${REMOTE_RESULT_CACHE_ENV}",
+    )
+    test_grp.add_argument(
+        "--no-history",
+        action="store_true",
+        help="Don't record the results in the course's test history",
+    )
+    test_grp.add_argument(
+        "--no-daemon",
+        action="store_true",
+        help="Run the tests here even if a daemon is running for the course",
+    )
+
+    # DAEMON
+    daemon_grp = actions.add_parser(
+        "daemon",
+        help="Keep a course indexed and ready to test, so 'test' runs return quickly",
+    )
+    daemon_grp.add_argument(
+        "path", type=str, nargs="?", help="Path to the course; defaults to CWD"
+    )
+    daemon_grp.add_argument(
+        "--runners",
+        type=int,
+        default=2,
+        help="Number of test runner processes to keep started ahead of time",
+    )
+    daemon_grp.add_argument(
+        "--stop", action="store_true", help="Stop the daemon running for the course"
+    )
+
+    # SERVE-WORK
+    serve_grp = actions.add_parser(
+        "serve-work",
+        help="Test a course, part or assignment on workers connecting over a socket",
+    )
+    serve_grp.add_argument(
+        "address", help="Address to listen on, either HOST:PORT or unix:PATH"
+    )
+    serve_grp.add_argument(
+        "path",
+        type=str,
+        nargs="*",
+        help="Path(s) to test (course, part or assignment); "
+        "defaults to CWD if not given",
+    )
+    serve_grp.add_argument(
+        "--root",
+        help="Directory the workers' checkouts correspond to; defaults to CWD",
+    )
+    serve_grp.add_argument(
+        "--details", action="store_true", help="Show more details about test results"
+    )
+    serve_grp.add_argument(
+        "--summary",
+        action="store_true",
+        help="Collapse parts where every assignment passed into a single line",
+    )
+    serve_grp.add_argument(
+        "--events",
+        metavar="PATH",
+        help="Write progress as newline-delimited JSON events to PATH ('-' for stdout)",
+    )
+    serve_grp.add_argument(
+        "--test-timeout",
+        type=float,
+        metavar="SECONDS",
+        help="Stop an assignment's tests at the first test that runs longer than "
+        "SECONDS",
+    )
+    serve_grp.add_argument(
+        "--task-timeout",
+        type=float,
+        default=WORKER_TASK_TIMEOUT,
+        metavar="SECONDS",
+        help="Stop the tests of an assignment after SECONDS, and hand it to another "
+        "worker if its worker hasn't reported back by then "
+        f"(default: {WORKER_TASK_TIMEOUT:g})",
+    )
+    serve_grp.add_argument(
+        "--cache",
+        action="store_true",
+        help="Reuse the results of earlier runs of unchanged assignments",
+    )
+    serve_grp.add_argument(
+        "--remote-cache",
+        metavar="LOCATION",
+        default=os.environ.get(REMOTE_RESULT_CACHE_ENV),
+        help="Also share cached results through LOCATION, a directory or an HTTP URL "
+        f"(implies --cache); defaults to ${REMOTE_RESULT_CACHE_ENV}",
+    )
+    serve_grp.add_argument(
+        "--no-history",
+        action="store_true",
+        help="Don't record the results in the course's test history",
+    )
+
+    # WORKER
+    worker_grp = actions.add_parser(
+        "worker", help="Run the tests handed out by a serve-work coordinator"
+    )
+    worker_grp.add_argument(
+        "address", help="Address of the coordinator, either HOST:PORT or unix:PATH"
+    )
+    worker_grp.add_argument(
+        "--root",
+        help="Checkout of the coordinator's root directory; defaults to CWD",
+    )
+    worker_grp.add_argument(
+        "--scratch",
+        action="store_true",
+        help="Run each assignment in a throwaway copy instead of in the checkout",
+    )
+
+    # CHECK
+    check_grp = actions.add_parser(
+        "check", help="Check a course for common mistakes without running tests"
+    )
+    check_grp.add_argument(
+        "path",
+        type=str,
+        nargs="?",
+        help="Course root directory; defaults to CWD if not given",
+    )
+    check_grp.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        help="Number of processes to analyze files with; defaults to the CPU count",
+    )
+
+    # HISTORY
+    history_grp = actions.add_parser(
+        "history", help="Query the recorded test runs of a course"
+    )
+    history_grp.add_argument(
+        "path",
+        type=str,
+        nargs="?",
+        help="Course root directory; defaults to CWD if not given",
+    )
+    history_query_grp = history_grp.add_mutually_exclusive_group()
+    history_query_grp.add_argument(
+        "--slowest",
+        action="store_true",
+        help="Show the assignments that take the longest on average",
+    )
+    history_query_grp.add_argument(
+        "--regressed",
+        type=float,
+        metavar="PERCENT",
+        help="Show assignments whose latest run was over PERCENT slower than before",
+    )
+    history_query_grp.add_argument(
+        "--failing", action="store_true", help="Show the most frequently failing tests"
+    )
+    history_query_grp.add_argument(
+        "--show",
+        type=int,
+        nargs="?",
+        const=0,
+        metavar="RUN",
+        help="Show the report of a recorded run again; defaults to the latest run",
+    )
+    history_grp.add_argument(
+        "--limit",
+        type=int,
+        default=10,
+        help="Maximum number of rows to show",
+    )
 
     # UPDATE
     update_grp = actions.add_parser(
@@ -523,6 +4430,68 @@ def main(argv: Optional[list[str]] = None) -> int:
         nargs="?",
         help="Course root directory; defaults to CWD if not given",
     )
+    update_grp.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Only show which TMC-python-runner files would change",
+    )
+    update_grp.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=1,
+        help="Number of assignments to update concurrently",
+    )
+
+    # EXPORT
+    export_grp = actions.add_parser(
+        "export", help="Export the student version of a course"
+    )
+    export_grp.add_argument(
+        "path",
+        type=str,
+        nargs="?",
+        help="Course root directory; defaults to CWD if not given",
+    )
+    export_grp.add_argument(
+        "--stubs",
+        type=str,
+        required=True,
+        metavar="OUT",
+        help="Directory to export assignments with their solutions stripped to",
+    )
+    export_grp.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=1,
+        help="Number of assignments to export concurrently",
+    )
+
+    # PACK
+    pack_grp = actions.add_parser(
+        "pack", help="Zip each assignment reproducibly for uploading"
+    )
+    pack_grp.add_argument(
+        "path",
+        type=str,
+        nargs="?",
+        help="Course root directory; defaults to CWD if not given",
+    )
+    pack_grp.add_argument(
+        "--out",
+        "-o",
+        type=str,
+        required=True,
+        help="Directory to write the assignment archives to",
+    )
+    pack_grp.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=1,
+        help="Number of assignments to pack concurrently",
+    )
 
     # Parse arguments
     args = parser.parse_args(argv)
@@ -537,8 +4506,15 @@ def main(argv: Optional[list[str]] = None) -> int:
             format="%(levelname)s:%(asctime)s: %(message)s", level=logging.DEBUG
         )
 
+    if args.action == "init" and not args.init_action and not args.manifest:
+        init_grp.error("either TYPE or --from is required")
+    if args.action == "init" and args.init_action and args.manifest:
+        init_grp.error("TYPE and --from can't be used together")
+
     try:
-        if args.action == "init":
+        if args.action == "init" and args.manifest:
+            init_from_manifest(Path(args.manifest), assume_yes=args.yes, jobs=args.jobs)
+        elif args.action == "init":
             paths = [Path(path).resolve() for path in args.path]
             if not paths:
                 paths = [Path(os.getcwd()).resolve()]
@@ -554,16 +4530,125 @@ def main(argv: Optional[list[str]] = None) -> int:
                     init_assignment(
                         path.parent.parent, path.parent.name, path.name, language
                     )
-        if args.action == "test":
+        if args.action in ("test", "serve-work"):
             paths = [Path(path).resolve() for path in args.path]
             if not paths:
                 paths = [Path(os.getcwd()).resolve()]
-            all_passed, _ = test(paths, detailed=args.details)
+            with contextlib.ExitStack() as stack:
+                events_stream: Optional[TextIO] = None
+                if args.events == "-":
+                    events_stream = sys.stdout
+                elif args.events:
+                    events_stream = stack.enter_context(
+                        open(args.events, "w", encoding="utf-8")
+                    )
+                run_options: dict[str, Any]
+                if args.action == "test":
+                    run_options = dict(
+                        scratch=args.scratch,
+                        jobs=args.jobs,
+                        precompile_sources=args.precompile,
+                    )
+                else:
+                    root = Path(args.root) if args.root else Path(os.getcwd())
+                    run_options = dict(
+                        serve_address=args.address,
+                        root=root.resolve(),
+                        task_timeout=args.task_timeout,
+                    )
+                outcome = None
+                daemon_socket = None
+                if args.action == "test" and not (
+                    args.no_daemon
+                    or args.scratch
+                    or args.precompile
+                    or args.remote_cache
+                ):
+                    daemon_socket = find_daemon(paths)
+                if daemon_socket:
+                    outcome = test_with_daemon(
+                        daemon_socket,
+                        paths,
+                        detailed=args.details,
+                        summary=args.summary,
+                        events=EventStream(events_stream),
+                        history=not args.no_history,
+                        test_timeout=args.test_timeout,
+                        jobs=args.jobs,
+                        cache=args.cache,
+                    )
+                if outcome is None:
+                    result_cache = None
+                    if args.cache or args.remote_cache:
+                        result_cache = ResultCache(
+                            result_store(args.remote_cache)
+                            if args.remote_cache
+                            else None
+                        )
+                    outcome = test(
+                        paths,
+                        detailed=args.details,
+                        summary=args.summary,
+                        events=EventStream(events_stream),
+                        history=not args.no_history,
+                        test_timeout=args.test_timeout,
+                        result_cache=result_cache,
+                        **run_options,
+                    )
+                all_passed, _ = outcome
             if not all_passed:
                 return 1
+        if args.action == "daemon":
+            path = Path(args.path) if args.path else Path(os.getcwd())
+            if args.stop:
+                stop_daemon(path.resolve())
+            else:
+                serve_daemon(path.resolve(), runners=args.runners)
+        if args.action == "worker":
+            root = Path(args.root) if args.root else Path(os.getcwd())
+            tested = work(args.address, root.resolve(), scratch=args.scratch)
+            logging.info(f"Tested {tested} assignments")
+        if args.action == "check":
+            path = Path(args.path) if args.path else Path(os.getcwd())
+            problems = check_course(path.resolve(), jobs=args.jobs)
+            for problem in problems:
+                print(problem.format(path.resolve()))
+            if problems:
+                logging.warning(f"\x1b[31;1m{len(problems)} PROBLEM(S) FOUND\x1b[0m")
+                return 1
+            logging.info("\x1b[32;1mNO PROBLEMS FOUND\x1b[0m")
+        if args.action == "history":
+            path = Path(args.path) if args.path else Path(os.getcwd())
+            if args.show is not None:
+                results = load_history_run(path.resolve(), args.show or None)
+                log_test_details(results)
+                print_test_output(results)
+                if not all(result.success for result in results):
+                    return 1
+            else:
+                print_history(
+                    path.resolve(),
+                    slowest=args.slowest,
+                    regressed=args.regressed,
+                    failing=args.failing,
+                    limit=args.limit,
+                )
         if args.action == "update":
             path = Path(args.path) if args.path else Path(os.getcwd())
-            update_course(path.resolve())
+            update_results = update_course(
+                path.resolve(), dry_run=args.dry_run, jobs=args.jobs
+            )
+            if any(r.status == UpdateStatus.FAILED for r in update_results):
+                return 1
+        if args.action == "export":
+            path = Path(args.path) if args.path else Path(os.getcwd())
+            export_stubs(path.resolve(), Path(args.stubs).resolve(), jobs=args.jobs)
+        if args.action == "pack":
+            path = Path(args.path) if args.path else Path(os.getcwd())
+            for zip_path in pack_course(
+                path.resolve(), Path(args.out).resolve(), jobs=args.jobs
+            ):
+                print(zip_path)
     except ActionCancelledException:
         print("OK, quitting")
         return 1